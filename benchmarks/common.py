@@ -0,0 +1,43 @@
+import time
+import statistics
+from typing import List, Dict, Any
+from config import settings
+
+def bench_db_name() -> str:
+    """Nombre de la base usada por los benchmarks (nunca la de la app)"""
+    return f"{settings.mongo_uri.split('/')[-1]}_bench"
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(label: str, latencies_ms: List[float], elapsed_s: float) -> Dict[str, Any]:
+    summary = {
+        "label": label,
+        "requests": len(latencies_ms),
+        "throughput_rps": len(latencies_ms) / elapsed_s if elapsed_s else 0.0,
+        "mean_ms": statistics.fmean(latencies_ms) if latencies_ms else 0.0,
+        "p50_ms": percentile(latencies_ms, 50),
+        "p95_ms": percentile(latencies_ms, 95),
+        "p99_ms": percentile(latencies_ms, 99),
+    }
+    print(
+        f"{label:<28} n={summary['requests']:<6} "
+        f"rps={summary['throughput_rps']:>8.1f}  "
+        f"p50={summary['p50_ms']:>8.2f}ms  "
+        f"p95={summary['p95_ms']:>8.2f}ms  "
+        f"p99={summary['p99_ms']:>8.2f}ms"
+    )
+    return summary
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+        return False
@@ -0,0 +1,109 @@
+"""
+Benchmark de concurrencia de la capa de base de datos.
+
+Compara la capa anterior (pymongo síncrono llamado desde corutinas, que
+bloquea el event loop) con la capa async actual (`database.Database`)
+ejecutando una mezcla de consultas concurrentes: lecturas puntuales de
+usuarios y escaneos lentos de órdenes por tienda.
+
+Uso:
+    python -m benchmarks.db_concurrency --requests 2000 --concurrency 200
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime
+from pymongo import MongoClient
+from config import settings
+from database import Database
+from benchmarks.common import bench_db_name, summarize, Timer
+
+class BlockingDatabase:
+    """Réplica de la capa pymongo anterior: cada consulta bloquea el loop"""
+
+    def __init__(self, db_name: str):
+        self.client = MongoClient(settings.mongo_uri, serverSelectionTimeoutMS=5000)
+        self.db = self.client[db_name]
+
+    async def find_one(self, collection_name, query, projection=None):
+        return self.db[collection_name].find_one(query, projection)
+
+    async def find(self, collection_name, query={}, projection=None, limit=0):
+        cursor = self.db[collection_name].find(query, projection)
+        if limit:
+            cursor = cursor.limit(limit)
+        return list(cursor)
+
+    def close(self):
+        self.client.close()
+
+def seed(db_name: str, users: int, stores: int, orders: int):
+    client = MongoClient(settings.mongo_uri, serverSelectionTimeoutMS=5000)
+    bench = client[db_name]
+    bench.users.drop()
+    bench.orders.drop()
+    bench.users.insert_many(
+        [{"username": f"user{i}", "role": "buyer", "is_active": True} for i in range(users)]
+    )
+    batch = []
+    for i in range(orders):
+        batch.append({
+            "store_id": f"store{i % stores}",
+            "buyer_id": f"user{i % users}",
+            "total_price": round(random.uniform(5, 500), 2),
+            "status": "paid",
+            "created_at": datetime.utcnow(),
+        })
+        if len(batch) == 5000:
+            bench.orders.insert_many(batch)
+            batch = []
+    if batch:
+        bench.orders.insert_many(batch)
+    client.close()
+
+async def mixed_request(database, users: int, stores: int, scan_ratio: float, issued_at: float) -> float:
+    if random.random() < scan_ratio:
+        await database.find("orders", {"store_id": f"store{random.randrange(stores)}"})
+    else:
+        await database.find_one("users", {"username": f"user{random.randrange(users)}"})
+    return (time.perf_counter() - issued_at) * 1000
+
+async def run(database, label: str, args) -> dict:
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+
+    async def worker():
+        # Desde que se emite: incluye la espera por el semáforo, donde las llamadas bloqueantes encolan a las demás
+        issued_at = time.perf_counter()
+        async with semaphore:
+            latencies.append(await mixed_request(database, args.users, args.stores, args.scan_ratio, issued_at))
+
+    with Timer() as timer:
+        await asyncio.gather(*(worker() for _ in range(args.requests)))
+    return summarize(label, latencies, timer.elapsed)
+
+async def main(args):
+    db_name = bench_db_name()
+    if not args.skip_seed:
+        seed(db_name, args.users, args.stores, args.orders)
+
+    blocking = BlockingDatabase(db_name)
+    await run(blocking, "before (blocking pymongo)", args)
+    blocking.close()
+
+    async_db = Database()
+    async_db.db = async_db.client[db_name]
+    await run(async_db, "after (async motor)", args)
+    async_db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--stores", type=int, default=50)
+    parser.add_argument("--orders", type=int, default=100000)
+    parser.add_argument("--scan-ratio", type=float, default=0.1)
+    parser.add_argument("--skip-seed", action="store_true")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,65 @@
+"""
+Benchmark del motor de despacho (utils.routing.plan_routes).
+
+Genera órdenes y shippers sintéticos repartidos por Lima Metropolitana,
+con la mezcla de vehículos indicada, y mide cada fase del plan: matriz de
+distancias, inserción greedy y 2-opt. Falla (exit 1) si el total supera
+el tick de despacho.
+
+Uso:
+    python -m benchmarks.dispatch --orders 5000 --shippers 500 --tick-seconds 30
+"""
+import argparse
+import sys
+import numpy as np
+from utils.geo import haversine_matrix
+from utils.routing import plan_routes, VEHICLE_PROFILES
+from benchmarks.common import Timer
+
+# Caja aproximada de Lima Metropolitana
+LAT_RANGE = (-12.25, -11.85)
+LNG_RANGE = (-77.15, -76.85)
+
+def synthetic_problem(orders: int, shippers: int, vehicle_mix, seed: int):
+    rng = np.random.default_rng(seed)
+    vehicles = rng.choice(list(VEHICLE_PROFILES), size=shippers, p=vehicle_mix)
+    return {
+        "shipper_lat": rng.uniform(*LAT_RANGE, shippers),
+        "shipper_lng": rng.uniform(*LNG_RANGE, shippers),
+        "shipper_capacity": np.array([VEHICLE_PROFILES[vehicle]["capacity"] for vehicle in vehicles]),
+        "shipper_max_range_m": np.array([VEHICLE_PROFILES[vehicle]["max_range_m"] for vehicle in vehicles]),
+        "order_lat": rng.uniform(*LAT_RANGE, orders),
+        "order_lng": rng.uniform(*LNG_RANGE, orders),
+    }
+
+def main(args) -> int:
+    problem = synthetic_problem(args.orders, args.shippers, args.vehicle_mix, args.seed)
+    with Timer() as matrix_timer:
+        haversine_matrix(problem["shipper_lat"], problem["shipper_lng"], problem["order_lat"], problem["order_lng"])
+    with Timer() as greedy_timer:
+        greedy = plan_routes(**problem, candidates=args.candidates, two_opt=False)
+    with Timer() as total_timer:
+        plan = plan_routes(**problem, candidates=args.candidates, two_opt=True)
+
+    capacity = int(problem["shipper_capacity"].sum())
+    print(f"orders={args.orders} shippers={args.shippers} fleet capacity={capacity}")
+    print(f"distance matrix          {matrix_timer.elapsed * 1000:>9.1f} ms")
+    print(f"greedy insertion         {greedy_timer.elapsed * 1000:>9.1f} ms")
+    print(f"greedy + 2-opt (total)   {total_timer.elapsed * 1000:>9.1f} ms")
+    print(f"assigned={plan.assigned_count} unassigned={len(plan.unassigned)}")
+    print(f"route km greedy={sum(greedy.route_lengths_m) / 1000:.1f} after 2-opt={sum(plan.route_lengths_m) / 1000:.1f}")
+    if total_timer.elapsed > args.tick_seconds:
+        print(f"❌ dispatch took longer than the {args.tick_seconds:.0f}s tick")
+        return 1
+    print(f"✅ within the {args.tick_seconds:.0f}s dispatch tick")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--shippers", type=int, default=500)
+    parser.add_argument("--candidates", type=int, default=8)
+    parser.add_argument("--tick-seconds", type=float, default=30.0)
+    parser.add_argument("--vehicle-mix", type=float, nargs=3, default=[0.2, 0.6, 0.2], metavar=("BIKE", "MOTORCYCLE", "CAR"))
+    parser.add_argument("--seed", type=int, default=7)
+    sys.exit(main(parser.parse_args()))
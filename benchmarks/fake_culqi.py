@@ -0,0 +1,154 @@
+"""
+Servidor local que imita la API de Culqi (tokens, cargos y reembolsos).
+
+Permite cargar el camino de pagos sin tocar api.culqi.com. La latencia de
+cada respuesta sigue una distribución configurable y una fracción de las
+llamadas puede fallar con 5xx o ser rechazada (400 con merchant_message,
+como Culqi). Opcionalmente emite el webhook `charge.succeeded` hacia la app.
+
+Uso:
+    python -m benchmarks.fake_culqi --port 9000 --latency lognormal \\
+        --latency-median-ms 120 --latency-sigma 0.5 --error-rate 0.01 \\
+        --webhook-url http://127.0.0.1:8000/api/payments/webhooks/culqi/
+
+y en la app:
+    CULQI_API_URL=http://127.0.0.1:9000/v1 uvicorn main:app
+"""
+import argparse
+import asyncio
+import math
+import random
+import uuid
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from typing import Dict, Any, Optional
+
+class FakeCulqiConfig:
+    latency: str = "fixed"
+    latency_median_ms: float = 100.0
+    latency_sigma: float = 0.5
+    latency_max_ms: float = 5000.0
+    error_rate: float = 0.0
+    decline_rate: float = 0.0
+    pending_rate: float = 0.0
+    webhook_url: Optional[str] = None
+    webhook_delay_ms: float = 500.0
+
+fake_config = FakeCulqiConfig()
+app = FastAPI(title="Fake Culqi")
+stats: Dict[str, int] = {"tokens": 0, "charges": 0, "refunds": 0, "errors": 0, "declines": 0, "webhooks": 0}
+_background_tasks = set()
+
+def sample_latency_ms() -> float:
+    if fake_config.latency == "uniform":
+        value = random.uniform(0, 2 * fake_config.latency_median_ms)
+    elif fake_config.latency == "exponential":
+        value = random.expovariate(math.log(2) / fake_config.latency_median_ms)
+    elif fake_config.latency == "lognormal":
+        value = random.lognormvariate(math.log(fake_config.latency_median_ms), fake_config.latency_sigma)
+    else:
+        value = fake_config.latency_median_ms
+    return min(value, fake_config.latency_max_ms)
+
+async def simulate() -> Optional[JSONResponse]:
+    """Aplicar latencia y, según las tasas configuradas, un error o rechazo"""
+    await asyncio.sleep(sample_latency_ms() / 1000)
+    roll = random.random()
+    if roll < fake_config.error_rate:
+        stats["errors"] += 1
+        return JSONResponse(status_code=503, content={"object": "error", "merchant_message": "Servicio no disponible"})
+    if roll < fake_config.error_rate + fake_config.decline_rate:
+        stats["declines"] += 1
+        return JSONResponse(status_code=400, content={
+            "object": "error",
+            "type": "card_error",
+            "merchant_message": "La tarjeta fue rechazada",
+            "user_message": "Tu tarjeta fue rechazada"
+        })
+    return None
+
+async def emit_webhook(charge: Dict[str, Any]):
+    await asyncio.sleep(fake_config.webhook_delay_ms / 1000)
+    payload = {"object": "Charge", "data": {"object": {"id": charge["id"], "action": "charge.succeeded"}}}
+    try:
+        async with httpx.AsyncClient(timeout=10) as client:
+            await client.post(fake_config.webhook_url, json=payload)
+        stats["webhooks"] += 1
+    except httpx.HTTPError as e:
+        print(f"Webhook delivery failed: {e}")
+
+@app.post("/v1/tokens")
+async def create_token(request: Request):
+    failure = await simulate()
+    if failure:
+        return failure
+    body = await request.json()
+    stats["tokens"] += 1
+    return JSONResponse(status_code=201, content={
+        "object": "token",
+        "id": f"ype_test_{uuid.uuid4().hex[:16]}",
+        "type": "yape",
+        "metadata": body.get("metadata", {})
+    })
+
+@app.post("/v1/charges")
+async def create_charge(request: Request):
+    failure = await simulate()
+    if failure:
+        return failure
+    body = await request.json()
+    stats["charges"] += 1
+    charge = {
+        "object": "charge",
+        "id": f"chr_test_{uuid.uuid4().hex[:16]}",
+        "amount": body.get("amount"),
+        "currency_code": body.get("currency", "PEN"),
+        "source_id": body.get("source_id"),
+        "amount_status": "pending" if random.random() < fake_config.pending_rate else "captured",
+        "metadata": body.get("metadata", {})
+    }
+    if fake_config.webhook_url:
+        task = asyncio.create_task(emit_webhook(charge))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+    return JSONResponse(status_code=201, content=charge)
+
+@app.post("/v1/refunds")
+async def create_refund(request: Request):
+    failure = await simulate()
+    if failure:
+        return failure
+    body = await request.json()
+    stats["refunds"] += 1
+    return JSONResponse(status_code=201, content={
+        "object": "refund",
+        "id": f"ref_test_{uuid.uuid4().hex[:16]}",
+        "charge_id": body.get("charge_id"),
+        "amount": body.get("amount"),
+        "reason": body.get("reason")
+    })
+
+@app.get("/stats")
+async def read_stats():
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", choices=["fixed", "uniform", "exponential", "lognormal"], default="fixed")
+    parser.add_argument("--latency-median-ms", type=float, default=100.0)
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--latency-max-ms", type=float, default=5000.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--decline-rate", type=float, default=0.0)
+    parser.add_argument("--pending-rate", type=float, default=0.0)
+    parser.add_argument("--webhook-url", default=None)
+    parser.add_argument("--webhook-delay-ms", type=float, default=500.0)
+    args = parser.parse_args()
+    for option in ("latency", "latency_median_ms", "latency_sigma", "latency_max_ms", "error_rate",
+                   "decline_rate", "pending_rate", "webhook_url", "webhook_delay_ms"):
+        setattr(fake_config, option, getattr(args, option))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
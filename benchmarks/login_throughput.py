@@ -0,0 +1,66 @@
+"""
+Benchmark de `/api/accounts/token` con tráfico de catálogo en paralelo.
+
+Lanza durante `--duration` segundos un grupo de clientes haciendo login
+y otro leyendo `/api/products/`, contra un servidor ya levantado:
+    uvicorn main:app --workers 1
+    python -m benchmarks.login_throughput --base-url http://127.0.0.1:8000
+
+Con bcrypt en el event loop la latencia del catálogo sube con cada login;
+con el pool de procesos se mantiene y los excesos de login salen como 503.
+"""
+import argparse
+import asyncio
+import time
+import uuid
+import httpx
+from benchmarks.common import summarize
+
+async def ensure_user(client: httpx.AsyncClient, username: str, password: str):
+    await client.post("/api/accounts/users/", json={
+        "username": username,
+        "email": f"{username}@example.com",
+        "password": password
+    })
+
+async def login_worker(client, username, password, deadline, latencies, statuses):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.post("/api/accounts/token", data={"username": username, "password": password})
+        latencies.append((time.perf_counter() - start) * 1000)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+async def catalog_worker(client, deadline, latencies, statuses):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        response = await client.get("/api/products/", params={"limit": 20})
+        latencies.append((time.perf_counter() - start) * 1000)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+async def main(args):
+    username = f"bench-{uuid.uuid4().hex[:8]}"
+    password = "bench-password"
+    limits = httpx.Limits(max_connections=args.logins + args.catalog)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=30, limits=limits) as client:
+        await ensure_user(client, username, password)
+        login_latencies, catalog_latencies = [], []
+        login_statuses, catalog_statuses = {}, {}
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(
+            *(login_worker(client, username, password, deadline, login_latencies, login_statuses) for _ in range(args.logins)),
+            *(catalog_worker(client, deadline, catalog_latencies, catalog_statuses) for _ in range(args.catalog))
+        )
+        elapsed = time.perf_counter() - start
+    summarize("POST /api/accounts/token", login_latencies, elapsed)
+    summarize("GET /api/products/", catalog_latencies, elapsed)
+    print(f"login statuses:   {login_statuses}")
+    print(f"catalog statuses: {catalog_statuses}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--catalog", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
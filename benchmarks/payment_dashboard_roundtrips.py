@@ -0,0 +1,88 @@
+"""
+Benchmark de round trips del dashboard de pagos.
+
+Cuenta los comandos enviados a MongoDB (vía command monitoring de pymongo)
+para la versión N+1 anterior y para `crud.payment.get_payment_dashboard`
+a medida que crece el historial de pagos del usuario.
+
+Uso:
+    python -m benchmarks.payment_dashboard_roundtrips --sizes 10 50 100
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import monitoring
+from motor.motor_asyncio import AsyncIOMotorClient
+from config import settings
+from database import db
+from crud.payment import get_payment_dashboard, get_payments_by_user
+from utils.pagination import decode_id
+from benchmarks.common import bench_db_name, Timer
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+async def n_plus_one_dashboard(user_id: str, limit: int):
+    """Implementación anterior: una consulta de orden por pago"""
+    payments = (await get_payments_by_user(user_id, None, limit))["items"]
+    for payment in payments:
+        if payment.get("order_id"):
+            await db.find_one("orders", {"_id": decode_id(payment["order_id"])})
+    return payments
+
+async def seed(user_id: str, size: int):
+    await db.get_collection("payments").delete_many({"user_id": user_id})
+    now = datetime.utcnow()
+    # ObjectId como las órdenes reales; los pagos guardan el id como string
+    orders = [
+        {"_id": ObjectId(), "buyer_id": user_id, "total_price": 10 + i, "status": "paid", "delivery_address": "Av. Lima 123", "created_at": now}
+        for i in range(size)
+    ]
+    await db.get_collection("orders").delete_many({"buyer_id": user_id})
+    await db.get_collection("orders").insert_many(orders)
+    await db.get_collection("payments").insert_many([
+        {"user_id": user_id, "order_id": str(order["_id"]), "amount": order["total_price"], "status": "succeeded", "created_at": now - timedelta(seconds=i)}
+        for i, order in enumerate(orders)
+    ])
+
+async def main(args):
+    counter = CommandCounter()
+    db.client = AsyncIOMotorClient(settings.mongo_uri, event_listeners=[counter])
+    db.db = db.client[bench_db_name()]
+
+    print(f"{'payments':>9} {'n+1 round trips':>16} {'n+1 ms':>9} {'batched round trips':>20} {'batched ms':>11}")
+    for size in args.sizes:
+        user_id = f"bench-user-{size}"
+        await seed(user_id, size)
+
+        counter.count = 0
+        with Timer() as old_timer:
+            await n_plus_one_dashboard(user_id, size)
+        old_round_trips = counter.count
+
+        counter.count = 0
+        with Timer() as new_timer:
+            page = await get_payment_dashboard(user_id, None, size)
+        new_round_trips = counter.count
+        enriched = sum(1 for payment in page["items"] if payment.get("order_info"))
+        if enriched != len(page["items"]):
+            print(f"warning: only {enriched}/{len(page['items'])} payments got order_info")
+
+        print(f"{size:>9} {old_round_trips:>16} {old_timer.elapsed * 1000:>9.2f} {new_round_trips:>20} {new_timer.elapsed * 1000:>11.2f}")
+    db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50, 100])
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,88 @@
+"""
+Benchmark de carga del camino de pagos completo.
+
+process_payment_endpoint -> crud.payment.create_payment -> process_culqi_payment
+contra la app real y el Culqi simulado (`benchmarks.fake_culqi`):
+
+    python -m benchmarks.fake_culqi --port 9000 --latency lognormal
+    CULQI_API_URL=http://127.0.0.1:9000/v1 uvicorn main:app
+    python -m benchmarks.payment_load --payments 2000 --concurrency 100 --yape-ratio 0.3
+
+Reporta throughput y p50/p95/p99 por método de pago.
+"""
+import argparse
+import asyncio
+import random
+import time
+import uuid
+import httpx
+from benchmarks.common import summarize
+
+async def create_buyer(client: httpx.AsyncClient) -> str:
+    username = f"bench-buyer-{uuid.uuid4().hex[:8]}"
+    password = "bench-password"
+    await client.post("/api/accounts/users/", json={
+        "username": username,
+        "email": f"{username}@example.com",
+        "password": password,
+        "role": "buyer"
+    })
+    response = await client.post("/api/accounts/token", data={"username": username, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+async def create_order(client: httpx.AsyncClient, headers: dict) -> str:
+    response = await client.post("/api/orders/", headers=headers, json={
+        "store_id": "bench-store",
+        "items": [{"product_id": "bench-product", "quantity": 1, "price": "25.50"}],
+        "delivery_address": "Av. Arequipa 123, Lima",
+        "total_price": "25.50"
+    })
+    response.raise_for_status()
+    return response.json()["id"]
+
+def payment_payload(order_id: str, method: str) -> dict:
+    payload = {"order_id": order_id, "amount": "25.50", "payment_method": method}
+    if method == "card":
+        payload["token_id"] = f"tkn_test_{uuid.uuid4().hex[:16]}"
+    else:
+        payload["phone"] = "900000001"
+        payload["otp"] = "123456"
+    return payload
+
+async def main(args):
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=60, limits=limits) as client:
+        headers = {"Authorization": f"Bearer {await create_buyer(client)}"}
+        order_ids = await asyncio.gather(*(create_order(client, headers) for _ in range(args.payments)))
+
+        latencies = {"card": [], "yape": []}
+        statuses = {"card": {}, "yape": {}}
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def pay(order_id: str):
+            method = "yape" if random.random() < args.yape_ratio else "card"
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/api/payments/process/", headers=headers, json=payment_payload(order_id, method))
+                latencies[method].append((time.perf_counter() - start) * 1000)
+            status = response.json().get("status") if response.status_code == 200 else response.status_code
+            statuses[method][status] = statuses[method].get(status, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(pay(order_id) for order_id in order_ids))
+        elapsed = time.perf_counter() - start
+
+    summarize("card payments", latencies["card"], elapsed)
+    summarize("yape payments", latencies["yape"], elapsed)
+    summarize("all payments", latencies["card"] + latencies["yape"], elapsed)
+    print(f"card outcomes: {statuses['card']}")
+    print(f"yape outcomes: {statuses['yape']}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--payments", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--yape-ratio", type=float, default=0.3)
+    asyncio.run(main(parser.parse_args()))
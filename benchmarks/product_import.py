@@ -0,0 +1,81 @@
+"""
+Benchmark de la importación masiva de productos.
+
+Genera un catálogo sintético al vuelo (nunca entero en memoria), lo pasa
+en chunks a `crud.product_import.import_products_stream` y reporta tiempo
+total, filas/s y pico de memoria de Python (tracemalloc) para varios
+tamaños; el pico debería mantenerse plano al crecer el archivo.
+
+Uso:
+    python -m benchmarks.product_import --rows 10000 50000 --format csv
+"""
+import argparse
+import asyncio
+import json
+import random
+import tracemalloc
+from database import db
+from indexes import ensure_indexes
+from crud.product_import import import_products_stream
+from benchmarks.common import bench_db_name, Timer
+
+CHUNK_SIZE = 64 * 1024
+
+def synthetic_rows(rows: int, file_format: str):
+    if file_format == "csv":
+        yield "sku,name,description,price,stock,category,brand,tags\n"
+    for index in range(rows):
+        row = {
+            "sku": f"SKU-{index:07d}",
+            "name": f"Producto {index}",
+            "description": f"Descripción del producto {index}, apto para envío a domicilio",
+            "price": f"{random.uniform(1, 500):.2f}",
+            "stock": random.randint(0, 200),
+            "category": random.choice(["abarrotes", "ropa", "hogar", "tecnología"]),
+            "brand": random.choice(["Inca", "Andina", "Lima", "Sol"]),
+            "tags": ["oferta", "nuevo"]
+        }
+        if file_format == "csv":
+            yield (
+                f"{row['sku']},{row['name']},\"{row['description']}\",{row['price']},"
+                f"{row['stock']},{row['category']},{row['brand']},{'|'.join(row['tags'])}\n"
+            )
+        else:
+            yield json.dumps(row) + "\n"
+
+async def chunked(rows: int, file_format: str):
+    buffer = []
+    size = 0
+    for line in synthetic_rows(rows, file_format):
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield "".join(buffer).encode()
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer).encode()
+
+async def main(args):
+    db.db = db.client[bench_db_name()]
+    # El upsert por (store_id, sku) sin su índice mediría un COLLSCAN por fila
+    await ensure_indexes(db)
+    print(f"{'rows':>8} {'seconds':>9} {'rows/s':>10} {'peak MiB':>9} {'inserted':>9} {'updated':>8} {'failed':>7}")
+    for rows in args.rows:
+        store_id = f"bench-import-{rows}"
+        await db.delete_many("products", {"store_id": store_id})
+        tracemalloc.start()
+        with Timer() as timer:
+            report = await import_products_stream(store_id, args.format, chunked(rows, args.format), "bench-user")
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(
+            f"{rows:>8} {timer.elapsed:>9.2f} {rows / timer.elapsed:>10.0f} {peak / 2**20:>9.1f} "
+            f"{report['inserted']:>9} {report['updated']:>8} {report['failed']:>7}"
+        )
+    db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,93 @@
+"""
+Benchmark de búsqueda de productos: `$regex` sin anclar frente a `$text`.
+
+Siembra un catálogo sintético (por defecto 1M de productos en lotes de
+insert_many), crea los índices de `indexes.py` y mide p50/p95/p99 de
+ambas variantes con los mismos términos. La variante `$text` pasa por
+`crud.search.search_products` (ranking por relevancia + keyset).
+
+Uso:
+    python -m benchmarks.search --products 1000000 --queries 200
+    python -m benchmarks.search --skip-seed --queries 500
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+from database import db
+from indexes import ensure_indexes
+from crud.search import search_products
+from benchmarks.common import bench_db_name, summarize
+
+SEED_BATCH_SIZE = 10000
+WORDS = [
+    "arroz", "quinua", "café", "cacao", "polo", "casaca", "zapatilla", "mochila",
+    "lámpara", "sartén", "licuadora", "audífonos", "cargador", "alpaca", "orgánico",
+    "artesanal", "andino", "premium", "infantil", "deportivo", "cerámica", "algodón"
+]
+CATEGORIES = ["abarrotes", "ropa", "hogar", "tecnología", "artesanía"]
+BRANDS = ["Inca", "Andina", "Lima", "Sol", "Qhapaq", "Misti"]
+
+def synthetic_product(index: int, now: datetime) -> dict:
+    name_words = random.sample(WORDS, 3)
+    return {
+        "store_id": f"bench-search-store-{index % 5000}",
+        "sku": f"SRCH-{index:08d}",
+        "name": " ".join(name_words).capitalize(),
+        "description": " ".join(random.choices(WORDS, k=12)),
+        "tags": random.sample(WORDS, 2),
+        "category": random.choice(CATEGORIES),
+        "brand": random.choice(BRANDS),
+        "price": round(random.uniform(1, 500), 2),
+        "stock": random.randint(0, 200),
+        "created_at": now - timedelta(seconds=index),
+        "updated_at": now
+    }
+
+async def seed(products: int):
+    await db.delete_many("products", {})
+    now = datetime.utcnow()
+    start = time.perf_counter()
+    for offset in range(0, products, SEED_BATCH_SIZE):
+        batch = [synthetic_product(index, now) for index in range(offset, min(offset + SEED_BATCH_SIZE, products))]
+        await db.insert_many("products", batch, ordered=False)
+    print(f"seeded {products} products in {time.perf_counter() - start:.1f}s")
+    start = time.perf_counter()
+    await ensure_indexes(db)
+    print(f"built indexes in {time.perf_counter() - start:.1f}s")
+
+async def run_regex(term: str, limit: int):
+    await db.find("products", {"$or": [
+        {"name": {"$regex": term, "$options": "i"}},
+        {"description": {"$regex": term, "$options": "i"}}
+    ]}, limit=limit)
+
+async def run_text(term: str, limit: int):
+    await search_products(term, limit=limit)
+
+async def measure(label: str, run, terms, limit: int):
+    latencies = []
+    start = time.perf_counter()
+    for term in terms:
+        query_start = time.perf_counter()
+        await run(term, limit)
+        latencies.append((time.perf_counter() - query_start) * 1000)
+    summarize(label, latencies, time.perf_counter() - start)
+
+async def main(args):
+    db.db = db.client[bench_db_name()]
+    if not args.skip_seed:
+        await seed(args.products)
+    terms = [random.choice(WORDS) for _ in range(args.queries)]
+    await measure("regex $or", run_regex, terms, args.limit)
+    await measure("$text", run_text, terms, args.limit)
+    db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--skip-seed", action="store_true")
+    asyncio.run(main(parser.parse_args()))
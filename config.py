@@ -9,6 +9,50 @@ class Settings(BaseSettings):
     
     # Database
     mongo_uri: str = config('MONGO_URI', default='mongodb://localhost:27017/latam_store_db')
+    mongo_max_pool_size: int = config('MONGO_MAX_POOL_SIZE', default=100, cast=int)
+    # Cache de usuarios autenticados (el TTL es la ventana máxima de datos obsoletos)
+    user_cache_size: int = config('USER_CACHE_SIZE', default=10000, cast=int)
+    user_cache_ttl_seconds: float = config('USER_CACHE_TTL_SECONDS', default=30.0, cast=float)
+    # Hashing de contraseñas (bcrypt en pool de procesos); 0 = usar nº de CPUs
+    password_hash_workers: int = config('PASSWORD_HASH_WORKERS', default=0, cast=int)
+    password_hash_concurrency: int = config('PASSWORD_HASH_CONCURRENCY', default=0, cast=int)
+    password_hash_queue_size: int = config('PASSWORD_HASH_QUEUE_SIZE', default=64, cast=int)
+    password_hash_queue_timeout_seconds: float = config('PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS', default=2.0, cast=float)
+    # Inbox de webhooks de Culqi
+    webhook_workers: int = config('WEBHOOK_WORKERS', default=4, cast=int)
+    webhook_poll_interval_seconds: float = config('WEBHOOK_POLL_INTERVAL_SECONDS', default=1.0, cast=float)
+    webhook_lease_seconds: float = config('WEBHOOK_LEASE_SECONDS', default=30.0, cast=float)
+    webhook_max_attempts: int = config('WEBHOOK_MAX_ATTEMPTS', default=5, cast=int)
+    webhook_retention_days: int = config('WEBHOOK_RETENTION_DAYS', default=7, cast=int)
+    # Grid en memoria de posiciones de shippers (0.01° ≈ 1.1 km)
+    shipper_grid_cell_degrees: float = config('SHIPPER_GRID_CELL_DEGREES', default=0.01, cast=float)
+    shipper_grid_snapshot_interval_seconds: float = config('SHIPPER_GRID_SNAPSHOT_INTERVAL_SECONDS', default=5.0, cast=float)
+    # Un fix solo se persiste si se movió esta distancia o si la última escritura es más vieja que esto
+    shipper_location_min_move_m: float = config('SHIPPER_LOCATION_MIN_MOVE_M', default=25.0, cast=float)
+    shipper_location_max_age_seconds: float = config('SHIPPER_LOCATION_MAX_AGE_SECONDS', default=60.0, cast=float)
+    # Motor de despacho (crud.dispatch); intervalo 0 = solo bajo demanda
+    dispatch_interval_seconds: float = config('DISPATCH_INTERVAL_SECONDS', default=0.0, cast=float)
+    dispatch_max_orders: int = config('DISPATCH_MAX_ORDERS', default=5000, cast=int)
+    dispatch_candidates: int = config('DISPATCH_CANDIDATES', default=8, cast=int)
+    # Índice en memoria de puntos de entrega para asignar órdenes (utils.delivery_point_index)
+    delivery_point_index_refresh_seconds: float = config('DELIVERY_POINT_INDEX_REFRESH_SECONDS', default=30.0, cast=float)
+    # ETAs de órdenes asignadas (crud.eta); se recalculan con cada fix del shipper
+    eta_cache_size: int = config('ETA_CACHE_SIZE', default=10000, cast=int)
+    eta_cache_ttl_seconds: float = config('ETA_CACHE_TTL_SECONDS', default=300.0, cast=float)
+    eta_persist_min_change_seconds: float = config('ETA_PERSIST_MIN_CHANGE_SECONDS', default=60.0, cast=float)
+    # Eventos de tracking que se mantienen embebidos en la orden (el resto, en buckets)
+    tracking_recent_events: int = config('TRACKING_RECENT_EVENTS', default=10, cast=int)
+    # Trayectos GPS (delivery_tracking, time-series)
+    tracking_raw_retention_days: int = config('TRACKING_RAW_RETENTION_DAYS', default=7, cast=int)
+    tracking_minutely_retention_days: int = config('TRACKING_MINUTELY_RETENTION_DAYS', default=365, cast=int)
+    tracking_downsample_after_minutes: int = config('TRACKING_DOWNSAMPLE_AFTER_MINUTES', default=60, cast=int)
+    tracking_downsample_interval_seconds: float = config('TRACKING_DOWNSAMPLE_INTERVAL_SECONDS', default=300.0, cast=float)
+    tracking_trail_max_points: int = config('TRACKING_TRAIL_MAX_POINTS', default=5000, cast=int)
+    # Suscripciones en vivo a órdenes; el change stream requiere replica set
+    order_events_queue_size: int = config('ORDER_EVENTS_QUEUE_SIZE', default=100, cast=int)
+    order_events_change_stream: bool = config('ORDER_EVENTS_CHANGE_STREAM', default=False, cast=bool)
+    order_events_keepalive_seconds: float = config('ORDER_EVENTS_KEEPALIVE_SECONDS', default=15.0, cast=float)
+    counter_flush_interval_seconds: float = config('COUNTER_FLUSH_INTERVAL_SECONDS', default=5.0, cast=float)
     
     # Security
     secret_key: str = config('SECRET_KEY')
@@ -18,6 +62,12 @@ class Settings(BaseSettings):
     # Culqi
     culqi_public_key: str = config('CULQI_PUBLIC_KEY')
     culqi_secret_key: str = config('CULQI_SECRET_KEY')
+    culqi_api_url: str = config('CULQI_API_URL', default='https://api.culqi.com/v1')
+    culqi_connect_timeout_seconds: float = config('CULQI_CONNECT_TIMEOUT_SECONDS', default=3.0, cast=float)
+    culqi_read_timeout_seconds: float = config('CULQI_READ_TIMEOUT_SECONDS', default=15.0, cast=float)
+    culqi_max_connections: int = config('CULQI_MAX_CONNECTIONS', default=50, cast=int)
+    culqi_max_retries: int = config('CULQI_MAX_RETRIES', default=2, cast=int)
+    culqi_retry_backoff_seconds: float = config('CULQI_RETRY_BACKOFF_SECONDS', default=0.2, cast=float)
     
     # Media
     media_url: str = config('MEDIA_URL', default='/media/')
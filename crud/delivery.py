@@ -1,7 +1,40 @@
+"""
+Puntos de entrega, shippers y eventos de tracking.
+
+La posición de cada shipper se guarda además como punto GeoJSON en
+`location` (índice 2dsphere) para resolver "shippers disponibles más
+cercanos" con un único $geoNear. Las posiciones vivas se sirven desde el
+grid en memoria de utils.shipper_grid, que las persiste por snapshots.
+
+Para rellenar `location` en shippers creados antes de este campo:
+    python -m crud.delivery backfill-locations
+"""
+import sys
+import asyncio
+import argparse
+from bson import ObjectId
+from pymongo import UpdateOne
+from config import settings
 from database import db
-from models.delivery import DeliveryPointCreate, ShipperCreate, DeliveryTrackingEvent
-from typing import List, Optional
-from datetime import datetime
+from models.delivery import DeliveryPointCreate, ShipperCreate, DeliveryTrackingEvent, VehicleTypeEnum
+from utils.shipper_grid import shipper_grid, SHIPPER_POSITION_PROJECTION
+from utils.order_events import order_events
+from crud.delivery_tracking import insert_tracking_point
+from crud.eta import get_shipper_etas, invalidate_shipper_etas
+from utils.cache import TTLCache
+from utils.delivery_point_index import delivery_point_index
+from typing import List, Optional, Dict, Any, Tuple
+from datetime import datetime, timezone
+
+MAX_NEARBY_SHIPPERS = 50
+STORE_ROUTE_PROJECTION = {"city": 1, "latitude": 1, "longitude": 1}
+
+# Ciudad y coordenadas de tiendas para asignar órdenes; cambian muy poco
+store_route_cache = TTLCache(10000, settings.delivery_point_index_refresh_seconds)
+
+def geo_point(latitude: float, longitude: float) -> Dict[str, Any]:
+    # GeoJSON va en orden [longitud, latitud]
+    return {"type": "Point", "coordinates": [longitude, latitude]}
 
 async def create_delivery_point(point: DeliveryPointCreate, user_id: str) -> Optional[dict]:
     point_dict = point.dict()
@@ -10,10 +43,38 @@ async def create_delivery_point(point: DeliveryPointCreate, user_id: str) -> Opt
     point_dict["assigned_orders_ids"] = []
     point_dict["created_at"] = datetime.utcnow()
     point_dict["updated_at"] = datetime.utcnow()
-    return db.insert_one("delivery_points", point_dict)
+    result = await db.insert_one("delivery_points", point_dict)
+    if result and result.get("latitude") is not None:
+        # Los demás workers lo ven en su siguiente refresh
+        await delivery_point_index.rebuild()
+    return result
+
+async def _store_route(store_id: str) -> dict:
+    store = store_route_cache.get(store_id)
+    if store is None:
+        store = await db.find_one("stores", {"_id": ObjectId(store_id) if ObjectId.is_valid(store_id) else store_id}, STORE_ROUTE_PROJECTION) or {}
+        store_route_cache.set(store_id, store)
+    return store
+
+async def find_delivery_point_for_order(order: Dict[str, Any], buyer_city: Optional[str]) -> Optional[str]:
+    """
+    Punto de entrega más cercano a la tienda (o, si no tiene coordenadas, a
+    la dirección de entrega) cuyo `range_type` cubre la ruta de la ciudad
+    de la tienda a la del comprador. Se resuelve sobre el índice en memoria.
+    """
+    if not delivery_point_index.ready:
+        return None
+    store = await _store_route(order["store_id"])
+    latitude, longitude = store.get("latitude"), store.get("longitude")
+    if latitude is None or longitude is None:
+        latitude, longitude = order.get("delivery_latitude"), order.get("delivery_longitude")
+    if latitude is None or longitude is None:
+        return None
+    nearest = delivery_point_index.nearest(latitude, longitude, store.get("city"), buyer_city)
+    return nearest[0] if nearest else None
 
 async def get_delivery_point(point_id: str) -> Optional[dict]:
-    return db.find_one("delivery_points", {"_id": point_id})
+    return await db.find_one("delivery_points", {"_id": point_id})
 
 async def create_shipper(shipper: ShipperCreate, user_id: str) -> Optional[dict]:
     shipper_dict = shipper.dict()
@@ -22,25 +83,151 @@ async def create_shipper(shipper: ShipperCreate, user_id: str) -> Optional[dict]
     shipper_dict["assigned_orders_ids"] = []
     shipper_dict["created_at"] = datetime.utcnow()
     shipper_dict["updated_at"] = datetime.utcnow()
-    return db.insert_one("shippers", shipper_dict)
+    return await db.insert_one("shippers", shipper_dict)
 
 async def get_shipper(shipper_id: str) -> Optional[dict]:
-    return db.find_one("shippers", {"_id": shipper_id})
+    return await db.find_one("shippers", {"_id": shipper_id})
 
-async def update_shipper_location(shipper_id: str, latitude: float, longitude: float, current_location: str, user_id: str) -> bool:
-    query = {"_id": shipper_id, "user_id": user_id}
-    update = {"latitude": latitude, "longitude": longitude, "current_location": current_location, "updated_at": datetime.utcnow()}
-    return db.update_one("shippers", query, update)
+async def get_shipper_by_user(user_id: str) -> Optional[dict]:
+    return await db.find_one("shippers", {"user_id": user_id})
 
-async def get_shipper_dashboard(shipper_id: str) -> List[dict]:
-    shipper = await get_shipper(shipper_id)
+async def track_shipper(shipper_id: str, user_id: str, latitude: float, longitude: float) -> bool:
+    """
+    Asegurar que el shipper está en el grid de este worker y pertenece a
+    `user_id`. Solo consulta Mongo la primera vez (o si cambia el dueño).
+    """
+    position = shipper_grid.get(shipper_id)
+    if position is not None and position.user_id == user_id:
+        return True
+    shipper = await db.find_one(
+        "shippers",
+        {"_id": ObjectId(shipper_id) if ObjectId.is_valid(shipper_id) else shipper_id, "user_id": user_id},
+        SHIPPER_POSITION_PROJECTION
+    )
     if not shipper:
+        return False
+    if shipper.get("latitude") is None or shipper.get("longitude") is None:
+        # Primer fix de un shipper sin posición: entra al grid sin nada persistido
+        shipper.update({"latitude": latitude, "longitude": longitude, "updated_at": None})
+        position = shipper_grid.load(shipper)
+        position.persisted_at = None
+        return True
+    return shipper_grid.load(shipper) is not None
+
+async def update_shipper_location(shipper_id: str, latitude: float, longitude: float, current_location: str, user_id: str, timestamp: Optional[datetime] = None) -> bool:
+    """
+    Actualiza la posición en el grid en memoria; el grid la persiste en
+    `shippers` en su siguiente snapshot, coalesciendo los fixes del
+    intervalo (ver utils.shipper_grid).
+    """
+    if not await track_shipper(shipper_id, user_id, latitude, longitude):
+        return False
+    if timestamp is not None:
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+        # No aceptar relojes adelantados del dispositivo
+        timestamp = min(timestamp, datetime.utcnow())
+    if shipper_grid.move(shipper_id, latitude, longitude, current_location, timestamp) is None:
+        return False
+    invalidate_shipper_etas(shipper_id)
+    return True
+
+async def get_nearby_shippers(latitude: float, longitude: float, vehicle_type: Optional[VehicleTypeEnum] = None, limit: int = 10, max_distance_m: Optional[float] = None) -> List[dict]:
+    """
+    Los `limit` shippers disponibles más cercanos a (latitude, longitude),
+    ordenados por distancia (`distance_m`, en metros). Con el grid en
+    memoria cargado los candidatos salen de ahí y solo se lee de Mongo el
+    detalle por _id; si no, un $geoNear sobre el índice 2dsphere.
+    """
+    limit = max(1, min(limit, MAX_NEARBY_SHIPPERS))
+    if shipper_grid.ready:
+        nearest = shipper_grid.nearest(latitude, longitude, limit, vehicle_type.value if vehicle_type else None, "available", max_distance_m)
+        return await _shippers_with_live_positions(nearest)
+    query: Dict[str, Any] = {"availability_status": "available"}
+    if vehicle_type:
+        query["vehicle_type"] = vehicle_type.value
+    geo_near: Dict[str, Any] = {
+        "near": geo_point(latitude, longitude),
+        "key": "location",
+        "distanceField": "distance_m",
+        "spherical": True,
+        "query": query
+    }
+    if max_distance_m is not None:
+        geo_near["maxDistance"] = max_distance_m
+    return await db.aggregate("shippers", [
+        {"$geoNear": geo_near},
+        {"$limit": limit}
+    ])
+
+async def _shippers_with_live_positions(nearest: List[Tuple[str, float]]) -> List[dict]:
+    if not nearest:
+        return []
+    ids = [ObjectId(shipper_id) if ObjectId.is_valid(shipper_id) else shipper_id for shipper_id, _ in nearest]
+    shippers = {shipper["id"]: shipper for shipper in await db.find("shippers", {"_id": {"$in": ids}})}
+    results = []
+    for shipper_id, distance in nearest:
+        shipper = shippers.get(shipper_id)
+        position = shipper_grid.get(shipper_id)
+        if not shipper or not position:
+            continue
+        # La posición del grid puede ser más reciente que el último snapshot
+        shipper.update({
+            "latitude": position.latitude,
+            "longitude": position.longitude,
+            "location": geo_point(position.latitude, position.longitude),
+            "current_location": position.current_location,
+            "distance_m": distance
+        })
+        results.append(shipper)
+    return results
+
+async def get_shipper_dashboard(shipper: dict) -> List[dict]:
+    """
+    Órdenes asignadas al shipper en orden de visita, cada una con su ETA
+    (`estimated_delivery_time`, `eta_seconds`, `distance_remaining_m`,
+    `stop`) calculada en lote desde su posición actual.
+    """
+    order_ids = [ObjectId(order_id) if ObjectId.is_valid(order_id) else order_id for order_id in shipper.get("assigned_orders_ids", [])]
+    if not order_ids:
         return []
-    order_ids = shipper.get("assigned_orders_ids", [])
-    return db.find("orders", {"_id": {"$in": order_ids}})
+    orders = await db.find("orders", {"_id": {"$in": order_ids}})
+    etas = await get_shipper_etas(shipper, orders)
+    for order in orders:
+        order.update(etas.get(order["id"], {}))
+    # Primero las paradas pendientes por orden de visita; luego las demás
+    return sorted(orders, key=lambda order: (order.get("stop") is None, order.get("stop") or 0))
 
 async def create_tracking_event(event: DeliveryTrackingEvent, user_id: str) -> Optional[dict]:
     event_dict = event.dict()
-    event_dict["user_id"] = user_id
-    event_dict["created_at"] = datetime.utcnow()
-    return db.insert_one("delivery_tracking", event_dict)
\ No newline at end of file
+    result = await insert_tracking_point(event_dict, user_id)
+    if not result:
+        return None
+    # Las colecciones time-series no admiten change streams: siempre se entrega en local
+    order_events.publish_local(event.order_id, event_dict)
+    return {**event_dict, "id": result["id"]}
+
+async def backfill_shipper_locations() -> int:
+    shippers = await db.find(
+        "shippers",
+        {"location": {"$exists": False}, "latitude": {"$ne": None}, "longitude": {"$ne": None}},
+        {"latitude": 1, "longitude": 1}
+    )
+    operations = [
+        # find() devuelve _id como string; el documento guardado tiene ObjectId
+        UpdateOne({"_id": ObjectId(shipper["_id"])}, {"$set": {"location": geo_point(shipper["latitude"], shipper["longitude"])}})
+        for shipper in shippers
+    ]
+    result = await db.bulk_write("shippers", operations, ordered=False)
+    return result["modified_count"] if result else 0
+
+async def _main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="Delivery data maintenance")
+    parser.add_argument("command", choices=["backfill-locations"])
+    parser.parse_args(argv)
+    updated = await backfill_shipper_locations()
+    print(f"📍 Backfilled location for {updated} shipper(s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
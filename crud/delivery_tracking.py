@@ -0,0 +1,226 @@
+"""
+Trayectos GPS de entregas sobre colecciones time-series.
+
+`delivery_tracking` guarda los puntos crudos (timeField `timestamp`,
+metaField `meta` = {order_id, responsible_user_id}) y expira por TTL a los
+`tracking_raw_retention_days`. Un job de fondo (utils.tracking_downsampler)
+resume los puntos con más de `tracking_downsample_after_minutes` a uno por
+minuto en `delivery_tracking_minutely`, con retención propia. La marca de
+agua del job está en `jobs`, solo avanza sobre ventanas ya resumidas y
+separa ambas resoluciones: el trayecto de una
+orden se lee del resumen antes de la marca y de los puntos crudos después.
+
+Las colecciones se crean en ensure_indexes (indexes.COLLECTIONS). Una
+`delivery_tracking` previa creada como colección normal se convierte con:
+    python -m crud.delivery_tracking migrate
+"""
+import sys
+import asyncio
+import argparse
+from fastapi import HTTPException
+from pymongo import ASCENDING
+from config import settings
+from database import db
+from indexes import ensure_indexes
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional
+
+RAW = "delivery_tracking"
+MINUTELY = "delivery_tracking_minutely"
+JOB_ID = "delivery_tracking_downsample"
+DOWNSAMPLE_WINDOW = timedelta(hours=1)
+DOWNSAMPLE_LEASE = timedelta(minutes=10)
+MIGRATION_BATCH_SIZE = 1000
+
+def _naive_utc(moment: datetime) -> datetime:
+    if moment.tzinfo is not None:
+        return moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+def tracking_point(event: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+    """Documento time-series a partir de un DeliveryTrackingEvent"""
+    point = {key: value for key, value in event.items() if key not in ("order_id", "responsible_user_id", "timestamp")}
+    point["timestamp"] = _naive_utc(event["timestamp"])
+    point["meta"] = {"order_id": event["order_id"], "responsible_user_id": event.get("responsible_user_id") or user_id}
+    point["user_id"] = user_id
+    point["created_at"] = datetime.utcnow()
+    return point
+
+async def insert_tracking_point(event: Dict[str, Any], user_id: str) -> Optional[dict]:
+    return await db.insert_one(RAW, tracking_point(event, user_id))
+
+async def get_downsample_watermark() -> Optional[datetime]:
+    job = await db.find_one("jobs", {"_id": JOB_ID})
+    return job.get("until") if job else None
+
+async def downsample_next_window() -> Optional[int]:
+    """
+    Resumir la siguiente ventana pendiente a un punto por (orden,
+    responsable, minuto). La ventana se reclama con un lease
+    (`claimed_until`) y la marca de agua solo avanza cuando el resumen ya
+    está escrito, así que con varios workers cada una se procesa una vez y
+    un fallo o una caída a mitad la deja pendiente para el siguiente tick.
+    Devuelve puntos escritos o None si no hay ventana lista.
+    """
+    now = datetime.utcnow()
+    horizon = now - timedelta(minutes=settings.tracking_downsample_after_minutes)
+    start = await get_downsample_watermark()
+    if start is None:
+        oldest = await db.find(RAW, {}, {"timestamp": 1}, limit=1, sort=[("timestamp", ASCENDING)])
+        if not oldest:
+            return None
+        start = oldest[0]["timestamp"].replace(second=0, microsecond=0)
+        await db.insert_if_absent("jobs", {"_id": JOB_ID, "until": start})
+        start = await get_downsample_watermark()
+    end = min(start + DOWNSAMPLE_WINDOW, horizon.replace(second=0, microsecond=0))
+    if end <= start:
+        return None
+    lease = now + DOWNSAMPLE_LEASE
+    # `in_progress` queda en True si un intento anterior no llegó a avanzar la marca
+    previous = await db.find_one_and_update(
+        "jobs",
+        {"_id": JOB_ID, "until": start, "$or": [{"claimed_until": None}, {"claimed_until": {"$lt": now}}]},
+        {"$set": {"claimed_until": lease, "in_progress": True}},
+        return_updated=False
+    )
+    if not previous:
+        return None
+
+    try:
+        # Directo sobre la colección: db.aggregate devuelve [] ante un error y la ventana se perdería
+        points = await db.get_collection(RAW).aggregate([
+            {"$match": {"timestamp": {"$gte": start, "$lt": end}, "latitude": {"$ne": None}, "longitude": {"$ne": None}}},
+            {"$sort": {"timestamp": 1}},
+            {"$group": {
+                # $dateFromParts en lugar de $dateTrunc (5.0+) para servidores compatibles 4.x
+                "_id": {"meta": "$meta", "minute": {"$dateFromParts": {
+                    "year": {"$year": "$timestamp"},
+                    "month": {"$month": "$timestamp"},
+                    "day": {"$dayOfMonth": "$timestamp"},
+                    "hour": {"$hour": "$timestamp"},
+                    "minute": {"$minute": "$timestamp"}
+                }}},
+                "latitude": {"$last": "$latitude"},
+                "longitude": {"$last": "$longitude"},
+                "event_type": {"$last": "$event_type"},
+                "samples": {"$sum": 1}
+            }},
+            {"$project": {
+                "_id": 0,
+                "timestamp": "$_id.minute",
+                "meta": "$_id.meta",
+                "latitude": 1,
+                "longitude": 1,
+                "event_type": 1,
+                "samples": 1
+            }}
+        ]).to_list(length=None)
+        if previous.get("in_progress"):
+            # Un intento anterior pudo dejar la ventana escrita a medias
+            await db.delete_many(MINUTELY, {"timestamp": {"$gte": start, "$lt": end}})
+        if points:
+            for point in points:
+                # Lo usa el TTL de respaldo cuando la colección no es time-series
+                point["created_at"] = now
+            result = await db.insert_many(MINUTELY, points, ordered=False)
+            if not result or result["errors"]:
+                raise RuntimeError(f"insert into {MINUTELY} failed")
+    except Exception:
+        await db.update_one("jobs", {"_id": JOB_ID, "claimed_until": lease}, {"$set": {"claimed_until": None}})
+        print(f"Tracking downsample failed for window {start:%Y-%m-%d %H:%M} - {end:%H:%M}; will retry")
+        raise
+    await db.update_one("jobs", {"_id": JOB_ID, "until": start, "claimed_until": lease}, {"$set": {"until": end, "claimed_until": None, "in_progress": False, "updated_at": datetime.utcnow()}})
+    return len(points)
+
+async def _trail_points(collection_name: str, order_id: str, start: datetime, end: datetime, limit: int) -> List[dict]:
+    if start >= end:
+        return []
+    return await db.find(
+        collection_name,
+        {"meta.order_id": order_id, "timestamp": {"$gte": start, "$lt": end}},
+        {"_id": 0, "timestamp": 1, "latitude": 1, "longitude": 1, "event_type": 1, "samples": 1},
+        limit=limit,
+        sort=[("timestamp", ASCENDING)]
+    )
+
+async def get_delivery_trail(order_id: str, start: Optional[datetime] = None, end: Optional[datetime] = None, resolution: str = "auto") -> Dict[str, Any]:
+    """
+    Trayecto de una orden en [start, end), en orden cronológico (por
+    defecto, las últimas 24 horas). `raw` y `minute` fuerzan una
+    resolución; `auto` usa el resumen por minuto hasta la marca de agua
+    del downsampling y los puntos crudos desde ahí.
+    """
+    end = _naive_utc(end) if end else datetime.utcnow()
+    start = _naive_utc(start) if start else end - timedelta(days=1)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    limit = settings.tracking_trail_max_points
+    if resolution == "raw":
+        points = await _trail_points(RAW, order_id, start, end, limit)
+    elif resolution == "minute":
+        points = await _trail_points(MINUTELY, order_id, start, end, limit)
+    else:
+        split = min(max(await get_downsample_watermark() or start, start), end)
+        points = await _trail_points(MINUTELY, order_id, start, split, limit)
+        if len(points) < limit:
+            points += await _trail_points(RAW, order_id, split, end, limit - len(points))
+    return {
+        "order_id": order_id,
+        "resolution": resolution,
+        "start": start,
+        "end": end,
+        "truncated": len(points) >= limit,
+        "points": points
+    }
+
+async def migrate_legacy_collection() -> int:
+    """
+    Convertir una `delivery_tracking` normal en time-series: se renombra a
+    `delivery_tracking_legacy`, se crea la nueva y se copian los puntos.
+    """
+    names = await db.db.list_collection_names(filter={"name": RAW, "type": "collection"})
+    if not names:
+        print(f"{RAW} is already a time-series collection (or does not exist)")
+        return 0
+    legacy = f"{RAW}_legacy"
+    await db.get_collection(RAW).rename(legacy)
+    await ensure_indexes(db)
+    copied = 0
+    last_id = None
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        batch = await db.get_collection(legacy).find(query).sort("_id", ASCENDING).limit(MIGRATION_BATCH_SIZE).to_list(length=None)
+        if not batch:
+            return copied
+        last_id = batch[-1]["_id"]
+        points = []
+        for document in batch:
+            document.pop("_id")
+            if not document.get("order_id") or not document.get("timestamp"):
+                continue
+            point = tracking_point(document, document.get("user_id"))
+            point["created_at"] = document.get("created_at") or point["created_at"]
+            points.append(point)
+        if points:
+            result = await db.insert_many(RAW, points, ordered=False)
+            copied += result["inserted_count"] if result else 0
+
+async def _main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="Delivery tracking time-series maintenance")
+    parser.add_argument("command", choices=["migrate", "downsample"])
+    args = parser.parse_args(argv)
+    if args.command == "migrate":
+        copied = await migrate_legacy_collection()
+        print(f"🛰️  Copied {copied} tracking point(s) into the time-series collection")
+    else:
+        total = 0
+        while True:
+            written = await downsample_next_window()
+            if written is None:
+                break
+            total += written
+        print(f"🛰️  Wrote {total} downsampled point(s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
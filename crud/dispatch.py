@@ -0,0 +1,193 @@
+"""
+Despacho por lotes: asigna las órdenes pagadas sin shipper a los shippers
+disponibles y fija el orden de visita de cada ruta (utils.routing).
+
+Un tick carga hasta `dispatch_max_orders` órdenes (las más antiguas), los
+shippers disponibles con su posición viva del grid, resuelve en un hilo
+y escribe el resultado con un bulk_write por colección. Solo un worker
+despacha a la vez (lease en `jobs`), y cada orden se asigna con filtro
+`assigned_shipper_id: None`, así que una asignación manual concurrente
+nunca se pisa.
+
+Ejecución manual:
+    python -m crud.dispatch run
+"""
+import sys
+import asyncio
+import argparse
+import time
+import numpy as np
+from bson import ObjectId
+from pymongo import ASCENDING, UpdateOne
+from config import settings
+from database import db
+from crud.tracking import recent_events_push, bucket_operation, migrate_order_tracking, BUCKETS
+from utils.order_events import order_events
+from utils.routing import plan_routes, VEHICLE_PROFILES
+from utils.shipper_grid import shipper_grid
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+JOB_ID = "dispatch"
+LEASE = timedelta(minutes=5)
+PENDING_ORDER_PROJECTION = {"delivery_latitude": 1, "delivery_longitude": 1, "tracking_bucketed": 1}
+SHIPPER_PROJECTION = {"user_id": 1, "vehicle_type": 1, "latitude": 1, "longitude": 1, "assigned_orders_ids": 1}
+
+def _object_id(value: str) -> Any:
+    return ObjectId(value) if ObjectId.is_valid(value) else value
+
+async def _acquire_lease() -> bool:
+    now = datetime.utcnow()
+    job = await db.find_one_and_update(
+        "jobs",
+        {"_id": JOB_ID, "$or": [{"lease_until": {"$lt": now}}, {"lease_until": {"$exists": False}}]},
+        {"$set": {"lease_until": now + LEASE, "started_at": now}}
+    )
+    if job is not None:
+        return True
+    # Lease vigente, o primer tick: el insert crea el job ya reclamado y choca sin ruido si existe
+    return bool(await db.insert_if_absent("jobs", {"_id": JOB_ID, "lease_until": now + LEASE, "started_at": now}))
+
+async def _release_lease(summary: Dict[str, Any]):
+    await db.update_one("jobs", {"_id": JOB_ID}, {"$set": {"lease_until": datetime.utcnow(), "last_run": summary}})
+
+async def load_pending_orders(limit: int) -> List[dict]:
+    return await db.find(
+        "orders",
+        {"status": "paid", "assigned_shipper_id": None, "delivery_latitude": {"$ne": None}},
+        PENDING_ORDER_PROJECTION,
+        limit=limit,
+        sort=[("created_at", ASCENDING)]
+    )
+
+async def load_available_shippers() -> List[dict]:
+    shippers = await db.find("shippers", {"availability_status": "available", "latitude": {"$ne": None}}, SHIPPER_PROJECTION)
+    available = []
+    for shipper in shippers:
+        profile = VEHICLE_PROFILES.get(shipper.get("vehicle_type"))
+        if not profile or not shipper.get("user_id"):
+            continue
+        position = shipper_grid.get(shipper["id"])
+        if position is not None:
+            # El grid tiene la posición viva; la del documento es del último snapshot
+            if position.availability_status != "available":
+                continue
+            shipper["latitude"], shipper["longitude"] = position.latitude, position.longitude
+        shipper["remaining_capacity"] = profile["capacity"] - len(shipper.get("assigned_orders_ids", []))
+        shipper["max_range_m"] = profile["max_range_m"]
+        if shipper["remaining_capacity"] > 0:
+            available.append(shipper)
+    return available
+
+async def _write_assignments(orders: List[dict], shippers: List[dict], routes: List[List[int]]) -> int:
+    now = datetime.utcnow()
+    assignments = []
+    for shipper_index, route in enumerate(routes):
+        for sequence, order_index in enumerate(route):
+            assignments.append((orders[order_index], shippers[shipper_index], sequence))
+    if not assignments:
+        return 0
+
+    for order, _, _ in assignments:
+        if not order.get("tracking_bucketed"):
+            await migrate_order_tracking(_object_id(order["id"]))
+
+    events = {}
+    order_operations = []
+    for order, shipper, sequence in assignments:
+        event = {
+            "event_type": "shipper_assigned",
+            "timestamp": now,
+            "notes": f"Asignado al shipper {shipper['id']} (parada {sequence + 1})",
+            "responsible_user_id": "system"
+        }
+        events[order["id"]] = event
+        order_operations.append(UpdateOne(
+            # Sin tracking_bucketed (migración fallida) el $slice recortaría el historial embebido
+            {"_id": _object_id(order["id"]), "status": "paid", "assigned_shipper_id": None, "tracking_bucketed": True},
+            {
+                # Los permisos (crud.order.can_follow_order) comparan con el usuario, no con el documento del shipper
+                "$set": {"assigned_shipper_id": shipper["user_id"], "route_sequence": sequence, "updated_at": now},
+                "$push": recent_events_push(event)
+            }
+        ))
+    result = await db.bulk_write("orders", order_operations, ordered=False)
+    if result is None:
+        return 0
+
+    # Si alguna orden se asignó por otra vía entre la lectura y la escritura, confirmar cuáles quedaron nuestras
+    if result["modified_count"] < len(order_operations):
+        written = await db.find("orders", {"_id": {"$in": [_object_id(order["id"]) for order, _, _ in assignments]}}, {"assigned_shipper_id": 1})
+        owner = {order["id"]: order.get("assigned_shipper_id") for order in written}
+        assignments = [item for item in assignments if owner.get(item[0]["id"]) == item[1]["user_id"]]
+
+    by_shipper: Dict[str, List[str]] = {}
+    for order, shipper, _ in assignments:
+        by_shipper.setdefault(shipper["id"], []).append(order["id"])
+    full = {shipper["id"] for shipper in shippers if len(by_shipper.get(shipper["id"], [])) >= shipper["remaining_capacity"]}
+    shipper_operations = [
+        UpdateOne({"_id": _object_id(shipper_id)}, {
+            "$addToSet": {"assigned_orders_ids": {"$each": order_ids}},
+            "$set": {"updated_at": now, **({"availability_status": "busy"} if shipper_id in full else {})}
+        })
+        for shipper_id, order_ids in by_shipper.items()
+    ]
+    await db.bulk_write("shippers", shipper_operations, ordered=False)
+    for shipper_id in full:
+        shipper_grid.set_status(shipper_id, "busy")
+
+    await db.bulk_write(BUCKETS, [bucket_operation(order["id"], events[order["id"]]) for order, _, _ in assignments], ordered=False)
+    for order, _, _ in assignments:
+        order_events.publish(order["id"], events[order["id"]])
+    return len(assignments)
+
+async def run_dispatch(max_orders: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """Un tick de despacho; None si otro worker tiene el lease"""
+    if not await _acquire_lease():
+        return None
+    started = time.perf_counter()
+    summary: Dict[str, Any] = {"started_at": datetime.utcnow()}
+    try:
+        orders = await load_pending_orders(max_orders or settings.dispatch_max_orders)
+        shippers = await load_available_shippers()
+        loaded = time.perf_counter()
+        plan = await asyncio.to_thread(
+            plan_routes,
+            np.array([shipper["latitude"] for shipper in shippers], dtype=float),
+            np.array([shipper["longitude"] for shipper in shippers], dtype=float),
+            np.array([shipper["remaining_capacity"] for shipper in shippers], dtype=int),
+            np.array([shipper["max_range_m"] for shipper in shippers], dtype=float),
+            np.array([order["delivery_latitude"] for order in orders], dtype=float),
+            np.array([order["delivery_longitude"] for order in orders], dtype=float),
+            settings.dispatch_candidates
+        )
+        solved = time.perf_counter()
+        assigned = await _write_assignments(orders, shippers, plan.routes)
+        summary.update({
+            "orders": len(orders),
+            "shippers": len(shippers),
+            "assigned": assigned,
+            "unassigned": len(orders) - assigned,
+            "route_km": round(sum(plan.route_lengths_m) / 1000, 2),
+            "load_ms": round((loaded - started) * 1000, 1),
+            "solve_ms": round((solved - loaded) * 1000, 1),
+            "write_ms": round((time.perf_counter() - solved) * 1000, 1)
+        })
+        return summary
+    finally:
+        await _release_lease(summary)
+
+async def _main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="Batch order-to-shipper dispatch")
+    parser.add_argument("command", choices=["run"])
+    parser.add_argument("--max-orders", type=int, default=None)
+    args = parser.parse_args(argv)
+    summary = await run_dispatch(args.max_orders)
+    if summary is None:
+        print("Another worker holds the dispatch lease")
+        return 1
+    print(f"🚚 Dispatch: {summary}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
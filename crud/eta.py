@@ -0,0 +1,95 @@
+"""
+ETAs de las órdenes asignadas a un shipper.
+
+Se calculan todas a la vez (utils.eta) desde la posición más reciente del
+shipper, siguiendo `route_sequence`, y se cachean por shipper hasta su
+siguiente fix: la entrada guarda el `updated_at` de la posición con la que
+se calculó y deja de valer en cuanto el grid tiene uno distinto (o se
+invalida explícitamente desde update_shipper_location). Al recalcular,
+`estimated_delivery_time` se escribe en las órdenes cuyo valor guardado
+se desvía más de `eta_persist_min_change_seconds`.
+"""
+import numpy as np
+from bson import ObjectId
+from pymongo import UpdateOne
+from config import settings
+from database import db
+from utils.cache import TTLCache
+from utils.eta import route_etas
+from utils.shipper_grid import shipper_grid
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+ACTIVE_STATUSES = ("paid", "shipped")
+
+eta_cache = TTLCache(settings.eta_cache_size, settings.eta_cache_ttl_seconds)
+
+def _object_id(value: str) -> Any:
+    return ObjectId(value) if ObjectId.is_valid(value) else value
+
+def _shipper_position(shipper: dict):
+    """(lat, lng, versión) desde el grid si lo tiene, si no del documento"""
+    position = shipper_grid.get(shipper["id"])
+    if position is not None:
+        return position.latitude, position.longitude, position.updated_at
+    return shipper.get("latitude"), shipper.get("longitude"), shipper.get("updated_at")
+
+def _route_order(order: dict):
+    sequence = order.get("route_sequence")
+    return (sequence is None, sequence or 0, order.get("created_at") or datetime.min)
+
+def compute_etas(shipper: dict, orders: List[dict], now: Optional[datetime] = None) -> Dict[str, Dict[str, Any]]:
+    """ETA por order_id de las órdenes activas con coordenadas de entrega"""
+    latitude, longitude, _ = _shipper_position(shipper)
+    stops = sorted(
+        (order for order in orders if order.get("status") in ACTIVE_STATUSES and order.get("delivery_latitude") is not None and order.get("delivery_longitude") is not None),
+        key=_route_order
+    )
+    if latitude is None or longitude is None or not stops:
+        return {}
+    seconds, distance_m = route_etas(
+        latitude,
+        longitude,
+        np.array([order["delivery_latitude"] for order in stops], dtype=float),
+        np.array([order["delivery_longitude"] for order in stops], dtype=float),
+        shipper.get("vehicle_type")
+    )
+    now = now or datetime.utcnow()
+    return {
+        order["id"]: {
+            "stop": index + 1,
+            "eta_seconds": round(float(seconds[index])),
+            "distance_remaining_m": round(float(distance_m[index]), 1),
+            "estimated_delivery_time": now + timedelta(seconds=float(seconds[index]))
+        }
+        for index, order in enumerate(stops)
+    }
+
+async def _persist_etas(orders: List[dict], etas: Dict[str, Dict[str, Any]]):
+    threshold = timedelta(seconds=settings.eta_persist_min_change_seconds)
+    operations = []
+    for order in orders:
+        eta = etas.get(order["id"])
+        if eta is None:
+            continue
+        stored = order.get("estimated_delivery_time")
+        if stored is None or abs(stored - eta["estimated_delivery_time"]) >= threshold:
+            operations.append(UpdateOne({"_id": _object_id(order["id"])}, {"$set": {"estimated_delivery_time": eta["estimated_delivery_time"]}}))
+    if operations:
+        await db.bulk_write("orders", operations, ordered=False)
+
+async def get_shipper_etas(shipper: dict, orders: List[dict]) -> Dict[str, Dict[str, Any]]:
+    """ETAs cacheadas mientras la posición del shipper y su ruta no cambien"""
+    version = _shipper_position(shipper)[2]
+    # Una entrega o un cambio de secuencia también invalida
+    route = tuple(sorted((order["id"], order.get("status"), order.get("route_sequence")) for order in orders))
+    cached = eta_cache.get(shipper["id"])
+    if cached is not None and cached["version"] == version and cached["route"] == route:
+        return cached["etas"]
+    etas = compute_etas(shipper, orders)
+    eta_cache.set(shipper["id"], {"version": version, "route": route, "etas": etas})
+    await _persist_etas(orders, etas)
+    return etas
+
+def invalidate_shipper_etas(shipper_id: str):
+    eta_cache.invalidate(shipper_id)
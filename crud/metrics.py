@@ -0,0 +1,145 @@
+"""
+Rollup materializado de métricas por tienda (colección `store_metrics`).
+
+Un documento por tienda (`_id` = store_id) con totales y buckets diarios:
+    {"totals": {"orders", "revenue", "views", "conversions"},
+     "daily": {"YYYY-MM-DD": {"orders", "revenue", "views", "conversions"}}}
+
+Se actualiza con $inc en cada cambio de estado, así que las lecturas del
+dashboard son O(1). Para backfill o para corregir desvíos:
+    python -m crud.metrics rebuild [--store-id <id>]
+"""
+import sys
+import asyncio
+import argparse
+from database import db
+from utils.counters import counter_buffer
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, List
+
+METRIC_FIELDS = ("orders", "revenue", "views", "conversions")
+
+def _day_key(moment: Optional[datetime] = None) -> str:
+    return (moment or datetime.utcnow()).strftime("%Y-%m-%d")
+
+def _as_float(value: Any) -> float:
+    if isinstance(value, Decimal128):
+        value = value.to_decimal()
+    return float(value or 0)
+
+async def record_store_event(store_id: Optional[str], moment: Optional[datetime] = None, **values: float) -> bool:
+    """Incrementar totales y bucket diario de una tienda"""
+    if not store_id:
+        return False
+    day = _day_key(moment)
+    increments = {}
+    for field, value in values.items():
+        increments[f"totals.{field}"] = value
+        increments[f"daily.{day}.{field}"] = value
+    return await db.increment("store_metrics", {"_id": store_id}, increments, upsert=True)
+
+async def record_order(store_id: str, created_at: Optional[datetime] = None) -> bool:
+    return await record_store_event(store_id, created_at, orders=1)
+
+async def record_view(store_id: str, count: int = 1) -> bool:
+    # Las vistas son la métrica más caliente: van por el buffer write-behind
+    day = _day_key()
+    counter_buffer.increment(
+        "store_metrics", store_id, {"totals.views": count, f"daily.{day}.views": count}, upsert=True
+    )
+    return True
+
+async def record_conversion(store_id: str, amount: Any) -> bool:
+    return await record_store_event(store_id, conversions=1, revenue=_as_float(amount))
+
+async def revert_conversion(store_id: str, amount: Any) -> bool:
+    return await record_store_event(store_id, conversions=-1, revenue=-_as_float(amount))
+
+async def get_store_id_for_order(order_id: Optional[str]) -> Optional[str]:
+    if not order_id:
+        return None
+    # Igual que el $convert de rebuild_store_metrics: las órdenes se guardan con ObjectId
+    order = await db.find_one("orders", {"_id": ObjectId(order_id) if ObjectId.is_valid(order_id) else order_id}, {"store_id": 1})
+    return order.get("store_id") if order else None
+
+async def get_store_metrics(store_id: str, days: int = 30) -> Optional[dict]:
+    """Leer totales y los últimos `days` buckets diarios"""
+    today = datetime.utcnow()
+    projection = {"totals": 1}
+    for offset in range(days):
+        projection[f"daily.{_day_key(today - timedelta(days=offset))}"] = 1
+    return await db.find_one("store_metrics", {"_id": store_id}, projection)
+
+def _empty_rollup() -> Dict[str, Any]:
+    return {"totals": {field: 0 for field in METRIC_FIELDS}, "daily": {}}
+
+def _add(rollup: Dict[str, Any], day: Optional[str], field: str, value: float):
+    rollup["totals"][field] += value
+    if day:
+        bucket = rollup["daily"].setdefault(day, {metric: 0 for metric in METRIC_FIELDS})
+        bucket[field] += value
+
+async def rebuild_store_metrics(store_id: Optional[str] = None) -> int:
+    """
+    Recalcular rollups desde `orders` y `payments`. Las vistas no tienen
+    fuente cruda, por lo que se conservan las del rollup existente.
+    """
+    match = {"store_id": store_id} if store_id else {}
+    day_expr = {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at", "onNull": None}}
+
+    order_groups = await db.aggregate("orders", [
+        {"$match": match},
+        {"$group": {"_id": {"store_id": "$store_id", "day": day_expr}, "orders": {"$sum": 1}}}
+    ])
+    payment_groups = await db.aggregate("payments", [
+        {"$match": {"status": "succeeded"}},
+        {"$addFields": {"order_oid": {"$convert": {"input": "$order_id", "to": "objectId", "onError": None, "onNull": None}}}},
+        {"$lookup": {"from": "orders", "localField": "order_oid", "foreignField": "_id", "as": "order"}},
+        {"$unwind": "$order"},
+        {"$match": {"order.store_id": store_id} if store_id else {}},
+        {"$group": {
+            "_id": {"store_id": "$order.store_id", "day": day_expr},
+            "conversions": {"$sum": 1},
+            "revenue": {"$sum": "$amount"}
+        }}
+    ])
+
+    existing_query = {"_id": store_id} if store_id else {}
+    existing = await db.find("store_metrics", existing_query, {"daily": 1})
+
+    rollups: Dict[str, Dict[str, Any]] = {}
+    for document in existing:
+        rollup = rollups.setdefault(document["_id"], _empty_rollup())
+        for day, bucket in document.get("daily", {}).items():
+            _add(rollup, day, "views", bucket.get("views", 0))
+    for group in order_groups:
+        key = group["_id"]
+        if not key.get("store_id"):
+            continue
+        _add(rollups.setdefault(key["store_id"], _empty_rollup()), key.get("day"), "orders", group["orders"])
+    for group in payment_groups:
+        key = group["_id"]
+        if not key.get("store_id"):
+            continue
+        rollup = rollups.setdefault(key["store_id"], _empty_rollup())
+        _add(rollup, key.get("day"), "conversions", group["conversions"])
+        _add(rollup, key.get("day"), "revenue", _as_float(group["revenue"]))
+
+    for rollup_store_id, rollup in rollups.items():
+        rollup["rebuilt_at"] = datetime.utcnow()
+        await db.replace_one("store_metrics", {"_id": rollup_store_id}, rollup, upsert=True)
+    return len(rollups)
+
+async def _main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="Store metrics rollup maintenance")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--store-id", default=None)
+    args = parser.parse_args(argv)
+    rebuilt = await rebuild_store_metrics(args.store_id)
+    print(f"📊 Rebuilt metrics for {rebuilt} store(s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
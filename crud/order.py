@@ -1,23 +1,45 @@
 from database import db
 from models.order import OrderCreate, OrderUpdate, TrackingEvent
-from typing import List, Optional
+from utils.pagination import paginate, decode_id
+from crud.metrics import record_order
+from crud.tracking import append_tracking_event, bucket_tracking_event
+from crud.delivery import find_delivery_point_for_order
+from typing import List, Optional, Dict, Any
 from datetime import datetime
 
-async def create_order(order: OrderCreate, buyer_id: str) -> Optional[dict]:
+async def create_order(order: OrderCreate, buyer_id: str, buyer_city: Optional[str] = None) -> Optional[dict]:
     order_dict = order.dict()
     order_dict["buyer_id"] = buyer_id
+    order_dict["assigned_delivery_point_id"] = await find_delivery_point_for_order(order_dict, buyer_city)
     order_dict["tracking_number"] = f"TRK-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
-    order_dict["tracking_history"] = [{"event_type": "created", "timestamp": datetime.utcnow(), "notes": "Order created"}]
+    created_event = {"event_type": "created", "timestamp": datetime.utcnow(), "notes": "Order created"}
+    order_dict["tracking_history"] = [created_event]
+    order_dict["tracking_bucketed"] = True
+    order_dict["created_at"] = datetime.utcnow()
+    order_dict["updated_at"] = datetime.utcnow()
     # Calcular total_price si no está
     if "total_price" not in order_dict or not order_dict["total_price"]:
         order_dict["total_price"] = sum(item.price * item.quantity for item in order.items)
-    return db.insert_one("orders", order_dict)
+    result = await db.insert_one("orders", order_dict)
+    if result:
+        await bucket_tracking_event(result["id"], created_event)
+        await record_order(result["store_id"], result["created_at"])
+    return result
 
-async def get_order(order_id: str) -> Optional[dict]:
-    return db.find_one("orders", {"_id": order_id})
+def can_follow_order(order: dict, user: dict) -> bool:
+    """Admin, comprador o punto de entrega/shipper asignado"""
+    if user["role"] == "admin" or order.get("buyer_id") == user["id"]:
+        return True
+    return user["id"] in (order.get("assigned_delivery_point_id"), order.get("assigned_shipper_id"))
 
-async def get_orders_by_user(user_id: str, skip: int = 0, limit: int = 20) -> List[dict]:
-    return db.find("orders", {"buyer_id": user_id}, limit=limit)
+async def get_order(order_id: str, projection: Optional[Dict[str, Any]] = None) -> Optional[dict]:
+    return await db.find_one("orders", {"_id": decode_id(order_id)}, projection)
+
+async def get_orders(cursor: Optional[str] = None, limit: int = 20) -> Dict[str, Any]:
+    return await paginate("orders", {}, cursor, limit)
+
+async def get_orders_by_user(user_id: str, cursor: Optional[str] = None, limit: int = 20) -> Dict[str, Any]:
+    return await paginate("orders", {"buyer_id": user_id}, cursor, limit)
 
 async def update_order(order_id: str, order_update: OrderUpdate, buyer_id: str) -> Optional[dict]:
     query = {"_id": order_id, "buyer_id": buyer_id}
@@ -25,22 +47,19 @@ async def update_order(order_id: str, order_update: OrderUpdate, buyer_id: str)
     if "tracking_history" in update_dict:
         update_dict["tracking_history"] = order_update.tracking_history + [TrackingEvent(**event).dict() for event in update_dict["tracking_history"]]
     update_dict["updated_at"] = datetime.utcnow()
-    if db.update_one("orders", query, update_dict):
+    if await db.update_one("orders", query, update_dict):
         return await get_order(order_id)
     return None
 
 async def add_tracking_event(order_id: str, event: TrackingEvent, user_id: str) -> bool:
-    query = {"_id": order_id, "buyer_id": user_id}
     event_dict = event.dict()
     event_dict["timestamp"] = datetime.utcnow()
     event_dict["responsible_user_id"] = user_id
-    db.update_one("orders", query, {"$push": {"tracking_history": event_dict}})
-    # Update status based on event_type
+    # Update status based on event_type (same write as the event)
     status_map = {"delivered": "delivered", "cancelled": "cancelled"}
-    if event.event_type in status_map:
-        db.update_one("orders", query, {"status": status_map[event.event_type]})
-    return True
+    set_fields = {"status": status_map[event.event_type]} if event.event_type in status_map else {}
+    return await append_tracking_event(order_id, event_dict, {"buyer_id": user_id}, set_fields)
 
 async def delete_order(order_id: str, buyer_id: str) -> bool:
     query = {"_id": order_id, "buyer_id": buyer_id}
-    return db.delete_one("orders", query)
\ No newline at end of file
+    return await db.delete_one("orders", query)
\ No newline at end of file
@@ -2,6 +2,11 @@ from database import db
 from models.payment import PaymentCreate, Payment
 from models.order import OrderStatusEnum
 from utils.payments import process_culqi_payment
+from utils.culqi import culqi_client
+from utils.pagination import paginate, decode_id
+from crud.metrics import get_store_id_for_order, record_conversion, revert_conversion
+from utils.order_events import order_events
+from crud.tracking import append_tracking_event
 from datetime import datetime
 from typing import Dict, Any, Optional, List
 from fastapi import HTTPException
@@ -31,59 +36,69 @@ async def create_payment(payment: PaymentCreate, user_id: str) -> Optional[dict]
         payment_dict["updated_at"] = datetime.utcnow()
         
         # Insertar pago en MongoDB
-        result = db.insert_one("payments", payment_dict)
+        result = await db.insert_one("payments", payment_dict)
         
         if result:
-            # Actualizar estado de la orden a "paid"
-            order_update = {
-                "status": OrderStatusEnum.paid,
-                "payment_id": result["id"],
-                "updated_at": datetime.utcnow()
-            }
-            db.update_one("orders", {"_id": payment.order_id}, order_update)
-            
-            # Crear evento de tracking para la orden
+            # Estado "paid" y evento de tracking en una sola escritura atómica
             tracking_event = {
                 "event_type": "payment_confirmed",
                 "timestamp": datetime.utcnow(),
                 "notes": f"Pago procesado exitosamente - Charge ID: {culqi_result.get('id')}",
                 "responsible_user_id": user_id
             }
-            db.update_one("orders", {"_id": payment.order_id}, {"$push": {"tracking_history": tracking_event}})
+            if not await append_tracking_event(payment.order_id, tracking_event, set_fields={
+                "status": OrderStatusEnum.paid,
+                "payment_id": result["id"]
+            }):
+                print(f"Order {payment.order_id} not marked as paid for payment {result['id']}")
+            
+            if payment_dict["status"] == "succeeded":
+                await record_conversion(await get_store_id_for_order(payment.order_id), payment.amount)
         
         return result
         
     except HTTPException as e:
+        if e.status_code in (502, 504):
+            # Culqi no respondió: queda registro para conciliar. Un 504 pudo
+            # llegar a cobrar la tarjeta, así que se deja pendiente y no fallido
+            print(f"Payment error: {e.detail}")
+            await _insert_failed_payment(payment, user_id, "pending" if e.status_code == 504 else "failed", e.detail)
         # Errores de validación de FastAPI
         raise e
     except Exception as e:
         # Errores de Culqi o conexión
         print(f"Payment error: {str(e)}")
         # Crear pago fallido
-        payment_dict = payment.dict()
-        payment_dict["user_id"] = user_id
-        payment_dict["status"] = "failed"
-        payment_dict["error_message"] = str(e)
-        payment_dict["created_at"] = datetime.utcnow()
-        payment_dict["updated_at"] = datetime.utcnow()
-        failed_payment = db.insert_one("payments", payment_dict)
-        return failed_payment
+        return await _insert_failed_payment(payment, user_id, "failed", str(e))
+
+async def _insert_failed_payment(payment: PaymentCreate, user_id: str, status: str, error: str) -> Optional[dict]:
+    payment_dict = payment.dict()
+    payment_dict["user_id"] = user_id
+    payment_dict["status"] = status
+    payment_dict["error_message"] = error
+    payment_dict["created_at"] = datetime.utcnow()
+    payment_dict["updated_at"] = datetime.utcnow()
+    return await db.insert_one("payments", payment_dict)
 
 async def get_payment(payment_id: str) -> Optional[dict]:
     """Obtener pago por ID"""
-    return db.find_one("payments", {"_id": payment_id})
+    return await db.find_one("payments", {"_id": payment_id})
 
-async def get_payments_by_user(user_id: str, skip: int = 0, limit: int = 20) -> List[dict]:
-    """Obtener pagos de un usuario"""
-    return db.find("payments", {"user_id": user_id}, limit=limit)
+async def get_payments_by_user(user_id: str, cursor: Optional[str] = None, limit: int = 20) -> Dict[str, Any]:
+    """Obtener pagos de un usuario (paginado por cursor)"""
+    return await paginate("payments", {"user_id": user_id}, cursor, limit)
 
 async def get_payments_by_order(order_id: str) -> Optional[dict]:
     """Obtener pago de una orden específica"""
-    return db.find_one("payments", {"order_id": order_id})
+    return await db.find_one("payments", {"order_id": order_id})
 
 async def update_payment_status(payment_id: str, status: str, user_id: str = None) -> bool:
-    """Actualizar estado de pago (para webhooks)"""
-    query = {"_id": payment_id}
+    """
+    Actualizar estado de pago (para webhooks). Devuelve False también si el
+    pago pasó a succeeded pero la orden no pudo marcarse como pagada, para
+    que el llamador reintente; repetir el cambio de estado es inocuo.
+    """
+    query = {"_id": decode_id(payment_id)}
     if user_id:
         query["user_id"] = user_id
         
@@ -92,30 +107,41 @@ async def update_payment_status(payment_id: str, status: str, user_id: str = Non
         "updated_at": datetime.utcnow()
     }
     
-    result = db.update_one("payments", query, update)
+    # Una sola operación: aplica el cambio y devuelve el estado anterior
+    payment = await db.find_one_and_update("payments", query, {"$set": update}, return_updated=False)
+    result = payment is not None
+    
+    if result and payment.get("status") != status:
+        await _record_status_transition(payment, status)
     
     if result and status == "succeeded":
         # Actualizar orden si el pago es exitoso
-        payment = await get_payment(payment_id)
-        if payment and payment.get("order_id"):
-            order_update = {
-                "status": OrderStatusEnum.paid,
-                "payment_id": payment_id,
-                "updated_at": datetime.utcnow()
-            }
-            db.update_one("orders", {"_id": payment["order_id"]}, order_update)
-            
-            # Crear evento de tracking
+        if payment.get("order_id"):
             tracking_event = {
                 "event_type": "payment_confirmed",
                 "timestamp": datetime.utcnow(),
                 "notes": f"Pago confirmado exitosamente",
                 "responsible_user_id": "system"
             }
-            db.update_one("orders", {"_id": payment["order_id"]}, {"$push": {"tracking_history": tracking_event}})
+            if not await append_tracking_event(payment["order_id"], tracking_event, set_fields={
+                "status": OrderStatusEnum.paid,
+                "payment_id": payment_id
+            }):
+                print(f"Order {payment['order_id']} not marked as paid for payment {payment_id}")
+                return False
     
     return result
 
+async def _record_status_transition(payment: dict, status: str):
+    """Mantener el rollup de métricas al entrar/salir de succeeded"""
+    if status != "succeeded" and payment.get("status") != "succeeded":
+        return
+    store_id = await get_store_id_for_order(payment.get("order_id"))
+    if status == "succeeded":
+        await record_conversion(store_id, payment["amount"])
+    else:
+        await revert_conversion(store_id, payment["amount"])
+
 async def upload_yape_proof(payment_id: str, image_url: str, user_id: str) -> bool:
     """Subir comprobante de pago Yape"""
     query = {"_id": payment_id, "user_id": user_id}
@@ -124,7 +150,7 @@ async def upload_yape_proof(payment_id: str, image_url: str, user_id: str) -> bo
         "updated_at": datetime.utcnow(),
         "status": "pending_review"  # Cambiar a revisión manual
     }
-    return db.update_one("payments", query, update)
+    return await db.update_one("payments", query, update)
 
 async def handle_culqi_webhook(payload: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -140,7 +166,7 @@ async def handle_culqi_webhook(payload: Dict[str, Any]) -> Dict[str, Any]:
                 return {"status": "error", "message": "No charge ID in payload"}
             
             # Buscar pago relacionado
-            payment = db.find_one("payments", {"charge_id": charge_id})
+            payment = await db.find_one("payments", {"charge_id": charge_id})
             if not payment:
                 print(f"Payment not found for charge {charge_id}")
                 return {"status": "ignored", "message": "Payment not found"}
@@ -151,7 +177,9 @@ async def handle_culqi_webhook(payload: Dict[str, Any]) -> Dict[str, Any]:
                 if success:
                     print(f"Payment {payment['id']} marked as succeeded")
                 else:
+                    # Error: el worker reintenta con backoff (un reenvío de Culqi sería duplicado)
                     print(f"Failed to update payment {payment['id']} to succeeded")
+                    return {"status": "error", "message": f"Could not mark payment {payment['id']} as succeeded"}
                     
             elif action == "charge.rejected":
                 rejected = await update_payment_status(payment["id"], "failed")
@@ -159,6 +187,7 @@ async def handle_culqi_webhook(payload: Dict[str, Any]) -> Dict[str, Any]:
                     print(f"Payment {payment['id']} marked as failed")
                 else:
                     print(f"Failed to update payment {payment['id']} to failed")
+                    return {"status": "error", "message": f"Could not mark payment {payment['id']} as failed"}
             
             return {"status": "success", "payment_id": payment["id"], "action": action}
             
@@ -168,23 +197,32 @@ async def handle_culqi_webhook(payload: Dict[str, Any]) -> Dict[str, Any]:
         print(f"Webhook error: {str(e)}")
         return {"status": "error", "message": str(e)}
 
-async def get_payment_dashboard(user_id: str) -> List[dict]:
+DASHBOARD_ORDER_PROJECTION = {"total_price": 1, "status": 1, "delivery_address": 1, "created_at": 1}
+
+async def get_payment_dashboard(user_id: str, cursor: Optional[str] = None, limit: int = 20) -> Dict[str, Any]:
     """Dashboard de pagos para usuario/tienda"""
-    payments = await get_payments_by_user(user_id)
+    page = await get_payments_by_user(user_id, cursor, limit)
     
-    # Enriquecer con información de órdenes
-    for payment in payments:
-        if payment.get("order_id"):
-            order = db.find_one("orders", {"_id": payment["order_id"]})
-            if order:
-                payment["order"] = {
-                    "id": order["id"],
-                    "total_price": order["total_price"],
-                    "status": order["status"],
-                    "delivery_address": order["delivery_address"]
-                }
+    # Enriquecer con información de órdenes en una sola consulta $in
+    order_ids = list({payment["order_id"] for payment in page["items"] if payment.get("order_id")})
+    orders = {}
+    if order_ids:
+        # Las órdenes se guardan con ObjectId; los pagos referencian el id como string
+        found = await db.find("orders", {"_id": {"$in": [decode_id(order_id) for order_id in order_ids]}}, DASHBOARD_ORDER_PROJECTION)
+        orders = {order["_id"]: order for order in found}
+    
+    for payment in page["items"]:
+        order = orders.get(payment.get("order_id"))
+        if order:
+            payment["order_info"] = {
+                "id": order["_id"],
+                "total_price": str(order["total_price"]),
+                "status": order["status"],
+                "delivery_address": order.get("delivery_address", ""),
+                "created_at": order.get("created_at")
+            }
     
-    return payments
+    return page
 
 async def refund_payment(payment_id: str, user_id: str, reason: str) -> bool:
     """Procesar reembolso de pago"""
@@ -197,23 +235,16 @@ async def refund_payment(payment_id: str, user_id: str, reason: str) -> bool:
     
     # Llamada a Culqi para reembolso (implementar según docs)
     try:
-        headers = {
-            "Authorization": f"Bearer {settings.culqi_secret_key}",
-            "Content-Type": "application/json",
-        }
         refund_data = {
             "amount": int(float(payment["amount"]) * 100),
+            "charge_id": payment["charge_id"],
             "reason": reason
         }
-        response = requests.post(
-            f"https://api.culqi.com/v1/refunds/{payment['charge_id']}",
-            headers=headers,
-            json=refund_data
-        )
+        response = await culqi_client.post("/refunds", refund_data)
         
         if response.status_code == 201:
             # Marcar como reembolsado
-            db.update_one("payments", {"_id": payment_id}, {
+            await db.update_one("payments", {"_id": payment_id}, {
                 "status": "refunded",
                 "refund_reason": reason,
                 "updated_at": datetime.utcnow()
@@ -221,11 +252,13 @@ async def refund_payment(payment_id: str, user_id: str, reason: str) -> bool:
             
             # Actualizar orden
             if payment.get("order_id"):
-                db.update_one("orders", {"_id": payment["order_id"]}, {
+                if await db.update_one("orders", {"_id": payment["order_id"]}, {
                     "status": "refunded",
                     "updated_at": datetime.utcnow()
-                })
+                }):
+                    order_events.publish(payment["order_id"], status="refunded")
             
+            await _record_status_transition(payment, "refunded")
             return True
         else:
             print(f"Refund failed: {response.text}")
@@ -5,13 +5,13 @@ from datetime import datetime, timedelta
 
 async def create_plan_definition(plan: PlanDefinitionCreate) -> Optional[dict]:
     plan_dict = plan.dict()
-    return db.insert_one("plan_definitions", plan_dict)
+    return await db.insert_one("plan_definitions", plan_dict)
 
 async def get_plan_definitions() -> List[dict]:
-    return db.find("plan_definitions", {})
+    return await db.find("plan_definitions", {})
 
 async def create_subscription(store_id: str, plan_type: str, amount: float) -> Optional[dict]:
-    definition = db.find_one("plan_definitions", {"plan_type": plan_type})
+    definition = await db.find_one("plan_definitions", {"plan_type": plan_type})
     if not definition:
         return None
     duration_days = 7  # Weekly
@@ -29,9 +29,9 @@ async def create_subscription(store_id: str, plan_type: str, amount: float) -> O
         "is_active": True,
         "store_id": store_id
     }
-    result = db.insert_one("subscription_plans", plan_dict)
+    result = await db.insert_one("subscription_plans", plan_dict)
     if result:
-        db.update_one("stores", {"_id": store_id}, {"current_plan": result})
+        await db.update_one("stores", {"_id": store_id}, {"current_plan": result})
     return result
 
 async def add_payment_to_store(store_id: str, payment: PaymentCreate) -> Optional[dict]:
@@ -39,11 +39,11 @@ async def add_payment_to_store(store_id: str, payment: PaymentCreate) -> Optiona
     payment_dict = payment.dict()
     payment_dict["payment_date"] = datetime.utcnow()
     payment_dict["end_date"] = payment.payment_date + timedelta(days=7)  # Example
-    result = db.update_one("stores", query, {"$push": {"payment_history": payment_dict}})
+    result = await db.update_one("stores", query, {"$push": {"payment_history": payment_dict}, "$set": {"updated_at": datetime.utcnow()}})
     if result:
         # Update subscription end date
-        db.update_one("subscription_plans", {"store_id": store_id}, {"end_date": payment_dict["end_date"]})
+        await db.update_one("subscription_plans", {"store_id": store_id}, {"end_date": payment_dict["end_date"]})
     return payment_dict if result else None
 
 async def get_subscription_plans(store_id: str) -> List[dict]:
-    return db.find("subscription_plans", {"store_id": store_id})
\ No newline at end of file
+    return await db.find("subscription_plans", {"store_id": store_id})
\ No newline at end of file
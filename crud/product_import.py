@@ -0,0 +1,197 @@
+"""
+Importación masiva de productos en streaming (CSV o NDJSON).
+
+El cuerpo de la petición se procesa línea a línea según llega, cada fila se
+valida con ProductCreate y se hace upsert por (store_id, sku) en lotes con
+un único bulk_write por lote. La memoria no depende del tamaño del archivo:
+solo se retiene el lote en curso y, como mucho, MAX_REPORTED_ERRORS errores.
+
+El progreso se guarda en `product_imports` tras cada lote para poder
+consultarlo mientras la importación sigue en curso.
+"""
+import csv
+import json
+import codecs
+from bson import ObjectId
+from pymongo import UpdateOne
+from pydantic import ValidationError
+from database import db
+from models.product import ProductCreate
+from datetime import datetime
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+LIST_FIELDS = ("images", "tags")
+LIST_SEPARATOR = "|"
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Partir un stream de bytes en líneas de texto sin cargarlo entero"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+async def iter_csv_records(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Filas CSV como dicts. Un campo entre comillas puede contener saltos de
+    línea: se acumulan líneas hasta que las comillas quedan balanceadas.
+    """
+    header: Optional[List[str]] = None
+    pending = ""
+    row_number = 0
+    async for line in lines:
+        pending = f"{pending}\n{line}" if pending else line
+        if pending.count('"') % 2:
+            continue
+        record, pending = pending, ""
+        if not record.strip():
+            continue
+        values = next(csv.reader([record]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        row_number += 1
+        row = {}
+        for name, value in zip(header, values):
+            value = value.strip()
+            if value == "":
+                continue
+            row[name] = [item.strip() for item in value.split(LIST_SEPARATOR) if item.strip()] if name in LIST_FIELDS else value
+        yield row_number, row
+
+async def iter_ndjson_records(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, Any]]:
+    row_number = 0
+    async for line in lines:
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            yield row_number, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield row_number, e
+
+def _upsert_operation(product: ProductCreate, now: datetime) -> UpdateOne:
+    fields = product.dict()
+    return UpdateOne(
+        {"store_id": product.store_id, "sku": product.sku},
+        {
+            "$set": {**fields, "updated_at": now},
+            "$setOnInsert": {
+                "views": 0,
+                "sells_count": 0,
+                "comments_count": 0,
+                "average_rating": 0.0,
+                "created_at": now
+            }
+        },
+        upsert=True
+    )
+
+class ImportReport:
+    def __init__(self, import_id: str, store_id: str):
+        self.import_id = import_id
+        self.store_id = store_id
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    def add_error(self, row: int, message: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "error": message})
+
+    def as_dict(self, status: str) -> Dict[str, Any]:
+        return {
+            "store_id": self.store_id,
+            "status": status,
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors)
+        }
+
+async def _flush(batch: Dict[str, Tuple[int, ProductCreate]], report: ImportReport):
+    if not batch:
+        return
+    now = datetime.utcnow()
+    rows = list(batch.values())
+    result = await db.bulk_write("products", [_upsert_operation(product, now) for _, product in rows], ordered=False)
+    if result is None:
+        for row_number, _ in rows:
+            report.add_error(row_number, "Database error while writing batch")
+    else:
+        for error in result["errors"]:
+            report.add_error(rows[error["index"]][0], error["message"] or "Write error")
+        report.inserted += result["upserted_count"]
+        report.updated += result["matched_count"]
+    await db.update_one("product_imports", {"_id": report.import_id}, {
+        "$set": {**report.as_dict("running"), "updated_at": now}
+    })
+
+async def import_products_stream(store_id: str, file_format: str, chunks: AsyncIterator[bytes], user_id: str) -> Dict[str, Any]:
+    # _id string para poder consultar el progreso con el mismo id que se devuelve
+    started = await db.insert_one("product_imports", {
+        "_id": str(ObjectId()),
+        "store_id": store_id,
+        "user_id": user_id,
+        "format": file_format,
+        "status": "running",
+        "created_at": datetime.utcnow(),
+        "updated_at": datetime.utcnow()
+    })
+    if not started:
+        return None
+    report = ImportReport(started["id"], store_id)
+
+    lines = iter_lines(chunks)
+    records = iter_csv_records(lines) if file_format == "csv" else iter_ndjson_records(lines)
+
+    # Lote indexado por sku: si un sku se repite dentro del lote gana la última fila
+    batch: Dict[str, Tuple[int, ProductCreate]] = {}
+    status = "completed"
+    try:
+        async for row_number, record in records:
+            report.rows += 1
+            if isinstance(record, Exception):
+                report.add_error(row_number, f"Invalid JSON: {record}")
+                continue
+            if not isinstance(record, dict):
+                report.add_error(row_number, "Row must be an object")
+                continue
+            try:
+                product = ProductCreate(**{**record, "store_id": store_id})
+            except ValidationError as e:
+                report.add_error(row_number, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+                continue
+            if not product.sku:
+                report.add_error(row_number, "sku: required for import")
+                continue
+            batch[product.sku] = (row_number, product)
+            if len(batch) >= BATCH_SIZE:
+                await _flush(batch, report)
+                batch = {}
+        await _flush(batch, report)
+    except Exception as e:
+        print(f"Product import error: {e}")
+        status = "failed"
+        report.add_error(report.rows, f"Import aborted: {e}")
+
+    summary = report.as_dict(status)
+    await db.update_one("product_imports", {"_id": report.import_id}, {
+        "$set": {**summary, "updated_at": datetime.utcnow(), "finished_at": datetime.utcnow()}
+    })
+    return {"id": report.import_id, **summary}
+
+async def get_product_import(import_id: str) -> Optional[dict]:
+    return await db.find_one("product_imports", {"_id": import_id})
@@ -0,0 +1,57 @@
+"""
+Búsqueda full-text de tiendas y productos sobre los índices de texto de
+MongoDB (ver indexes.py), ordenada por relevancia y paginada por keyset
+sobre (score, _id).
+"""
+from fastapi import HTTPException
+from database import db
+from utils.pagination import encode_token, decode_token, decode_id, MAX_PAGE_SIZE
+from typing import Dict, Any, Optional, List
+
+def _decode_search_cursor(cursor: str):
+    try:
+        payload = decode_token(cursor)
+        return float(payload["s"]), decode_id(payload["i"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+async def _text_search(collection_name: str, text: str, filters: Dict[str, Any], cursor: Optional[str], limit: int) -> Dict[str, Any]:
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    pipeline: List[Dict[str, Any]] = [
+        # $text debe ser la primera etapa para usar el índice de texto
+        {"$match": {"$text": {"$search": text}, **filters}},
+        {"$addFields": {"score": {"$meta": "textScore"}}},
+    ]
+    if cursor:
+        last_score, last_id = _decode_search_cursor(cursor)
+        pipeline.append({"$match": {"$or": [
+            {"score": {"$lt": last_score}},
+            {"score": last_score, "_id": {"$lt": last_id}}
+        ]}})
+    pipeline += [
+        {"$sort": {"score": -1, "_id": -1}},
+        {"$limit": limit + 1}
+    ]
+    documents = await db.aggregate(collection_name, pipeline)
+    has_more = len(documents) > limit
+    items = documents[:limit]
+    next_cursor = None
+    if has_more and items:
+        next_cursor = encode_token({"s": items[-1]["score"], "i": items[-1]["_id"]})
+    return {"items": items, "next_cursor": next_cursor}
+
+async def search_stores(text: str, category: Optional[str] = None, city: Optional[str] = None, cursor: Optional[str] = None, limit: int = 20) -> Dict[str, Any]:
+    filters = {}
+    if category:
+        filters["category"] = category
+    if city:
+        filters["city"] = city
+    return await _text_search("stores", text, filters, cursor, limit)
+
+async def search_products(text: str, category: Optional[str] = None, store_id: Optional[str] = None, cursor: Optional[str] = None, limit: int = 20) -> Dict[str, Any]:
+    filters = {}
+    if category:
+        filters["category"] = category
+    if store_id:
+        filters["store_id"] = store_id
+    return await _text_search("products", text, filters, cursor, limit)
@@ -1,19 +1,72 @@
 from database import db
 from models.store import StoreCreate, StoreUpdate
-from typing import List
+from utils.pagination import paginate, decode_id
+from typing import List, Optional, Dict, Any
 
 async def create_store(store: StoreCreate) -> dict:
-    return db.insert_one("stores", store.dict())
+    return await db.insert_one("stores", store.dict())
 
-async def get_store(store_id: str) -> dict:
-    return db.find_one("stores", {"_id": store_id})
+async def get_store(store_id: str, projection: Optional[Dict[str, Any]] = None) -> dict:
+    return await db.find_one("stores", {"_id": decode_id(store_id)}, projection)
 
-async def get_stores(skip: int = 0, limit: int = 20) -> List[dict]:
+async def get_store_owner_id(store_id: str) -> Optional[str]:
+    store = await db.find_one("stores", {"_id": decode_id(store_id)}, {"owner_id": 1})
+    return store.get("owner_id") if store else None
+
+async def get_stores(category: Optional[str] = None, city: Optional[str] = None, cursor: Optional[str] = None, limit: int = 20) -> Dict[str, Any]:
     query = {}
-    return db.find("stores", query, limit=limit)
+    if category:
+        query["category"] = category
+    if city:
+        query["city"] = city
+    return await paginate("stores", query, cursor, limit)
 
 async def update_store(store_id: str, store: StoreUpdate) -> bool:
-    return db.update_one("stores", {"_id": store_id}, store.dict(exclude_unset=True))
+    return await db.update_one("stores", {"_id": store_id}, store.dict(exclude_unset=True))
 
 async def delete_store(store_id: str) -> bool:
-    return db.delete_one("stores", {"_id": store_id})
\ No newline at end of file
+    return await db.delete_one("stores", {"_id": store_id})
+
+def _store_lookup(collection_name: str, pipeline: List[Dict[str, Any]], alias: str, field: str = "store_id") -> Dict[str, Any]:
+    # $eq dentro de $expr usa el índice de `field` en el sub-pipeline
+    return {"$lookup": {
+        "from": collection_name,
+        "let": {"store_id": {"$toString": "$_id"}},
+        "pipeline": [{"$match": {"$expr": {"$eq": [f"${field}", "$$store_id"]}}}] + pipeline,
+        "as": alias
+    }}
+
+async def get_store_dashboard(owner_id: str) -> Optional[dict]:
+    """
+    Tienda + métricas en un solo round trip. Se usan sub-pipelines $lookup
+    en lugar de $facet porque las etapas dentro de $facet no usan índices.
+    Órdenes e ingresos salen del rollup `store_metrics` (ver crud.metrics).
+    """
+    pipeline = [
+        {"$match": {"owner_id": owner_id}},
+        {"$limit": 1},
+        _store_lookup("products", [{"$count": "value"}], "product_count"),
+        _store_lookup("products", [{"$sort": {"created_at": -1, "_id": -1}}, {"$limit": 5}], "recent_products"),
+        _store_lookup("store_metrics", [{"$project": {"_id": 0, "totals": 1}}], "rollup", field="_id"),
+    ]
+    results = await db.aggregate("stores", pipeline)
+    if not results:
+        return None
+    store = results[0]
+    product_count = store.pop("product_count")
+    rollup = store.pop("rollup")
+    totals = rollup[0]["totals"] if rollup else {}
+    products_count = product_count[0]["value"] if product_count else 0
+    orders_count = totals.get("orders", 0)
+    revenue = totals.get("revenue", 0)
+    for product in store["recent_products"]:
+        product["_id"] = str(product["_id"])
+    views = store.get("views", 0)
+    store["metrics"] = {
+        "total_products": products_count,
+        "total_orders": orders_count,
+        "total_sales": float(revenue),
+        "total_conversions": totals.get("conversions", 0),
+        "conversion_rate": (orders_count / views) * 100 if views > 0 else 0
+    }
+    return store
@@ -0,0 +1,180 @@
+"""
+Historial de tracking de órdenes en buckets (`order_tracking_buckets`).
+
+Cada bucket agrupa eventos de una orden y un día, hasta BUCKET_SIZE
+eventos: {order_id, day, count, first_at, last_at, events: [...]}. La orden
+solo conserva los últimos `settings.tracking_recent_events` eventos en
+`tracking_history`, así su tamaño queda acotado aunque el envío tenga
+cientos de escaneos; el historial completo se pagina desde los buckets.
+
+Las órdenes anteriores a este esquema (sin `tracking_bucketed`) se migran
+solas en su siguiente evento, o todas de una vez con:
+    python -m crud.tracking migrate
+"""
+import sys
+import asyncio
+import argparse
+from fastapi import HTTPException
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from config import settings
+from database import db
+from utils.order_events import order_events
+from utils.pagination import encode_token, decode_token, decode_id, MAX_PAGE_SIZE
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+BUCKETS = "order_tracking_buckets"
+BUCKET_SIZE = 200
+
+def _day_key(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%d")
+
+def recent_events_push(*events: Dict[str, Any]) -> Dict[str, Any]:
+    """$push que añade eventos a la orden conservando solo los más recientes"""
+    return {"tracking_history": {"$each": list(events), "$slice": -settings.tracking_recent_events}}
+
+def bucket_operation(order_id: str, event: Dict[str, Any]) -> UpdateOne:
+    """Upsert del evento en el bucket del día, para escrituras en lote"""
+    timestamp = event.get("timestamp") or datetime.utcnow()
+    # Si el bucket del día está lleno el filtro no casa y el upsert abre uno nuevo
+    return UpdateOne({"order_id": order_id, "day": _day_key(timestamp), "count": {"$lt": BUCKET_SIZE}}, {
+        "$push": {"events": event},
+        "$inc": {"count": 1},
+        "$min": {"first_at": timestamp},
+        "$max": {"last_at": timestamp}
+    }, upsert=True)
+
+async def bucket_tracking_event(order_id: str, event: Dict[str, Any]) -> bool:
+    result = await db.bulk_write(BUCKETS, [bucket_operation(order_id, event)])
+    return bool(result) and not result["errors"]
+
+async def append_tracking_event(order_id: str, event: Dict[str, Any], query: Optional[Dict[str, Any]] = None, set_fields: Optional[Dict[str, Any]] = None) -> bool:
+    """
+    Añadir un evento a la orden (con `set_fields` en la misma escritura) y a
+    su bucket, y publicarlo a las suscripciones en vivo. `query` añade
+    condiciones al filtro de la orden (p. ej. permisos). Devuelve False si
+    la orden no existe o no cumple `query`: entonces no se escribe nada.
+    """
+    # La orden se guarda con ObjectId; buckets y suscripciones usan el string
+    order_key = str(order_id)
+    order_query = {"_id": decode_id(order_key), **(query or {}), "tracking_bucketed": True}
+    update = {
+        "$set": {"updated_at": datetime.utcnow(), **(set_fields or {})},
+        "$push": recent_events_push(event)
+    }
+    updated = await db.update_one("orders", order_query, update)
+    if not updated and await migrate_order_tracking(order_query["_id"]):
+        updated = await db.update_one("orders", order_query, update)
+    if not updated:
+        return False
+    await bucket_tracking_event(order_key, event)
+    status = (set_fields or {}).get("status")
+    order_events.publish(order_key, event, getattr(status, "value", status))
+    return True
+
+def _build_buckets(order_id: str, events: List[Dict[str, Any]], fallback: datetime) -> List[Dict[str, Any]]:
+    buckets: List[Dict[str, Any]] = []
+    current: Optional[Dict[str, Any]] = None
+    for event in events:
+        timestamp = event.get("timestamp") or fallback
+        day = _day_key(timestamp)
+        if current is None or current["day"] != day or current["count"] >= BUCKET_SIZE:
+            current = {"order_id": order_id, "day": day, "count": 0, "first_at": timestamp, "last_at": timestamp, "events": []}
+            buckets.append(current)
+        current["events"].append(event)
+        current["count"] += 1
+        current["first_at"] = min(current["first_at"], timestamp)
+        current["last_at"] = max(current["last_at"], timestamp)
+    return buckets
+
+async def migrate_order_tracking(order_id: Any) -> bool:
+    """
+    Pasar el historial embebido de una orden antigua a buckets. El flag se
+    reclama de forma atómica, así que solo un proceso migra cada orden.
+    Acepta el id como string o ObjectId.
+    """
+    order_id = decode_id(order_id)
+    order = await db.find_one_and_update(
+        "orders",
+        {"_id": order_id, "tracking_bucketed": {"$ne": True}},
+        {"$set": {"tracking_bucketed": True}},
+        return_updated=False
+    )
+    if not order:
+        return False
+    events = order.get("tracking_history", [])
+    buckets = _build_buckets(str(order_id), events, order.get("created_at") or datetime.utcnow())
+    if buckets:
+        result = await db.insert_many(BUCKETS, buckets)
+        if not result or result["errors"]:
+            # Soltar el flag: sin él no se recorta el historial embebido y la migración se reintenta
+            restore = {"$set": {"tracking_bucketed": order["tracking_bucketed"]}} if "tracking_bucketed" in order else {"$unset": {"tracking_bucketed": ""}}
+            await db.update_one("orders", {"_id": order_id}, restore)
+            if result and result["inserted_count"]:
+                await db.delete_many(BUCKETS, {"_id": {"$in": [decode_id(_id) for _id in result["inserted_ids"]]}})
+            print(f"Tracking migration failed for order {order_id}; embedded history left untouched")
+            return False
+    # Recortar con $slice también conserva los eventos añadidos después de reclamar el flag
+    await db.update_one("orders", {"_id": order_id}, {"$push": recent_events_push()})
+    return True
+
+async def migrate_all_tracking(batch_size: int = 500) -> int:
+    migrated = 0
+    query: Dict[str, Any] = {"tracking_bucketed": {"$ne": True}}
+    while True:
+        pending = await db.find("orders", query, {"_id": 1}, limit=batch_size, sort=[("_id", ASCENDING)])
+        if not pending:
+            return migrated
+        for order in pending:
+            # find() devuelve _id como string; se migra con el _id tal como está guardado
+            if await migrate_order_tracking(decode_id(order["_id"])):
+                migrated += 1
+        query["_id"] = {"$gt": decode_id(pending[-1]["_id"])}
+
+def _decode_history_cursor(cursor: str):
+    try:
+        payload = decode_token(cursor)
+        return decode_id(payload["b"]), int(payload["i"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+async def get_tracking_history(order_id: str, cursor: Optional[str] = None, limit: int = 50) -> Dict[str, Any]:
+    """
+    Historial completo, del evento más reciente al más antiguo. El cursor
+    apunta a (bucket, posición): los buckets se recorren por _id
+    descendente y los eventos de cada uno al revés.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query: Dict[str, Any] = {"order_id": order_id}
+    end_index = None
+    if cursor:
+        bucket_id, end_index = _decode_history_cursor(cursor)
+        query["_id"] = {"$lte": bucket_id}
+
+    items: List[Dict[str, Any]] = []
+    while True:
+        buckets = await db.find(BUCKETS, query, limit=2, sort=[("_id", DESCENDING)])
+        for bucket in buckets:
+            events = bucket.get("events", [])
+            index = len(events) if end_index is None else end_index
+            end_index = None
+            while index > 0:
+                if len(items) == limit:
+                    return {"items": items, "next_cursor": encode_token({"b": bucket["_id"], "i": index})}
+                index -= 1
+                items.append(events[index])
+        if len(buckets) < 2:
+            return {"items": items, "next_cursor": None}
+        query["_id"] = {"$lt": decode_id(buckets[-1]["_id"])}
+
+async def _main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="Order tracking history maintenance")
+    parser.add_argument("command", choices=["migrate"])
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args(argv)
+    migrated = await migrate_all_tracking(args.batch_size)
+    print(f"📦 Moved tracking history of {migrated} order(s) into buckets")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main(sys.argv[1:])))
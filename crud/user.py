@@ -1,30 +1,30 @@
 from database import db
 from models.user import UserCreate, UserUpdate
-from utils.auth import create_access_token
-from passlib.context import CryptContext
-import bcrypt
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from utils.auth import create_access_token, invalidate_user
+from utils.passwords import password_hasher
+from config import settings
+from datetime import timedelta
 
 async def create_user(user: UserCreate):
-    existing = db.find_one("users", {"username": user.username})
+    existing = await db.find_one("users", {"username": user.username})
     if existing:
         raise ValueError("User already exists")
-    hashed_password = pwd_context.hash(user.password)
+    hashed_password = await password_hasher.hash(user.password)
     user_dict = user.dict()
     user_dict["password"] = hashed_password
     user_dict["is_active"] = True
     user_dict["is_staff"] = False
     user_dict["is_superuser"] = False
-    result = db.insert_one("users", user_dict)
+    result = await db.insert_one("users", user_dict)
+    invalidate_user(user.username)
     return result
 
 async def get_user(username: str):
-    return db.find_one("users", {"username": username})
+    return await db.find_one("users", {"username": username})
 
 async def authenticate_user(username: str, password: str):
     user = await get_user(username)
-    if not user or not pwd_context.verify(password, user["password"]):
+    if not user or not await password_hasher.verify(password, user["password"]):
         return False
     return user
 
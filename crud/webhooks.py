@@ -0,0 +1,112 @@
+"""
+Inbox durable de webhooks de Culqi (colección `webhook_inbox`).
+
+El handler HTTP solo persiste el evento y responde; un pool de workers
+(utils.webhook_worker) lo procesa después. El `_id` del evento es
+`charge_id:action`, así que los reintentos de Culqi se deduplican en la
+inserción y un mismo evento nunca se aplica dos veces.
+
+Cada claim deja un `lease_token` nuevo; completar o fallar un evento solo
+escribe si el token sigue siendo el del worker, así que uno cuyo lease
+venció (y otro worker ya retomó el evento) no pisa el estado.
+"""
+import uuid
+from database import db
+from config import settings
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+
+INBOX = "webhook_inbox"
+
+def webhook_dedup_key(payload: Dict[str, Any]) -> Optional[str]:
+    charge = payload.get("data", {}).get("object", {})
+    charge_id = charge.get("id")
+    if payload.get("object") != "Charge" or not charge_id:
+        return None
+    return f"{charge_id}:{charge.get('action')}"
+
+async def enqueue_culqi_webhook(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Persistir el webhook; devuelve si era nuevo o un duplicado"""
+    key = webhook_dedup_key(payload)
+    if not key:
+        return {"status": "ignored", "message": "Not a charge event"}
+    now = datetime.utcnow()
+    inserted = await db.insert_if_absent(INBOX, {
+        "_id": key,
+        "payload": payload,
+        "status": "pending",
+        "attempts": 0,
+        "received_at": now,
+        "next_attempt_at": now
+    })
+    if inserted is None:
+        return {"status": "error", "message": "Could not persist webhook"}
+    return {"status": "queued" if inserted else "duplicate", "event_id": key}
+
+async def claim_next_webhook() -> Optional[dict]:
+    """Tomar el siguiente evento pendiente (o con lease vencido) de forma atómica"""
+    now = datetime.utcnow()
+    return await db.find_one_and_update(
+        INBOX,
+        {"$or": [
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "processing", "locked_until": {"$lt": now}}
+        ]},
+        {
+            "$set": {
+                "status": "processing",
+                "locked_until": now + timedelta(seconds=settings.webhook_lease_seconds),
+                "lease_token": uuid.uuid4().hex
+            },
+            "$inc": {"attempts": 1}
+        },
+        sort=[("next_attempt_at", 1)]
+    )
+
+def _lease_filter(event: dict) -> Dict[str, Any]:
+    """Solo el worker que aún tiene el lease del evento puede cerrarlo"""
+    return {"_id": event["_id"], "status": "processing", "lease_token": event.get("lease_token")}
+
+async def complete_webhook(event: dict, result: Dict[str, Any]) -> Optional[dict]:
+    """None si el lease se perdió: otro worker ya tomó el evento"""
+    now = datetime.utcnow()
+    return await db.find_one_and_update(INBOX, _lease_filter(event), {
+        "$set": {"status": "done", "result": result, "processed_at": now, "lag_seconds": (now - event["received_at"]).total_seconds()},
+        "$unset": {"locked_until": "", "lease_token": ""}
+    })
+
+async def fail_webhook(event: dict, error: str) -> Optional[dict]:
+    """
+    Reprogramar con backoff exponencial o marcar como dead al agotar
+    intentos; None si el lease se perdió
+    """
+    now = datetime.utcnow()
+    if event["attempts"] >= settings.webhook_max_attempts:
+        update = {"status": "dead", "last_error": error, "processed_at": now}
+    else:
+        delay = settings.webhook_poll_interval_seconds * (2 ** event["attempts"])
+        update = {"status": "pending", "last_error": error, "next_attempt_at": now + timedelta(seconds=delay)}
+    return await db.find_one_and_update(INBOX, _lease_filter(event), {"$set": update, "$unset": {"locked_until": "", "lease_token": ""}})
+
+async def get_webhook_inbox_metrics() -> Dict[str, Any]:
+    """Profundidad de cola y lag de procesamiento"""
+    now = datetime.utcnow()
+    pending = await db.count_documents(INBOX, {"status": "pending"})
+    processing = await db.count_documents(INBOX, {"status": "processing"})
+    dead = await db.count_documents(INBOX, {"status": "dead"})
+    oldest = await db.find(INBOX, {"status": "pending"}, {"received_at": 1}, limit=1, sort=[("status", 1), ("received_at", 1)])
+    recent = await db.aggregate(INBOX, [
+        {"$match": {"status": "done", "processed_at": {"$gte": now - timedelta(minutes=5)}}},
+        {"$group": {"_id": None, "processed": {"$sum": 1}, "avg_lag_seconds": {"$avg": "$lag_seconds"}, "max_lag_seconds": {"$max": "$lag_seconds"}}}
+    ])
+    window = recent[0] if recent else {}
+    return {
+        "queue_depth": pending + processing,
+        "pending": pending,
+        "processing": processing,
+        "dead": dead,
+        "oldest_pending_age_seconds": (now - oldest[0]["received_at"]).total_seconds() if oldest else 0.0,
+        "processed_last_5m": window.get("processed", 0),
+        "avg_lag_seconds_last_5m": window.get("avg_lag_seconds") or 0.0,
+        "max_lag_seconds_last_5m": window.get("max_lag_seconds") or 0.0
+    }
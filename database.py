@@ -1,19 +1,63 @@
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, ConnectionFailure, DuplicateKeyError
+from bson import ObjectId
+from bson.codec_options import TypeCodec, TypeRegistry
+from bson.decimal128 import Decimal128
+from decimal import Decimal
 from config import settings
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
+
+class DecimalCodec(TypeCodec):
+    """Los modelos usan Decimal para montos; BSON los guarda como Decimal128"""
+    python_type = Decimal
+    bson_type = Decimal128
+
+    def transform_python(self, value):
+        return Decimal128(value)
+
+    def transform_bson(self, value):
+        return value.to_decimal()
+
+def serialize_document(document: Dict[str, Any]) -> Dict[str, Any]:
+    # Los modelos y routers trabajan con `id` como string
+    if '_id' in document:
+        document['_id'] = str(document['_id'])
+        document['id'] = document['_id']
+    return document
+
+def as_update_document(update: Dict[str, Any]) -> Dict[str, Any]:
+    if update and all(key.startswith('$') for key in update):
+        return update
+    if any(key.startswith('$') for key in update):
+        raise ValueError("Update mixes operators and plain fields")
+    return {'$set': update}
+
+def bulk_write_errors(error: BulkWriteError) -> List[Dict[str, Any]]:
+    return [
+        {"index": write_error["index"], "code": write_error.get("code"), "message": write_error.get("errmsg")}
+        for write_error in error.details.get("writeErrors", [])
+    ]
 
 class Database:
     def __init__(self):
-        self.client: Optional[MongoClient] = None
+        self.client: Optional[AsyncIOMotorClient] = None
         self.db = None
         self.connect()
 
     def connect(self):
+        # El cliente async no abre sockets hasta la primera operación
+        self.client = AsyncIOMotorClient(
+            settings.mongo_uri,
+            serverSelectionTimeoutMS=5000,
+            maxPoolSize=settings.mongo_max_pool_size,
+            type_registry=TypeRegistry([DecimalCodec()])
+        )
+        self.db = self.client[settings.mongo_uri.split('/')[-1]]  # Extrae DB name
+
+    async def ping(self):
         try:
-            self.client = MongoClient(settings.mongo_uri, serverSelectionTimeoutMS=5000)
-            self.client.admin.command('ping')
-            self.db = self.client[settings.mongo_uri.split('/')[-1]]  # Extrae DB name
+            await self.client.admin.command('ping')
             print("✅ Connected to GaussDB NoSQL")
         except ConnectionFailure as e:
             print(f"❌ Database connection failed: {e}")
@@ -26,57 +70,203 @@ class Database:
     def get_collection(self, collection_name: str):
         return self.db[collection_name]
 
-    def insert_one(self, collection_name: str, document: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    async def insert_one(self, collection_name: str, document: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         try:
             collection = self.get_collection(collection_name)
-            result = collection.insert_one(document)
-            document['_id'] = str(result.inserted_id)
-            return document
+            result = await collection.insert_one(document)
+            document['_id'] = result.inserted_id
+            return serialize_document(document)
         except Exception as e:
             print(f"Error inserting document: {e}")
             return None
 
-    def find_one(self, collection_name: str, query: Dict[str, Any], projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    async def insert_if_absent(self, collection_name: str, document: Dict[str, Any]) -> Optional[bool]:
+        """True si se insertó, False si ya existía un documento con ese _id, None si falló"""
         try:
             collection = self.get_collection(collection_name)
-            result = collection.find_one(query, projection)
+            await collection.insert_one(document)
+            return True
+        except DuplicateKeyError:
+            return False
+        except Exception as e:
+            print(f"Error inserting document: {e}")
+            return None
+
+    async def find_one(self, collection_name: str, query: Dict[str, Any], projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        try:
+            collection = self.get_collection(collection_name)
+            result = await collection.find_one(query, projection)
             if result:
-                result['_id'] = str(result['_id'])
+                serialize_document(result)
             return result
         except Exception as e:
             print(f"Error finding document: {e}")
             return None
 
-    def find(self, collection_name: str, query: Dict[str, Any] = {}, projection: Optional[Dict[str, Any]] = None, limit: int = 0) -> List[Dict[str, Any]]:
+    async def find(self, collection_name: str, query: Dict[str, Any] = {}, projection: Optional[Dict[str, Any]] = None, limit: int = 0, sort: Optional[List[Tuple[str, int]]] = None) -> List[Dict[str, Any]]:
         try:
             collection = self.get_collection(collection_name)
             cursor = collection.find(query, projection)
+            if sort:
+                cursor = cursor.sort(sort)
             if limit:
                 cursor = cursor.limit(limit)
-            results = list(cursor)
+            results = await cursor.to_list(length=None)
             for result in results:
-                result['_id'] = str(result['_id'])
+                serialize_document(result)
             return results
         except Exception as e:
             print(f"Error finding documents: {e}")
             return []
 
-    def update_one(self, collection_name: str, query: Dict[str, Any], update: Dict[str, Any]) -> bool:
+    async def find_one_and_update(self, collection_name: str, query: Dict[str, Any], update: Dict[str, Any], sort: Optional[List[Tuple[str, int]]] = None, upsert: bool = False, return_updated: bool = True) -> Optional[Dict[str, Any]]:
+        """Actualización atómica; devuelve el documento actualizado (o el anterior con return_updated=False)"""
+        try:
+            collection = self.get_collection(collection_name)
+            result = await collection.find_one_and_update(
+                query,
+                as_update_document(update),
+                sort=sort,
+                upsert=upsert,
+                return_document=ReturnDocument.AFTER if return_updated else ReturnDocument.BEFORE
+            )
+            if result:
+                serialize_document(result)
+            return result
+        except Exception as e:
+            print(f"Error in find_one_and_update: {e}")
+            return None
+
+    async def count_documents(self, collection_name: str, query: Dict[str, Any]) -> int:
+        try:
+            collection = self.get_collection(collection_name)
+            return await collection.count_documents(query)
+        except Exception as e:
+            print(f"Error counting documents: {e}")
+            return 0
+
+    async def aggregate(self, collection_name: str, pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        try:
+            collection = self.get_collection(collection_name)
+            results = await collection.aggregate(pipeline).to_list(length=None)
+            for result in results:
+                # Solo los _id de documento; los de $group pueden ser claves compuestas
+                if isinstance(result.get('_id'), ObjectId):
+                    serialize_document(result)
+            return results
+        except Exception as e:
+            print(f"Error aggregating documents: {e}")
+            return []
+
+    async def update_one(self, collection_name: str, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False) -> bool:
+        """
+        `update` puede ser un documento de operadores crudo ($set, $push,
+        $inc... combinados en una sola escritura) o un dict plano de campos,
+        que se envuelve en $set.
+        """
         try:
             collection = self.get_collection(collection_name)
-            result = collection.update_one(query, {'$set': update})
-            return result.modified_count > 0
+            result = await collection.update_one(query, as_update_document(update), upsert=upsert)
+            return result.modified_count > 0 or result.upserted_id is not None
         except Exception as e:
             print(f"Error updating document: {e}")
             return False
 
-    def delete_one(self, collection_name: str, query: Dict[str, Any]) -> bool:
+    async def increment(self, collection_name: str, query: Dict[str, Any], increments: Dict[str, Any], upsert: bool = False) -> bool:
+        return await self.update_one(collection_name, query, {'$inc': increments}, upsert=upsert)
+
+    async def replace_one(self, collection_name: str, query: Dict[str, Any], document: Dict[str, Any], upsert: bool = False) -> bool:
+        try:
+            collection = self.get_collection(collection_name)
+            result = await collection.replace_one(query, document, upsert=upsert)
+            return result.modified_count > 0 or result.upserted_id is not None
+        except Exception as e:
+            print(f"Error replacing document: {e}")
+            return False
+
+    async def insert_many(self, collection_name: str, documents: List[Dict[str, Any]], ordered: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Insertar en un solo round trip. Con ordered=False el servidor sigue
+        tras un error y `errors` indica qué documentos (por índice) fallaron.
+        """
+        if not documents:
+            return {"inserted_count": 0, "inserted_ids": [], "errors": []}
+        try:
+            collection = self.get_collection(collection_name)
+            result = await collection.insert_many(documents, ordered=ordered)
+            return {"inserted_count": len(result.inserted_ids), "inserted_ids": [str(_id) for _id in result.inserted_ids], "errors": []}
+        except BulkWriteError as e:
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            inserted_ids = [str(document["_id"]) for index, document in enumerate(documents) if index not in failed and "_id" in document]
+            if ordered and failed:
+                # En modo ordenado nada después del primer error se intentó
+                inserted_ids = inserted_ids[:min(failed)]
+            return {"inserted_count": e.details.get("nInserted", 0), "inserted_ids": inserted_ids, "errors": bulk_write_errors(e)}
+        except Exception as e:
+            print(f"Error inserting documents: {e}")
+            return None
+
+    async def update_many(self, collection_name: str, query: Dict[str, Any], update: Dict[str, Any], upsert: bool = False) -> Optional[Dict[str, int]]:
+        try:
+            collection = self.get_collection(collection_name)
+            result = await collection.update_many(query, as_update_document(update), upsert=upsert)
+            return {
+                "matched_count": result.matched_count,
+                "modified_count": result.modified_count,
+                "upserted_count": 1 if result.upserted_id is not None else 0
+            }
+        except Exception as e:
+            print(f"Error updating documents: {e}")
+            return None
+
+    async def delete_many(self, collection_name: str, query: Dict[str, Any]) -> Optional[Dict[str, int]]:
+        try:
+            collection = self.get_collection(collection_name)
+            result = await collection.delete_many(query)
+            return {"deleted_count": result.deleted_count}
+        except Exception as e:
+            print(f"Error deleting documents: {e}")
+            return None
+
+    async def bulk_write(self, collection_name: str, operations: List[Any], ordered: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Ejecutar operaciones mixtas (InsertOne, UpdateOne, DeleteMany...) en
+        un round trip. Los fallos por operación se devuelven en `errors`
+        con su índice; None solo si falló la llamada completa.
+        """
+        if not operations:
+            return {"inserted_count": 0, "matched_count": 0, "modified_count": 0, "deleted_count": 0, "upserted_count": 0, "errors": []}
+        try:
+            collection = self.get_collection(collection_name)
+            result = await collection.bulk_write(operations, ordered=ordered)
+            return {
+                "inserted_count": result.inserted_count,
+                "matched_count": result.matched_count,
+                "modified_count": result.modified_count,
+                "deleted_count": result.deleted_count,
+                "upserted_count": result.upserted_count,
+                "errors": []
+            }
+        except BulkWriteError as e:
+            return {
+                "inserted_count": e.details.get("nInserted", 0),
+                "matched_count": e.details.get("nMatched", 0),
+                "modified_count": e.details.get("nModified", 0),
+                "deleted_count": e.details.get("nRemoved", 0),
+                "upserted_count": e.details.get("nUpserted", 0),
+                "errors": bulk_write_errors(e)
+            }
+        except Exception as e:
+            print(f"Error in bulk write: {e}")
+            return None
+
+    async def delete_one(self, collection_name: str, query: Dict[str, Any]) -> bool:
         try:
             collection = self.get_collection(collection_name)
-            result = collection.delete_one(query)
+            result = await collection.delete_one(query)
             return result.deleted_count > 0
         except Exception as e:
             print(f"Error deleting document: {e}")
             return False
 
-db = Database()
\ No newline at end of file
+db = Database()
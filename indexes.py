@@ -0,0 +1,236 @@
+"""
+Registro declarativo de índices por colección.
+
+`ensure_indexes` se ejecuta en el startup y es idempotente: create_indexes
+no hace nada si el índice ya existe con la misma especificación.
+
+Las colecciones que necesitan opciones de creación (time-series) se
+declaran en COLLECTIONS y se crean antes que los índices. Las time-series
+requieren MongoDB 5.0+; si el servidor no las soporta se usan colecciones
+normales que expiran por un índice TTL sobre `created_at`.
+
+Modo check (para CI / antes de desplegar):
+    python -m indexes --check
+ejecuta explain() sobre las formas de consulta que usa cada función de
+`crud` y falla si alguna termina en un COLLSCAN.
+"""
+import sys
+import asyncio
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+from config import settings
+from typing import Dict, List, Any
+
+# Colecciones con opciones de creación; expireAfterSeconds se resincroniza con collMod
+COLLECTIONS: Dict[str, Dict[str, Any]] = {
+    "delivery_tracking": {
+        "timeseries": {"timeField": "timestamp", "metaField": "meta", "granularity": "seconds"},
+        "expireAfterSeconds": settings.tracking_raw_retention_days * 86400,
+    },
+    "delivery_tracking_minutely": {
+        "timeseries": {"timeField": "timestamp", "metaField": "meta", "granularity": "minutes"},
+        "expireAfterSeconds": settings.tracking_minutely_retention_days * 86400,
+    },
+}
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+    ],
+    "stores": [
+        IndexModel([("owner_id", ASCENDING)], name="owner_id"),
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id"),
+        IndexModel([("category", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="category_created_at_id"),
+        IndexModel([("city", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="city_created_at_id"),
+        IndexModel(
+            [("name", TEXT), ("description", TEXT), ("tags", TEXT), ("category", TEXT)],
+            name="search_text",
+            weights={"name": 10, "tags": 5, "category": 3, "description": 1},
+            default_language="spanish"
+        ),
+    ],
+    "products": [
+        # Cubre también las búsquedas por igualdad sobre store_id
+        IndexModel([("store_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="store_id_created_at_id"),
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id"),
+        IndexModel(
+            [("name", TEXT), ("description", TEXT), ("tags", TEXT), ("category", TEXT), ("brand", TEXT)],
+            name="search_text",
+            weights={"name": 10, "tags": 5, "brand": 3, "category": 3, "description": 1},
+            default_language="spanish"
+        ),
+        # Clave de upsert de la importación masiva (crud.product_import)
+        IndexModel(
+            [("store_id", ASCENDING), ("sku", ASCENDING)],
+            name="store_id_sku_unique",
+            unique=True,
+            partialFilterExpression={"sku": {"$type": "string"}}
+        ),
+    ],
+    "orders": [
+        IndexModel([("buyer_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="buyer_id_created_at_id"),
+        # Cubre el recálculo de órdenes por tienda/día (crud.metrics) sin leer los documentos
+        IndexModel([("store_id", ASCENDING), ("created_at", DESCENDING)], name="store_id_created_at"),
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at_id"),
+        # Órdenes pagadas sin shipper, por antigüedad (crud.dispatch)
+        IndexModel([("status", ASCENDING), ("assigned_shipper_id", ASCENDING), ("created_at", ASCENDING)], name="status_assigned_shipper_created_at"),
+    ],
+    "order_tracking_buckets": [
+        # Historial paginado y upsert del bucket del día (crud.tracking)
+        IndexModel([("order_id", ASCENDING), ("_id", DESCENDING)], name="order_id_id"),
+    ],
+    "payments": [
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="user_id_created_at_id"),
+        IndexModel([("charge_id", ASCENDING)], name="charge_id", sparse=True),
+        IndexModel([("order_id", ASCENDING)], name="order_id"),
+    ],
+    "webhook_inbox": [
+        IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_next_attempt_at"),
+        IndexModel([("status", ASCENDING), ("received_at", ASCENDING)], name="status_received_at"),
+        IndexModel([("status", ASCENDING), ("processed_at", ASCENDING)], name="status_processed_at"),
+        # Los eventos procesados se conservan para deduplicar durante la ventana de reintentos de Culqi
+        IndexModel([("processed_at", ASCENDING)], name="processed_at_ttl", expireAfterSeconds=settings.webhook_retention_days * 86400),
+    ],
+    "shippers": [
+        # $geoNear de crud.delivery.get_nearby_shippers
+        IndexModel([("location", GEOSPHERE)], name="location_2dsphere"),
+        IndexModel([("user_id", ASCENDING)], name="user_id"),
+        IndexModel([("availability_status", ASCENDING)], name="availability_status"),
+        # Sincronización entre workers de utils.shipper_grid
+        IndexModel([("position_written_at", ASCENDING)], name="position_written_at"),
+    ],
+    "delivery_points": [
+        # Versión de la colección que vigila utils.delivery_point_index
+        IndexModel([("updated_at", DESCENDING)], name="updated_at"),
+    ],
+    "delivery_tracking": [
+        # Trayecto por orden y rango de tiempo (crud.delivery_tracking)
+        IndexModel([("meta.order_id", ASCENDING), ("timestamp", ASCENDING)], name="order_id_timestamp"),
+        IndexModel([("timestamp", ASCENDING)], name="timestamp"),
+    ],
+    "delivery_tracking_minutely": [
+        IndexModel([("meta.order_id", ASCENDING), ("timestamp", ASCENDING)], name="order_id_timestamp"),
+    ],
+    "plan_definitions": [
+        IndexModel([("plan_type", ASCENDING)], name="plan_type"),
+    ],
+    "subscription_plans": [
+        IndexModel([("store_id", ASCENDING)], name="store_id"),
+    ],
+}
+
+# Mismo orden que utils.pagination.KEYSET_SORT
+KEYSET_SORT = [("created_at", DESCENDING), ("_id", DESCENDING)]
+
+# Formas de consulta usadas por crud/routers: (origen, colección, filtro, sort)
+QUERY_SHAPES: List[Dict[str, Any]] = [
+    {"source": "utils.auth.get_current_user", "collection": "users", "filter": {"username": "x"}},
+    {"source": "crud.user.get_user", "collection": "users", "filter": {"username": "x"}},
+    {"source": "crud.store.get_store_dashboard", "collection": "stores", "filter": {"owner_id": "x"}},
+    {"source": "crud.store.get_stores", "collection": "stores", "filter": {}, "sort": KEYSET_SORT},
+    {"source": "crud.store.get_stores", "collection": "stores", "filter": {"city": "x"}, "sort": KEYSET_SORT},
+    {"source": "crud.store.get_stores", "collection": "stores", "filter": {"category": "x"}, "sort": KEYSET_SORT},
+    {"source": "crud.search.search_stores", "collection": "stores", "filter": {"$text": {"$search": "x"}, "city": "x"}},
+    {"source": "crud.search.search_products", "collection": "products", "filter": {"$text": {"$search": "x"}}},
+    {"source": "crud.product.get_products", "collection": "products", "filter": {}, "sort": KEYSET_SORT},
+    {"source": "crud.product.get_products_by_store", "collection": "products", "filter": {"store_id": "x"}, "sort": KEYSET_SORT},
+    {"source": "crud.product_import.import_products_stream", "collection": "products", "filter": {"store_id": "x", "sku": "x"}},
+    {"source": "crud.order.get_orders", "collection": "orders", "filter": {}, "sort": KEYSET_SORT},
+    {"source": "crud.order.get_orders_by_user", "collection": "orders", "filter": {"buyer_id": "x"}, "sort": KEYSET_SORT},
+    {"source": "crud.tracking.get_tracking_history", "collection": "order_tracking_buckets", "filter": {"order_id": "x"}, "sort": [("_id", DESCENDING)]},
+    {"source": "crud.tracking.bucket_tracking_event", "collection": "order_tracking_buckets", "filter": {"order_id": "x", "day": "x", "count": {"$lt": 1}}},
+    {"source": "crud.metrics.rebuild_store_metrics", "collection": "orders", "filter": {"store_id": "x"}},
+    {"source": "crud.store.get_store_dashboard", "collection": "products", "filter": {"store_id": "x"}, "sort": KEYSET_SORT},
+    {"source": "crud.payment.get_payments_by_user", "collection": "payments", "filter": {"user_id": "x"}, "sort": KEYSET_SORT},
+    {"source": "crud.payment.get_payments_by_order", "collection": "payments", "filter": {"order_id": "x"}},
+    {"source": "crud.payment.handle_culqi_webhook", "collection": "payments", "filter": {"charge_id": "x"}},
+    {"source": "crud.webhooks.claim_next_webhook", "collection": "webhook_inbox", "filter": {"status": "pending", "next_attempt_at": {"$lte": 0}}, "sort": [("next_attempt_at", ASCENDING)]},
+    {"source": "crud.webhooks.get_webhook_inbox_metrics", "collection": "webhook_inbox", "filter": {"status": "pending"}, "sort": [("status", ASCENDING), ("received_at", ASCENDING)]},
+    {"source": "crud.delivery.get_nearby_shippers", "collection": "shippers", "filter": {"location": {"$nearSphere": {"$geometry": {"type": "Point", "coordinates": [0, 0]}}}, "availability_status": "available"}},
+    {"source": "utils.shipper_grid.ShipperGrid.refresh", "collection": "shippers", "filter": {"position_written_at": {"$gt": 0}}},
+    {"source": "utils.delivery_point_index.DeliveryPointIndex.refresh", "collection": "delivery_points", "filter": {}, "sort": [("updated_at", DESCENDING)]},
+    {"source": "crud.delivery_tracking.get_delivery_trail", "collection": "delivery_tracking", "filter": {"meta.order_id": "x", "timestamp": {"$gte": 0}}, "sort": [("timestamp", ASCENDING)]},
+    {"source": "crud.delivery_tracking.get_delivery_trail", "collection": "delivery_tracking_minutely", "filter": {"meta.order_id": "x", "timestamp": {"$gte": 0}}, "sort": [("timestamp", ASCENDING)]},
+    {"source": "crud.dispatch.load_pending_orders", "collection": "orders", "filter": {"status": "paid", "assigned_shipper_id": None, "delivery_latitude": {"$ne": None}}, "sort": [("created_at", ASCENDING)]},
+    {"source": "crud.dispatch.load_available_shippers", "collection": "shippers", "filter": {"availability_status": "available", "latitude": {"$ne": None}}},
+    {"source": "crud.plan.create_subscription", "collection": "plan_definitions", "filter": {"plan_type": "x"}},
+    {"source": "crud.plan.get_subscription_plans", "collection": "subscription_plans", "filter": {"store_id": "x"}},
+]
+
+FALLBACK_TTL_INDEX = "created_at_ttl"
+
+async def _ensure_fallback_ttl(database, collection_name: str, expire_after_seconds: int) -> None:
+    collection = database.get_collection(collection_name)
+    try:
+        await collection.create_index([("created_at", ASCENDING)], name=FALLBACK_TTL_INDEX, expireAfterSeconds=expire_after_seconds)
+    except OperationFailure:
+        # El índice ya existe con otra retención
+        await database.db.command("collMod", collection_name, index={"name": FALLBACK_TTL_INDEX, "expireAfterSeconds": expire_after_seconds})
+
+async def ensure_collections(database) -> None:
+    cursor = await database.db.list_collections()
+    existing = {info["name"]: info async for info in cursor}
+    for collection_name, options in COLLECTIONS.items():
+        info = existing.get(collection_name)
+        if info is None:
+            try:
+                await database.db.create_collection(collection_name, **options)
+                print(f"🗂️  Created collection {collection_name}")
+            except OperationFailure as e:
+                print(f"⚠️  {collection_name}: time-series collections are not supported ({e}); using a regular collection with a TTL on created_at")
+                await _ensure_fallback_ttl(database, collection_name, options["expireAfterSeconds"])
+        elif "timeseries" in options and info.get("type") != "timeseries":
+            print(f"⚠️  {collection_name} is not a time-series collection; on MongoDB 5.0+ run `python -m crud.delivery_tracking migrate`")
+            await _ensure_fallback_ttl(database, collection_name, options["expireAfterSeconds"])
+        elif "expireAfterSeconds" in options and info.get("options", {}).get("expireAfterSeconds") != options["expireAfterSeconds"]:
+            await database.db.command("collMod", collection_name, expireAfterSeconds=options["expireAfterSeconds"])
+
+async def ensure_indexes(database) -> None:
+    await ensure_collections(database)
+    for collection_name, models in INDEXES.items():
+        if not models:
+            continue
+        created = await database.get_collection(collection_name).create_indexes(models)
+        print(f"📇 Indexes ready on {collection_name}: {', '.join(created)}")
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    stages = [plan.get("stage")]
+    if "inputStage" in plan:
+        stages.extend(_plan_stages(plan["inputStage"]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_plan_stages(child))
+    # Los planes de SBE anidan el plan clásico bajo queryPlan
+    if "queryPlan" in plan:
+        stages.extend(_plan_stages(plan["queryPlan"]))
+    return [stage for stage in stages if stage]
+
+async def check_query_shapes(database) -> List[Dict[str, Any]]:
+    """Devuelve las formas de consulta cuyo plan ganador hace COLLSCAN"""
+    failures = []
+    for shape in QUERY_SHAPES:
+        cursor = database.get_collection(shape["collection"]).find(shape["filter"])
+        if shape.get("sort"):
+            cursor = cursor.sort(shape["sort"])
+        explain = await cursor.explain()
+        winning_plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+        stages = _plan_stages(winning_plan)
+        status = "COLLSCAN" if "COLLSCAN" in stages else "ok"
+        print(f"{status:<9} {shape['collection']:<20} {shape['source']:<45} {' > '.join(stages)}")
+        if status == "COLLSCAN":
+            failures.append(shape)
+    return failures
+
+async def _main(check: bool) -> int:
+    from database import db
+    await db.ping()
+    await ensure_indexes(db)
+    if check:
+        failures = await check_query_shapes(db)
+        if failures:
+            print(f"❌ {len(failures)} query shape(s) fall back to a collection scan")
+            return 1
+        print("✅ Every registered query shape uses an index")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main("--check" in sys.argv[1:])))
@@ -3,6 +3,16 @@ from fastapi.middleware.cors import CORSMiddleware
 from routers import accounts, stores, products, orders, deliveries, payments, plans
 from config import settings
 from database import db
+from indexes import ensure_indexes
+from utils.counters import counter_buffer
+from utils.passwords import password_hasher
+from utils.culqi import culqi_client
+from utils.webhook_worker import webhook_workers
+from utils.shipper_grid import shipper_grid
+from utils.order_events import order_events
+from utils.tracking_downsampler import tracking_downsampler
+from utils.dispatcher import dispatch_scheduler
+from utils.delivery_point_index import delivery_point_index
 
 app = FastAPI(
     title=settings.project_name,
@@ -31,9 +41,29 @@ app.include_router(plans.router, prefix="/api/plans", tags=["Plans"])
 @app.on_event("startup")
 async def startup_event():
     print("🚀 Starting FastAPI with GaussDB NoSQL")
+    await db.ping()
+    await ensure_indexes(db)
+    counter_buffer.start()
+    password_hasher.start()
+    culqi_client.start()
+    webhook_workers.start()
+    await shipper_grid.start()
+    await delivery_point_index.start()
+    order_events.start()
+    tracking_downsampler.start()
+    dispatch_scheduler.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await dispatch_scheduler.stop()
+    await webhook_workers.stop()
+    await shipper_grid.stop()
+    await delivery_point_index.stop()
+    await order_events.stop()
+    await tracking_downsampler.stop()
+    await counter_buffer.stop()
+    password_hasher.shutdown()
+    await culqi_client.close()
     db.close()
     print("🔌 Shutdown complete")
 
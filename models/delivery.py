@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from enum import Enum
 from datetime import datetime
@@ -23,6 +23,8 @@ class DeliveryPointBase(BaseModel):
     address: str
     city: str
     range_type: RangeTypeEnum
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
     contact_phone: Optional[str] = None
     working_hours: Optional[dict] = None
 
@@ -32,8 +34,6 @@ class DeliveryPointCreate(DeliveryPointBase):
 class DeliveryPoint(DeliveryPointBase):
     id: str
     user_id: str
-    latitude: Optional[float] = None
-    longitude: Optional[float] = None
     orders_ids: List[str] = []
     assigned_orders_ids: List[str] = []
     created_at: datetime
@@ -56,6 +56,7 @@ class Shipper(ShipperBase):
     user_id: str
     latitude: Optional[float] = None
     longitude: Optional[float] = None
+    location: Optional[dict] = None
     orders_ids: List[str] = []
     assigned_orders_ids: List[str] = []
     total_deliveries: int = 0
@@ -67,6 +68,30 @@ class Shipper(ShipperBase):
     class Config:
         from_attributes = True
 
+class NearbyShipper(Shipper):
+    distance_m: float
+
+class LocationFix(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    current_location: Optional[str] = None
+    timestamp: Optional[datetime] = None
+
+class TrailPoint(BaseModel):
+    timestamp: datetime
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    event_type: Optional[str] = None
+    samples: int = 1
+
+class DeliveryTrail(BaseModel):
+    order_id: str
+    resolution: str
+    start: datetime
+    end: datetime
+    truncated: bool = False
+    points: List[TrailPoint] = []
+
 class DeliveryTrackingEvent(BaseModel):
     order_id: str
     event_type: str
@@ -31,6 +31,8 @@ class OrderBase(BaseModel):
     delivery_address: str
     total_price: Decimal
     status: OrderStatusEnum = OrderStatusEnum.pending
+    delivery_latitude: Optional[float] = None
+    delivery_longitude: Optional[float] = None
 
 class OrderCreate(OrderBase):
     pass
@@ -51,6 +53,7 @@ class Order(OrderBase):
     actual_delivery_time: Optional[datetime] = None
     assigned_delivery_point_id: Optional[str] = None
     assigned_shipper_id: Optional[str] = None
+    route_sequence: Optional[int] = None
     tracking_history: List[TrackingEvent] = []
     created_at: datetime
     updated_at: datetime
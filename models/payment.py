@@ -51,4 +51,7 @@ class Payment(PaymentCreate):
                 "created_at": "2024-01-15T10:30:00Z",
                 "updated_at": "2024-01-15T10:35:00Z"
             }
-        }
\ No newline at end of file
+        }
+
+class PaymentDashboardEntry(Payment):
+    order_info: Optional[dict] = Field(None, description="Resumen de la orden asociada")
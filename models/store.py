@@ -55,4 +55,8 @@ class Store(StoreBase):
     updated_at: datetime
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class StoreDashboard(Store):
+    metrics: dict = {}
+    recent_products: List[dict] = []
@@ -2,14 +2,19 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from models.user import User, UserCreate, UserUpdate
 from crud.user import create_user, get_user, authenticate_user, create_access_token_for_user
-from utils.auth import get_current_active_user
+from utils.auth import get_current_active_user, invalidate_user, user_cache
+from utils.passwords import PasswordHasherBusy
+from database import db
 from typing import List
 
 router = APIRouter()
 
 @router.post("/users/", response_model=User)
 async def create_new_user(user: UserCreate):
-    user_db = await create_user(user)
+    try:
+        user_db = await create_user(user)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="Server busy, try again later", headers={"Retry-After": "1"})
     if not user_db:
         raise HTTPException(status_code=400, detail="User creation failed")
     return user_db
@@ -18,7 +23,7 @@ async def create_new_user(user: UserCreate):
 async def read_users(current_user: dict = Depends(get_current_active_user)):
     if current_user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    users = db.find("users", {})
+    users = await db.find("users", {})
     return users
 
 @router.get("/users/me", response_model=User)
@@ -30,14 +35,29 @@ async def update_users_me(
     current_user: dict = Depends(get_current_active_user),
     user_update: UserUpdate = None
 ):
-    if user_update:
-        await db.update_one("users", {"username": current_user["username"]}, user_update.dict(exclude_unset=True))
-    updated_user = await get_user(current_user["username"])
+    username = current_user["username"]
+    changes = user_update.dict(exclude_unset=True) if user_update else {}
+    # Cuerpo vacío: {"$set": {}} es inválido en Mongo y no hay nada que invalidar
+    if changes:
+        await db.update_one("users", {"username": username}, changes)
+        invalidate_user(username, changes.get("username"))
+        username = changes.get("username") or username
+    updated_user = await get_user(username)
     return updated_user
 
+@router.get("/cache/stats")
+async def read_user_cache_stats(current_user: dict = Depends(get_current_active_user)):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return user_cache.stats()
+
 @router.post("/token")
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = await authenticate_user(form_data.username, form_data.password)
+    try:
+        user = await authenticate_user(form_data.username, form_data.password)
+    except PasswordHasherBusy:
+        # Shedding: mejor un 503 rápido que colapsar el worker en picos de login
+        raise HTTPException(status_code=503, detail="Server busy, try again later", headers={"Retry-After": "1"})
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
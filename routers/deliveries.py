@@ -1,8 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List, Optional
-from models.delivery import DeliveryPointCreate, DeliveryPoint, ShipperCreate, Shipper, DeliveryTrackingEvent
-from crud.delivery import create_delivery_point, get_delivery_point, create_shipper, get_shipper, update_shipper_location, create_tracking_event, get_shipper_dashboard
-from utils.auth import get_current_active_user
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from pydantic import ValidationError
+from datetime import datetime
+from typing import List, Literal, Optional
+from models.delivery import DeliveryPointCreate, DeliveryPoint, ShipperCreate, Shipper, NearbyShipper, DeliveryTrackingEvent, VehicleTypeEnum, LocationFix, DeliveryTrail
+from crud.delivery import create_delivery_point, get_delivery_point, create_shipper, get_shipper, get_shipper_by_user, update_shipper_location, create_tracking_event, get_shipper_dashboard, get_nearby_shippers
+from crud.delivery_tracking import get_delivery_trail
+from crud.dispatch import run_dispatch
+from crud.order import get_order, can_follow_order
+from utils.auth import get_current_active_user, get_websocket_user
 
 router = APIRouter()
 
@@ -33,6 +38,35 @@ async def create_shipper(shipper: ShipperCreate, current_user: dict = Depends(ge
         raise HTTPException(status_code=400, detail="Shipper creation failed")
     return result
 
+@router.post("/dispatch/run")
+async def run_dispatch_tick(max_orders: Optional[int] = Query(None, ge=1, le=20000), current_user: dict = Depends(get_current_active_user)):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    summary = await run_dispatch(max_orders)
+    if summary is None:
+        raise HTTPException(status_code=409, detail="Dispatch already running")
+    return summary
+
+@router.get("/shippers/nearby", response_model=List[NearbyShipper])
+async def read_nearby_shippers(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    vehicle_type: Optional[VehicleTypeEnum] = None,
+    limit: int = Query(10, ge=1, le=50),
+    max_distance_m: Optional[float] = Query(None, gt=0),
+    current_user: dict = Depends(get_current_active_user)
+):
+    return await get_nearby_shippers(latitude, longitude, vehicle_type, limit, max_distance_m)
+
+@router.get("/shippers/dashboard", response_model=List[dict])
+async def shipper_dashboard(current_user: dict = Depends(get_current_active_user)):
+    if current_user["role"] != "shipper":
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    shipper = await get_shipper_by_user(current_user["id"])
+    if not shipper:
+        raise HTTPException(status_code=404, detail="Shipper not found")
+    return await get_shipper_dashboard(shipper)
+
 @router.get("/shippers/{shipper_id}", response_model=Shipper)
 async def read_shipper(shipper_id: str, current_user: dict = Depends(get_current_active_user)):
     shipper = await get_shipper(shipper_id)
@@ -51,11 +85,38 @@ async def update_location(shipper_id: str, latitude: float, longitude: float, cu
         raise HTTPException(status_code=400, detail="Location update failed")
     return result
 
-@router.get("/shippers/dashboard", response_model=List[dict])
-async def shipper_dashboard(current_user: dict = Depends(get_current_active_user)):
-    if current_user["role"] != "shipper":
-        raise HTTPException(status_code=403, detail="Not enough permissions")
-    return await get_shipper_dashboard(current_user["id"])
+@router.websocket("/shippers/{shipper_id}/location/stream")
+async def stream_location(websocket: WebSocket, shipper_id: str):
+    """
+    Canal persistente para fixes GPS: el token se valida una sola vez al
+    conectar. Cada mensaje es un LocationFix en JSON o una lista de ellos;
+    solo se responde con errores. La persistencia la coalescen los
+    snapshots del grid de shippers.
+    """
+    current_user = await get_websocket_user(websocket)
+    if not current_user or current_user["role"] != "shipper":
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    try:
+        while True:
+            try:
+                message = await websocket.receive_json()
+            except ValueError:
+                await websocket.send_json({"error": "Invalid JSON"})
+                continue
+            for raw_fix in message if isinstance(message, list) else [message]:
+                try:
+                    fix = LocationFix(**raw_fix)
+                except (ValidationError, TypeError) as e:
+                    await websocket.send_json({"error": f"Invalid location fix: {e}"})
+                    continue
+                accepted = await update_shipper_location(shipper_id, fix.latitude, fix.longitude, fix.current_location, current_user["id"], fix.timestamp)
+                if not accepted:
+                    await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                    return
+    except WebSocketDisconnect:
+        pass
 
 @router.post("/tracking/events/", response_model=DeliveryTrackingEvent)
 async def create_new_tracking_event(event: DeliveryTrackingEvent, current_user: dict = Depends(get_current_active_user)):
@@ -64,4 +125,20 @@ async def create_new_tracking_event(event: DeliveryTrackingEvent, current_user:
     result = await create_tracking_event(event, current_user["id"])
     if not result:
         raise HTTPException(status_code=400, detail="Tracking event creation failed")
-    return result
\ No newline at end of file
+    return result
+
+@router.get("/tracking/{order_id}/trail", response_model=DeliveryTrail)
+async def read_delivery_trail(
+    order_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: Literal["auto", "raw", "minute"] = "auto",
+    current_user: dict = Depends(get_current_active_user)
+):
+    """Trayecto GPS de la orden en [start, end); por defecto, las últimas 24 horas"""
+    order = await get_order(order_id, {"buyer_id": 1, "assigned_delivery_point_id": 1, "assigned_shipper_id": 1})
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    if not can_follow_order(order, current_user):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return await get_delivery_trail(order["id"], start, end, resolution)
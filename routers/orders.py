@@ -1,8 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+import asyncio
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 from models.order import Order, OrderCreate, OrderUpdate, TrackingEvent
-from crud.order import create_order, get_order, get_orders_by_user, update_order, add_tracking_event, delete_order
-from utils.auth import get_current_active_user
+from models.pagination import Page
+from crud.order import create_order, can_follow_order, get_order, get_orders, get_orders_by_user, update_order, add_tracking_event, delete_order
+from crud.tracking import get_tracking_history
+from utils.auth import get_current_active_user, get_websocket_user
+from utils.order_events import order_events
+from config import settings
 
 router = APIRouter()
 
@@ -10,18 +18,16 @@ router = APIRouter()
 async def create_new_order(order: OrderCreate, current_user: dict = Depends(get_current_active_user)):
     if current_user["role"] not in ["buyer", "admin"]:
         raise HTTPException(status_code=403, detail="Not enough permissions")
-    result = await create_order(order, current_user["id"])
+    result = await create_order(order, current_user["id"], current_user.get("city"))
     if not result:
         raise HTTPException(status_code=400, detail="Order creation failed")
     return result
 
-@router.get("/", response_model=List[Order])
-async def read_orders(skip: int = 0, limit: int = 20, current_user: dict = Depends(get_current_active_user)):
+@router.get("/", response_model=Page[Order])
+async def read_orders(cursor: Optional[str] = None, limit: int = Query(20, ge=1, le=100), current_user: dict = Depends(get_current_active_user)):
     if current_user["role"] == "admin":
-        orders = db.find("orders", {}, limit=limit)
-    else:
-        orders = await get_orders_by_user(current_user["id"], skip, limit)
-    return orders
+        return await get_orders(cursor, limit)
+    return await get_orders_by_user(current_user["id"], cursor, limit)
 
 @router.get("/{order_id}", response_model=Order)
 async def read_order(order_id: str, current_user: dict = Depends(get_current_active_user)):
@@ -32,11 +38,91 @@ async def read_order(order_id: str, current_user: dict = Depends(get_current_act
         raise HTTPException(status_code=403, detail="Not enough permissions")
     return order
 
+ORDER_SNAPSHOT_PROJECTION = {"status": 1, "tracking_history": 1, "updated_at": 1}
+ORDER_ACCESS_PROJECTION = {"buyer_id": 1, "assigned_delivery_point_id": 1, "assigned_shipper_id": 1}
+
+async def _order_snapshot(order_id: str) -> dict:
+    order = await get_order(order_id, ORDER_SNAPSHOT_PROJECTION) or {}
+    return {
+        "type": "snapshot",
+        "order_id": order_id,
+        "status": order.get("status"),
+        "tracking_history": order.get("tracking_history", []),
+        "updated_at": order.get("updated_at")
+    }
+
+def _sse(message: dict) -> str:
+    return f"event: {message['type']}\ndata: {json.dumps(jsonable_encoder(message))}\n\n"
+
+@router.get("/{order_id}/tracking", response_model=Page[TrackingEvent])
+async def read_tracking_history(order_id: str, cursor: Optional[str] = None, limit: int = Query(50, ge=1, le=100), current_user: dict = Depends(get_current_active_user)):
+    """Historial completo de tracking, más reciente primero (la orden solo trae los últimos eventos)"""
+    order = await get_order(order_id, ORDER_ACCESS_PROJECTION)
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    if not can_follow_order(order, current_user):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    # Los buckets van por el id canónico de la orden, no por el del path
+    return await get_tracking_history(order["id"], cursor, limit)
+
+@router.get("/{order_id}/events")
+async def stream_order_events(order_id: str, request: Request, current_user: dict = Depends(get_current_active_user)):
+    """
+    Server-Sent Events con los cambios de la orden: primero un `snapshot`
+    con el estado y el historial, luego `tracking` y `status` según ocurren.
+    Reemplaza el polling de GET /{order_id}.
+    """
+    order = await get_order(order_id, ORDER_ACCESS_PROJECTION)
+    if not order:
+        raise HTTPException(status_code=404, detail="Order not found")
+    if not can_follow_order(order, current_user):
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    async def events():
+        with order_events.subscribe(order_id) as queue:
+            # El snapshot se lee ya suscritos para no perder cambios intermedios
+            yield _sse(await _order_snapshot(order_id))
+            while not await request.is_disconnected():
+                try:
+                    message = await asyncio.wait_for(queue.get(), settings.order_events_keepalive_seconds)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if message is None:
+                    break
+                yield _sse(message)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.websocket("/{order_id}/events/ws")
+async def stream_order_events_ws(websocket: WebSocket, order_id: str):
+    """Mismos mensajes que GET /{order_id}/events, por WebSocket"""
+    current_user = await get_websocket_user(websocket)
+    order = await get_order(order_id, ORDER_ACCESS_PROJECTION) if current_user else None
+    if not order or not can_follow_order(order, current_user):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    try:
+        with order_events.subscribe(order_id) as queue:
+            await websocket.send_json(jsonable_encoder(await _order_snapshot(order_id)))
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), settings.order_events_keepalive_seconds)
+                except asyncio.TimeoutError:
+                    message = {"type": "keepalive"}
+                if message is None:
+                    break
+                await websocket.send_json(jsonable_encoder(message))
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
 @router.put("/{order_id}", response_model=Order)
 async def update_existing_order(
     order_id: str, order: OrderUpdate, current_user: dict = Depends(get_current_active_user)
 ):
-    order_db = await get_order(order_id)
+    order_db = await get_order(order_id, ORDER_ACCESS_PROJECTION)
     if not order_db:
         raise HTTPException(status_code=404, detail="Order not found")
     if current_user["role"] != "admin" and order_db["buyer_id"] != current_user["id"]:
@@ -50,7 +136,7 @@ async def update_existing_order(
 async def add_order_tracking(
     order_id: str, event: TrackingEvent, current_user: dict = Depends(get_current_active_user)
 ):
-    order = await get_order(order_id)
+    order = await get_order(order_id, ORDER_ACCESS_PROJECTION)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     if current_user["role"] not in ["admin", "delivery_point", "shipper"] or (order["assigned_delivery_point_id"] != current_user.get("id") and order["assigned_shipper_id"] != current_user.get("id")):
@@ -64,7 +150,7 @@ async def add_order_tracking(
 async def delete_order_endpoint(
     order_id: str, current_user: dict = Depends(get_current_active_user)
 ):
-    order = await get_order(order_id)
+    order = await get_order(order_id, ORDER_ACCESS_PROJECTION)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     if current_user["role"] != "admin" and order["buyer_id"] != current_user["id"]:
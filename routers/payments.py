@@ -1,9 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query
 from typing import List, Dict, Any, Optional  # ← ESTA LÍNEA ERA LA FALTANTE
-from models.payment import PaymentCreate, Payment
-from crud.payment import create_payment, get_payment, get_payments_by_user, handle_culqi_webhook
+from models.payment import PaymentCreate, Payment, PaymentDashboardEntry
+from models.pagination import Page
+from crud.payment import create_payment, get_payment, get_payments_by_user, get_payment_dashboard
+from crud.webhooks import enqueue_culqi_webhook, get_webhook_inbox_metrics
 from utils.auth import get_current_active_user
 from utils.payments import verify_culqi_webhook
+from utils.webhook_worker import webhook_workers
 from database import db
 from datetime import datetime
 from decimal import Decimal
@@ -41,37 +44,19 @@ async def get_payment_detail(payment_id: str, current_user: dict = Depends(get_c
     
     return payment
 
-@router.get("/", response_model=List[Payment])
-async def get_user_payments(skip: int = 0, limit: int = 20, current_user: dict = Depends(get_current_active_user)):
+@router.get("/", response_model=Page[Payment])
+async def get_user_payments(cursor: Optional[str] = None, limit: int = Query(20, ge=1, le=100), current_user: dict = Depends(get_current_active_user)):
     """
-    Obtener pagos del usuario (dashboard)
+    Obtener pagos del usuario (paginado por cursor)
     """
-    payments = await get_payments_by_user(current_user["id"], skip, limit)
-    return payments
+    return await get_payments_by_user(current_user["id"], cursor, limit)
 
-@router.get("/dashboard/", response_model=List[Payment])
-async def payment_dashboard(current_user: dict = Depends(get_current_active_user)):
+@router.get("/dashboard/", response_model=Page[PaymentDashboardEntry])
+async def payment_dashboard(cursor: Optional[str] = None, limit: int = Query(20, ge=1, le=100), current_user: dict = Depends(get_current_active_user)):
     """
     Dashboard completo de pagos con órdenes relacionadas
     """
-    payments = await get_payments_by_user(current_user["id"])
-    
-    # Enriquecer cada pago con info de la orden
-    enriched_payments = []
-    for payment in payments:
-        if payment.get("order_id"):
-            order = db.find_one("orders", {"_id": payment["order_id"]})
-            if order:
-                payment["order_info"] = {
-                    "id": order["id"],
-                    "total_price": str(order["total_price"]),
-                    "status": order["status"],
-                    "delivery_address": order.get("delivery_address", ""),
-                    "created_at": order["created_at"]
-                }
-        enriched_payments.append(payment)
-    
-    return enriched_payments
+    return await get_payment_dashboard(current_user["id"], cursor, limit)
 
 @router.post("/webhooks/culqi/")
 async def culqi_webhook_handler(payload: Dict[str, Any]):
@@ -83,11 +68,17 @@ async def culqi_webhook_handler(payload: Dict[str, Any]):
         # signature = request.headers.get("Culqi-Signature")
         # await verify_culqi_webhook(payload, signature)
         
-        result = await handle_culqi_webhook(payload)
-        if result.get("status") == "success":
-            return {"status": "ok", "message": "Webhook processed successfully"}
+        # Se persiste en el inbox y se confirma de inmediato; los workers lo procesan
+        result = await enqueue_culqi_webhook(payload)
+        if result["status"] == "queued":
+            webhook_workers.notify()
+            return {"status": "ok", "message": "Webhook queued", "event_id": result["event_id"]}
+        elif result["status"] == "duplicate":
+            return {"status": "ok", "message": "Webhook already received", "event_id": result["event_id"]}
+        elif result["status"] == "ignored":
+            return {"status": "ok", "message": result["message"]}
         else:
-            raise HTTPException(status_code=400, detail=result.get("message", "Webhook processing failed"))
+            raise HTTPException(status_code=500, detail=result.get("message", "Webhook processing failed"))
             
     except HTTPException:
         raise
@@ -95,6 +86,16 @@ async def culqi_webhook_handler(payload: Dict[str, Any]):
         print(f"Webhook processing error: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+@router.get("/webhooks/culqi/metrics")
+async def culqi_webhook_metrics(current_user: dict = Depends(get_current_active_user)):
+    """
+    Profundidad de la cola de webhooks y lag de procesamiento (admin)
+    """
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin permissions required")
+    
+    return await get_webhook_inbox_metrics()
+
 @router.post("/yape/proof/")
 async def upload_yape_proof_endpoint(
     payment_id: str, 
@@ -147,7 +148,7 @@ async def delete_payment(
     if current_user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Admin permissions required")
     
-    result = db.delete_one("payments", {"_id": payment_id})
+    result = await db.delete_one("payments", {"_id": payment_id})
     if not result:
         raise HTTPException(status_code=404, detail="Payment not found")
     
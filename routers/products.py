@@ -1,8 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from typing import List, Optional
 from models.product import Product, ProductCreate, ProductUpdate
-from crud.product import create_product, get_product, get_products_by_store, update_product, delete_product
+from models.pagination import Page
+from crud.product import create_product, get_product, get_products, get_products_by_store, update_product, delete_product
 from utils.auth import get_current_active_user, verify_role
+from utils.counters import counter_buffer
+from utils.pagination import decode_id
+from crud.product_import import import_products_stream, get_product_import
+from crud.search import search_products
+from crud.store import get_store_owner_id
 
 router = APIRouter()
 
@@ -15,22 +21,58 @@ async def create_new_product(product: ProductCreate, current_user: dict = Depend
         raise HTTPException(status_code=400, detail="Product creation failed")
     return result
 
-@router.get("/", response_model=List[Product])
-async def read_products(skip: int = 0, limit: int = 20):
-    # Implement pagination and filtering
-    products = db.find("products", {}, limit=limit)
-    return products
+@router.post("/import")
+async def import_products(
+    request: Request, store_id: str, format: str = "csv", current_user: dict = Depends(get_current_active_user)
+):
+    """
+    Importación masiva en streaming: cuerpo CSV (con cabecera; images/tags
+    separados por '|') o NDJSON, upsert por (store_id, sku)
+    """
+    if current_user["role"] != "admin":
+        # Las tiendas apuntan a su dueño con owner_id; los usuarios no guardan store_id
+        if current_user["role"] != "store_owner" or await get_store_owner_id(store_id) != current_user["id"]:
+            raise HTTPException(status_code=403, detail="Not enough permissions")
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="Invalid format. Use 'csv' or 'ndjson'")
+    result = await import_products_stream(store_id, format, request.stream(), current_user["id"])
+    if not result:
+        raise HTTPException(status_code=500, detail="Product import could not be started")
+    return result
+
+@router.get("/imports/{import_id}")
+async def read_product_import(import_id: str, current_user: dict = Depends(get_current_active_user)):
+    product_import = await get_product_import(import_id)
+    if not product_import:
+        raise HTTPException(status_code=404, detail="Import not found")
+    if current_user["role"] != "admin" and product_import["user_id"] != current_user["id"]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return product_import
+
+@router.get("/", response_model=Page[Product])
+async def read_products(cursor: Optional[str] = None, limit: int = Query(20, ge=1, le=100)):
+    return await get_products(cursor, limit)
+
+@router.get("/search", response_model=Page[Product])
+async def search_catalog(
+    q: str = Query(..., min_length=1),
+    category: Optional[str] = None,
+    store_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100)
+):
+    return await search_products(q, category, store_id, cursor, limit)
 
-@router.get("/store/{store_id}", response_model=List[Product])
-async def read_products_by_store(store_id: str, skip: int = 0, limit: int = 20):
-    products = await get_products_by_store(store_id, skip, limit)
-    return products
+@router.get("/store/{store_id}", response_model=Page[Product])
+async def read_products_by_store(store_id: str, cursor: Optional[str] = None, limit: int = Query(20, ge=1, le=100)):
+    return await get_products_by_store(store_id, cursor, limit)
 
 @router.get("/{product_id}", response_model=Product)
 async def read_product(product_id: str):
     product = await get_product(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
+    counter_buffer.increment("products", decode_id(product_id), {"views": 1})
     return product
 
 @router.put("/{product_id}", response_model=Product)
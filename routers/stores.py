@@ -1,8 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
 from typing import List, Optional
-from models.store import StoreCreate, Store, StoreUpdate, SocialMediaLink
-from crud.store import create_store, get_store, get_stores, update_store, delete_store
+from models.store import StoreCreate, Store, StoreUpdate, StoreDashboard, SocialMediaLink
+from models.pagination import Page
+from crud.metrics import get_store_metrics, record_view
+from crud.search import search_stores
+from crud.store import create_store, get_store, get_stores, update_store, delete_store, get_store_dashboard
 from utils.auth import get_current_active_user
+from utils.counters import counter_buffer
+from utils.pagination import decode_id
 from database import db
 from datetime import datetime
 
@@ -42,30 +47,21 @@ async def create_new_store(
     
     return result
 
-@router.get("/", response_model=List[Store])
+@router.get("/", response_model=Page[Store])
 async def read_stores(
-    skip: int = 0, 
-    limit: int = 20, 
+    cursor: Optional[str] = None, 
+    limit: int = Query(20, ge=1, le=100), 
     category: Optional[str] = None, 
     city: Optional[str] = None,
     search: Optional[str] = None
 ):
     """
-    Listar tiendas con filtros
+    Listar tiendas con filtros; con `search` se ordena por relevancia
     """
-    query = {}
-    if category:
-        query["category"] = category
-    if city:
-        query["city"] = city
     if search:
-        query["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"description": {"$regex": search, "$options": "i"}}
-        ]
+        return await search_stores(search, category, city, cursor, limit)
     
-    stores = await get_stores(skip, limit, category, city)
-    return stores
+    return await get_stores(category, city, cursor, limit)
 
 @router.get("/{store_id}", response_model=Store)
 async def read_store_detail(store_id: str):
@@ -76,16 +72,37 @@ async def read_store_detail(store_id: str):
     if not store:
         raise HTTPException(status_code=404, detail="Tienda no encontrada")
     
-    # Incrementar contador de vistas
-    db.update_one("stores", {"_id": store_id}, {"$inc": {"views": 1}})
+    # Incrementar contador de vistas (se agrupa y persiste en segundo plano)
+    counter_buffer.increment("stores", decode_id(store_id), {"views": 1})
+    await record_view(store_id)
     
     # Enriquecer con productos
-    products = db.find("products", {"store_id": store_id}, limit=12)
+    products = await db.find("products", {"store_id": store_id}, limit=12)
     store["products"] = products[:6]  # Primeros 6 productos
     store["total_products"] = len(products)
     
     return store
 
+STORE_CLICK_FIELDS = {
+    "profile": "clicks",
+    "whatsapp": "whatsapp_clicks",
+    "web": "web_clicks"
+}
+
+@router.post("/{store_id}/clicks")
+async def register_store_click(store_id: str, channel: str = "profile"):
+    """
+    Registrar click en la tienda (perfil, WhatsApp o web)
+    """
+    field = STORE_CLICK_FIELDS.get(channel)
+    if not field:
+        raise HTTPException(status_code=400, detail="Canal inválido. Usa 'profile', 'whatsapp' o 'web'")
+    if not await get_store(store_id, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Tienda no encontrada")
+    
+    counter_buffer.increment("stores", decode_id(store_id), {field: 1})
+    return {"message": "Click registrado", "store_id": store_id, "channel": channel}
+
 @router.put("/{store_id}", response_model=Store)
 async def update_existing_store(
     store_id: str, 
@@ -126,16 +143,16 @@ async def delete_store_endpoint(
     if current_user["role"] != "admin" and existing_store["owner_id"] != current_user["id"]:
         raise HTTPException(status_code=403, detail="No tienes permisos para eliminar esta tienda")
     
-    # Eliminar productos relacionados
-    db.delete_many("products", {"store_id": store_id})
+    # Eliminar productos relacionados en un solo round trip
+    await db.delete_many("products", {"store_id": store_id})
     
-    result = await delete_store(store_id, current_user["id"])
+    result = await delete_store(store_id)
     if not result:
         raise HTTPException(status_code=400, detail="Error al eliminar la tienda")
     
     return {"message": "Tienda eliminada exitosamente"}
 
-@router.get("/dashboard/", response_model=Store)
+@router.get("/dashboard/", response_model=StoreDashboard)
 async def store_dashboard(current_user: dict = Depends(get_current_active_user)):
     """
     Dashboard de la tienda del usuario
@@ -143,26 +160,28 @@ async def store_dashboard(current_user: dict = Depends(get_current_active_user))
     if current_user["role"] != "store_owner":
         raise HTTPException(status_code=403, detail="Solo store owners pueden ver dashboard")
     
-    # Buscar tienda del usuario
-    store = db.find_one("stores", {"owner_id": current_user["id"]})
+    # Tienda, métricas y productos recientes en una sola agregación
+    store = await get_store_dashboard(current_user["id"])
     if not store:
         raise HTTPException(status_code=404, detail="No tienes una tienda registrada")
     
-    # Métricas de la tienda
-    products_count = db.count_documents("products", {"store_id": store["id"]})
-    orders_count = db.count_documents("orders", {"store_id": store["id"]})
-    total_sales = sum(order["total_price"] for order in db.find("orders", {"store_id": store["id"]}))
-    
-    # Enriquecer dashboard
-    store["metrics"] = {
-        "total_products": products_count,
-        "total_orders": orders_count,
-        "total_sales": float(total_sales),
-        "conversion_rate": (orders_count / max(store["views"], 1)) * 100 if store["views"] > 0 else 0
-    }
+    return store
+
+@router.get("/{store_id}/metrics")
+async def read_store_metrics(
+    store_id: str, 
+    days: int = Query(30, ge=1, le=366), 
+    current_user: dict = Depends(get_current_active_user)
+):
+    """
+    Métricas materializadas de la tienda (totales y buckets diarios)
+    """
+    existing_store = await get_store(store_id)
+    if not existing_store:
+        raise HTTPException(status_code=404, detail="Tienda no encontrada")
     
-    # Productos recientes
-    recent_products = db.find("products", {"store_id": store["id"]}, limit=5, sort=[("created_at", -1)])
-    store["recent_products"] = recent_products
+    if current_user["role"] != "admin" and existing_store["owner_id"] != current_user["id"]:
+        raise HTTPException(status_code=403, detail="No tienes permisos para ver estas métricas")
     
-    return store
\ No newline at end of file
+    metrics = await get_store_metrics(store_id, days)
+    return metrics or {"_id": store_id, "totals": {}, "daily": {}}
@@ -1,13 +1,18 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, WebSocket, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from pydantic import BaseModel
 from datetime import datetime, timedelta
 from config import settings
+from database import db
+from utils.cache import TTLCache
 from typing import Optional
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/accounts/token")
 
+# Documentos de usuario por username; is_active se revalida al expirar
+user_cache = TTLCache(settings.user_cache_size, settings.user_cache_ttl_seconds)
+
 class TokenData(BaseModel):
     username: Optional[str] = None
 
@@ -25,16 +30,39 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    user = db.find_one("users", {"username": token_data.username})
+    user = user_cache.get(token_data.username)
     if user is None:
-        raise credentials_exception
-    return user
+        user = await db.find_one("users", {"username": token_data.username})
+        if user is None:
+            raise credentials_exception
+        user_cache.set(token_data.username, user)
+    return dict(user)
+
+def invalidate_user(*usernames: Optional[str]):
+    """Descartar usuarios cacheados tras cualquier escritura en `users`"""
+    for username in usernames:
+        if username:
+            user_cache.invalidate(username)
 
 async def get_current_active_user(current_user: dict = Depends(get_current_user)):
     if not current_user["is_active"]:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+async def get_websocket_user(websocket: WebSocket) -> Optional[dict]:
+    """Usuario activo del token en `?token=` o en la cabecera Authorization; None si no es válido"""
+    token = websocket.query_params.get("token")
+    if not token:
+        scheme, _, value = websocket.headers.get("authorization", "").partition(" ")
+        token = value if scheme.lower() == "bearer" else None
+    if not token:
+        return None
+    try:
+        user = await get_current_user(token)
+    except HTTPException:
+        return None
+    return user if user["is_active"] else None
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -0,0 +1,83 @@
+import asyncio
+from pymongo import UpdateOne
+from config import settings
+from database import db
+from typing import Dict, Any, Optional, Tuple
+
+class CounterBuffer:
+    """
+    Buffer write-behind para contadores calientes (vistas, clicks).
+
+    Los incrementos se acumulan en memoria por documento y se envían
+    periódicamente con un único bulk_write por colección, de modo que una
+    tienda viral genera una escritura por intervalo y no una por visita.
+    `document_id` se usa tal cual en el filtro: el llamador pasa el `_id`
+    como está guardado (ObjectId para tiendas y productos).
+    """
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._pending: Dict[Tuple[str, Any, bool], Dict[str, float]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+    def increment(self, collection_name: str, document_id: Any, increments: Dict[str, float], upsert: bool = False):
+        fields = self._pending.setdefault((collection_name, document_id, upsert), {})
+        for field, amount in increments.items():
+            fields[field] = fields.get(field, 0) + amount
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    async def flush(self) -> int:
+        """Enviar los incrementos acumulados; devuelve documentos actualizados"""
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+
+        by_collection: Dict[str, list] = {}
+        for key, fields in pending.items():
+            by_collection.setdefault(key[0], []).append(key)
+
+        flushed = 0
+        for collection_name, keys in by_collection.items():
+            operations = [
+                UpdateOne({"_id": document_id}, {"$inc": pending[(name, document_id, upsert)]}, upsert=upsert)
+                for name, document_id, upsert in keys
+            ]
+            result = await db.bulk_write(collection_name, operations, ordered=False)
+            # Reencolar lo que falló para el siguiente intervalo en lugar de perderlo
+            failed = range(len(keys)) if result is None else [error["index"] for error in result["errors"]]
+            for index in failed:
+                name, document_id, upsert = keys[index]
+                self.increment(name, document_id, pending[keys[index]], upsert)
+            flushed += len(operations) - len(failed)
+        return flushed
+
+    async def _run(self):
+        # Se detiene con un Event y no con cancel(): cancelar a mitad de flush()
+        # perdería los incrementos ya sacados de _pending
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Counter flush error: {e}")
+
+    def start(self):
+        if self._task is None:
+            # Se crea aquí para que quede ligado al loop del servidor
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._stopping.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+counter_buffer = CounterBuffer(settings.counter_flush_interval_seconds)
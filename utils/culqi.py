@@ -0,0 +1,75 @@
+import asyncio
+import httpx
+from fastapi import HTTPException
+from config import settings
+from typing import Dict, Any, Optional
+
+# Errores en los que la petición no llegó a enviarse: reintentar es seguro
+# incluso para cargos y reembolsos
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# Errores en los que la petición pudo procesarse: solo se reintentan
+# llamadas idempotentes
+_MAYBE_SENT_ERRORS = (httpx.ReadTimeout, httpx.WriteTimeout, httpx.RemoteProtocolError, httpx.ReadError)
+
+class CulqiClient:
+    """
+    Cliente HTTP async compartido para la API de Culqi.
+
+    Mantiene un pool de conexiones keep-alive (sin handshake TLS por cargo),
+    aplica deadlines de conexión/lectura por llamada y reintenta de forma
+    acotada. Su ciclo de vida va ligado al startup/shutdown de la app.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+
+    def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=settings.culqi_api_url,
+                headers={
+                    "Authorization": f"Bearer {settings.culqi_secret_key}",
+                    "Content-Type": "application/json",
+                },
+                timeout=httpx.Timeout(
+                    settings.culqi_read_timeout_seconds,
+                    connect=settings.culqi_connect_timeout_seconds
+                ),
+                limits=httpx.Limits(
+                    max_connections=settings.culqi_max_connections,
+                    max_keepalive_connections=settings.culqi_max_connections
+                )
+            )
+
+    async def close(self):
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+
+    async def get(self, path: str) -> httpx.Response:
+        return await self._request("GET", path, None, idempotent=True)
+
+    async def post(self, path: str, payload: Dict[str, Any], idempotent: bool = False) -> httpx.Response:
+        return await self._request("POST", path, payload, idempotent)
+
+    async def _request(self, method: str, path: str, payload: Optional[Dict[str, Any]], idempotent: bool) -> httpx.Response:
+        self.start()
+        attempts = settings.culqi_max_retries + 1
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            try:
+                response = await self._client.request(method, path, json=payload)
+            except _NOT_SENT_ERRORS as e:
+                if last_attempt:
+                    print(f"Culqi unreachable on {path}: {e}")
+                    raise HTTPException(status_code=502, detail="Payment provider unavailable")
+            except _MAYBE_SENT_ERRORS as e:
+                if not idempotent or last_attempt:
+                    print(f"Culqi timeout on {path}: {e}")
+                    raise HTTPException(status_code=504, detail="Payment provider timeout")
+            else:
+                if response.status_code < 500 or not idempotent or last_attempt:
+                    return response
+            await asyncio.sleep(settings.culqi_retry_backoff_seconds * (2 ** attempt))
+
+culqi_client = CulqiClient()
@@ -0,0 +1,142 @@
+import asyncio
+import unicodedata
+import numpy as np
+from config import settings
+from database import db
+from utils.geo import haversine_pairs
+from typing import Dict, Any, List, Optional, Tuple
+
+DELIVERY_POINT_PROJECTION = {"latitude": 1, "longitude": 1, "city": 1, "range_type": 1}
+
+def normalize_city(city: Optional[str]) -> Optional[str]:
+    """'Ancón', ' ancon' y 'ANCON' caen en la misma clave"""
+    if not city:
+        return None
+    decomposed = unicodedata.normalize("NFKD", city.strip().casefold())
+    return "".join(char for char in decomposed if not unicodedata.combining(char)) or None
+
+class _Partition:
+    __slots__ = ("ids", "latitude", "longitude")
+
+    def __init__(self, points: List[dict]):
+        self.ids = [point["id"] for point in points]
+        self.latitude = np.array([point["latitude"] for point in points], dtype=float)
+        self.longitude = np.array([point["longitude"] for point in points], dtype=float)
+
+    def nearest(self, latitude: float, longitude: float) -> Optional[Tuple[str, float]]:
+        if not self.ids:
+            return None
+        distances = haversine_pairs(self.latitude, self.longitude, latitude, longitude)
+        index = int(np.argmin(distances))
+        return self.ids[index], float(distances[index])
+
+class DeliveryPointIndex:
+    """
+    Índice en memoria (por worker) de los puntos de entrega con coordenadas,
+    para asignar órdenes sin consultar `delivery_points` en cada una.
+
+    La cobertura depende de la ruta tienda → comprador:
+    - `city`: solo rutas dentro de su propia ciudad.
+    - `city_to_city`: rutas que salen de o llegan a su ciudad.
+    - `national`: cualquier ruta.
+    Como la cobertura ya filtra por ciudad, los puntos se parten por
+    (range_type, ciudad) y cada consulta recorre solo las particiones que
+    cubren la ruta, con una distancia haversine vectorizada por partición.
+
+    Se reconstruye entero al arrancar, tras cada alta en este worker y
+    cuando cambia la versión de la colección (número de puntos y último
+    `updated_at`), comprobada cada `refresh_interval_seconds`.
+    """
+
+    def __init__(self, refresh_interval_seconds: float):
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self._by_city: Dict[Tuple[str, str], _Partition] = {}
+        self._national = _Partition([])
+        self._version: Optional[Tuple[int, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._national.ids) + sum(len(partition.ids) for partition in self._by_city.values())
+
+    def build(self, points: List[dict]):
+        grouped: Dict[Tuple[str, str], List[dict]] = {}
+        national: List[dict] = []
+        for point in points:
+            if point.get("latitude") is None or point.get("longitude") is None:
+                continue
+            if point.get("range_type") == "national":
+                national.append(point)
+                continue
+            city = normalize_city(point.get("city"))
+            if city and point.get("range_type") in ("city", "city_to_city"):
+                grouped.setdefault((point["range_type"], city), []).append(point)
+        # Se reemplaza de una vez: las consultas en curso ven el índice viejo o el nuevo
+        self._by_city = {key: _Partition(group) for key, group in grouped.items()}
+        self._national = _Partition(national)
+        self.ready = True
+
+    def nearest(self, latitude: float, longitude: float, origin_city: Optional[str], destination_city: Optional[str]) -> Optional[Tuple[str, float]]:
+        """
+        Punto más cercano a (latitude, longitude) que cubre la ruta
+        origin_city → destination_city, como (id, metros). Sin ciudad de
+        destino se asume entrega local; sin ciudad de origen solo cubren
+        los puntos nacionales.
+        """
+        origin = normalize_city(origin_city)
+        destination = normalize_city(destination_city) or origin
+        partitions = [self._national]
+        if origin:
+            if origin == destination:
+                partitions.append(self._by_city.get(("city", origin)))
+            partitions.append(self._by_city.get(("city_to_city", origin)))
+            if destination != origin:
+                partitions.append(self._by_city.get(("city_to_city", destination)))
+        best = None
+        for partition in partitions:
+            candidate = partition.nearest(latitude, longitude) if partition else None
+            if candidate and (best is None or candidate[1] < best[1]):
+                best = candidate
+        return best
+
+    async def _collection_version(self) -> Tuple[int, Any]:
+        count = await db.count_documents("delivery_points", {})
+        latest = await db.find("delivery_points", {}, {"updated_at": 1}, limit=1, sort=[("updated_at", -1)])
+        return count, latest[0].get("updated_at") if latest else None
+
+    async def rebuild(self):
+        version = await self._collection_version()
+        points = await db.find("delivery_points", {"latitude": {"$ne": None}}, DELIVERY_POINT_PROJECTION)
+        self.build(points)
+        self._version = version
+
+    async def refresh(self):
+        if await self._collection_version() != self._version:
+            await self.rebuild()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval_seconds)
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Delivery point index refresh error: {e}")
+
+    async def start(self):
+        try:
+            await self.rebuild()
+        except Exception as e:
+            print(f"Delivery point index warm start error: {e}")
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+delivery_point_index = DeliveryPointIndex(settings.delivery_point_index_refresh_seconds)
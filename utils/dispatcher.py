@@ -0,0 +1,40 @@
+import asyncio
+from config import settings
+from crud.dispatch import run_dispatch
+from typing import Optional
+
+class DispatchScheduler:
+    """
+    Ejecuta un tick de despacho (crud.dispatch.run_dispatch) cada
+    `interval_seconds`. Con intervalo 0 no arranca y el despacho queda
+    solo bajo demanda (endpoint de admin o CLI).
+    """
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                summary = await run_dispatch()
+                if summary and summary.get("assigned"):
+                    print(f"🚚 Dispatched {summary['assigned']} order(s) in {summary['solve_ms']} ms")
+            except Exception as e:
+                print(f"Dispatch error: {e}")
+
+    def start(self):
+        if self.interval_seconds > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+dispatch_scheduler = DispatchScheduler(settings.dispatch_interval_seconds)
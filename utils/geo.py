@@ -0,0 +1,27 @@
+import math
+import numpy as np
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = 111320.0
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+def haversine_matrix(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """Distancias en metros entre cada punto de (lat1, lng1) y cada punto de (lat2, lng2)"""
+    phi1 = np.radians(np.asarray(lat1, dtype=float))[:, None]
+    phi2 = np.radians(np.asarray(lat2, dtype=float))[None, :]
+    dlambda = np.radians(np.asarray(lng2, dtype=float))[None, :] - np.radians(np.asarray(lng1, dtype=float))[:, None]
+    a = np.sin((phi2 - phi1) / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def haversine_pairs(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """Distancias en metros elemento a elemento (con broadcasting: sirve para N puntos contra uno)"""
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dlambda = np.radians(lng2) - np.radians(lng1)
+    a = np.sin((phi2 - phi1) / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
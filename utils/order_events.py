@@ -0,0 +1,114 @@
+import asyncio
+from contextlib import contextmanager
+from config import settings
+from database import db
+from typing import Dict, Any, Iterator, Optional, Set
+
+class OrderEventBus:
+    """
+    Pub/sub en proceso de cambios de órdenes (eventos de tracking y de
+    estado) para las suscripciones en vivo de routers/orders.
+
+    Por defecto los publicadores (crud.order, crud.delivery, crud.payment)
+    entregan directamente a los suscriptores de este worker. Con
+    `use_change_stream` la fuente pasa a ser un change stream sobre
+    `orders` (requiere replica set) y cada worker ve también los cambios
+    hechos por los demás; entonces la publicación directa se ignora para
+    no duplicar mensajes. Los puntos de `delivery_tracking` (time-series,
+    sin change streams) se publican siempre en local con `publish_local`.
+
+    Un suscriptor lento cuya cola se llena recibe None y se le cierra el
+    stream: al reconectar obtiene de nuevo el estado completo.
+    """
+
+    def __init__(self, queue_size: int, use_change_stream: bool = False):
+        self.queue_size = queue_size
+        self.use_change_stream = use_change_stream
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @contextmanager
+    def subscribe(self, order_id: str) -> Iterator[asyncio.Queue]:
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self._subscribers.setdefault(order_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            subscribers = self._subscribers.get(order_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[order_id]
+
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def _dispatch(self, order_id: str, message: Dict[str, Any]):
+        for queue in list(self._subscribers.get(order_id, ())):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # Vaciar y cerrar: el cliente reconecta y recibe el snapshot
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+                self._subscribers[order_id].discard(queue)
+
+    def publish(self, order_id: Optional[str], event: Optional[Dict[str, Any]] = None, status: Optional[str] = None):
+        """Publicar un evento de tracking y/o un cambio de estado de la orden"""
+        if not self.use_change_stream:
+            self.publish_local(order_id, event, status)
+
+    def publish_local(self, order_id: Optional[str], event: Optional[Dict[str, Any]] = None, status: Optional[str] = None):
+        if not order_id or order_id not in self._subscribers:
+            return
+        if event is not None:
+            self._dispatch(order_id, {"type": "tracking", "order_id": order_id, "event": event})
+        if status is not None:
+            self._dispatch(order_id, {"type": "status", "order_id": order_id, "status": status})
+
+    def _dispatch_change(self, change: Dict[str, Any]):
+        order_id = str(change["documentKey"]["_id"])
+        if order_id not in self._subscribers:
+            return
+        updated_fields = change.get("updateDescription", {}).get("updatedFields", {})
+        for field, value in updated_fields.items():
+            # $push llega como "tracking_history.<n>"; un reemplazo completo, como la lista
+            if field == "tracking_history" and isinstance(value, list) and value:
+                self._dispatch(order_id, {"type": "tracking", "order_id": order_id, "event": value[-1]})
+            elif field.startswith("tracking_history.") and isinstance(value, dict):
+                self._dispatch(order_id, {"type": "tracking", "order_id": order_id, "event": value})
+        if "status" in updated_fields:
+            self._dispatch(order_id, {"type": "status", "order_id": order_id, "status": updated_fields["status"]})
+
+    async def _watch(self):
+        pipeline = [{"$match": {"operationType": "update"}}]
+        while True:
+            try:
+                async with db.get_collection("orders").watch(pipeline) as stream:
+                    async for change in stream:
+                        self._dispatch_change(change)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Order change stream error: {e}")
+                await asyncio.sleep(1)
+
+    def start(self):
+        if self.use_change_stream and self._task is None:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for queues in self._subscribers.values():
+            for queue in queues:
+                if not queue.full():
+                    queue.put_nowait(None)
+
+order_events = OrderEventBus(settings.order_events_queue_size, settings.order_events_change_stream)
@@ -0,0 +1,70 @@
+import base64
+import json
+from bson import ObjectId
+from pymongo import DESCENDING
+from fastapi import HTTPException
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+from database import db
+
+# Orden estable para listados: más recientes primero, _id como desempate
+KEYSET_SORT = [("created_at", DESCENDING), ("_id", DESCENDING)]
+MAX_PAGE_SIZE = 100
+
+def encode_token(payload: Dict[str, Any]) -> str:
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_token(token: str) -> Dict[str, Any]:
+    padded = token + "=" * (-len(token) % 4)
+    return json.loads(base64.urlsafe_b64decode(padded.encode()))
+
+def decode_id(value: str) -> Any:
+    return ObjectId(value) if ObjectId.is_valid(value) else value
+
+def encode_cursor(document: Dict[str, Any]) -> str:
+    """
+    Generar cursor opaco a partir del último documento de la página
+    """
+    return encode_token({"c": document["created_at"].isoformat(), "i": str(document["_id"])})
+
+def decode_cursor(cursor: str) -> Tuple[datetime, Any]:
+    """
+    Decodificar cursor opaco en (created_at, _id)
+    """
+    try:
+        payload = decode_token(cursor)
+        return datetime.fromisoformat(payload["c"]), decode_id(payload["i"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+def apply_cursor(query: Dict[str, Any], cursor: Optional[str]) -> Dict[str, Any]:
+    """
+    Añadir la condición keyset al filtro. El rango sobre created_at deja
+    acotado el recorrido del índice compuesto (..., created_at, _id) y el
+    $nor descarta los empates ya servidos en la página anterior.
+    """
+    if not cursor:
+        return query
+    created_at, last_id = decode_cursor(cursor)
+    keyset_query = dict(query)
+    keyset_query["created_at"] = {"$lte": created_at}
+    keyset_query["$nor"] = [{"created_at": created_at, "_id": {"$gte": last_id}}]
+    return keyset_query
+
+async def paginate(collection_name: str, query: Dict[str, Any], cursor: Optional[str] = None, limit: int = 20, projection: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Obtener una página por keyset; el coste no depende de la profundidad
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    documents = await db.find(
+        collection_name,
+        apply_cursor(query, cursor),
+        projection,
+        limit=limit + 1,
+        sort=KEYSET_SORT
+    )
+    has_more = len(documents) > limit
+    items = documents[:limit]
+    next_cursor = encode_cursor(items[-1]) if has_more and items else None
+    return {"items": items, "next_cursor": next_cursor}
@@ -0,0 +1,81 @@
+import os
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from passlib.context import CryptContext
+from config import settings
+from typing import Optional
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+class PasswordHasherBusy(Exception):
+    """La cola de hashing está llena; el endpoint debe responder 503"""
+
+def _hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+def _verify_password(password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(password, hashed_password)
+
+class PasswordHasher:
+    """
+    Ejecuta bcrypt (~250 ms de CPU por llamada) en un pool de procesos
+    dedicado para no congelar el event loop. `concurrency` limita las
+    operaciones en curso y `queue_size` las que pueden esperar turno; por
+    encima de eso se rechaza con PasswordHasherBusy en lugar de encolar sin
+    límite.
+    """
+
+    def __init__(self, workers: int, concurrency: int, queue_size: int, queue_timeout: float):
+        self.workers = workers
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.concurrency)
+
+    def shutdown(self):
+        if self._executor:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, func, *args):
+        self.start()
+        if self._waiting >= self.queue_size:
+            raise PasswordHasherBusy()
+        self._waiting += 1
+        try:
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise PasswordHasherBusy()
+        finally:
+            self._waiting -= 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+        finally:
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash_password, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(_verify_password, password, hashed_password)
+
+    def stats(self) -> dict:
+        in_flight = self.concurrency - self._slots._value if self._slots else 0
+        return {"workers": self.workers, "concurrency": self.concurrency, "in_flight": in_flight, "waiting": self._waiting, "queue_size": self.queue_size}
+
+password_hasher = PasswordHasher(
+    workers=settings.password_hash_workers or os.cpu_count() or 1,
+    concurrency=settings.password_hash_concurrency or settings.password_hash_workers or os.cpu_count() or 1,
+    queue_size=settings.password_hash_queue_size,
+    queue_timeout=settings.password_hash_queue_timeout_seconds
+)
@@ -1,8 +1,8 @@
-import requests
 import hmac
 import hashlib
 from fastapi import HTTPException
 from config import settings
+from utils.culqi import culqi_client
 from typing import Dict, Any, Optional
 from datetime import datetime
 
@@ -17,11 +17,6 @@ async def process_culqi_payment(
     """
     Procesar pago con Culqi (tarjeta o Yape)
     """
-    headers = {
-        "Authorization": f"Bearer {settings.culqi_secret_key}",
-        "Content-Type": "application/json",
-    }
-    
     source_id = None
     
     if payment_method == "card":
@@ -34,7 +29,6 @@ async def process_culqi_payment(
             raise HTTPException(status_code=400, detail="Phone number and OTP required for Yape")
         
         # Crear token para Yape
-        token_url = "https://api.culqi.com/v1/tokens"
         token_data = {
             "number_phone": phone,
             "otp": otp,
@@ -42,7 +36,7 @@ async def process_culqi_payment(
             "metadata": {"order_id": order_id}
         }
         
-        token_response = requests.post(token_url, headers=headers, json=token_data)
+        token_response = await culqi_client.post("/tokens", token_data)
         if token_response.status_code != 201:
             error_detail = token_response.json().get('merchant_message', 'Failed to create Yape token')
             raise HTTPException(status_code=400, detail=error_detail)
@@ -54,7 +48,6 @@ async def process_culqi_payment(
         raise HTTPException(status_code=400, detail="Invalid payment method. Use 'card' or 'yape'")
     
     # Crear cargo con Culqi
-    charge_url = "https://api.culqi.com/v1/charges"
     charge_data = {
         "amount": int(amount * 100),
         "currency": "PEN",
@@ -65,7 +58,8 @@ async def process_culqi_payment(
         "metadata": {"order_id": order_id, "user_id": "user_id_placeholder"}
     }
     
-    response = requests.post(charge_url, headers=headers, json=charge_data)
+    # Un cargo no es idempotente: solo se reintenta si no llegó a enviarse
+    response = await culqi_client.post("/charges", charge_data)
     
     if response.status_code == 201:
         return response.json()
@@ -0,0 +1,145 @@
+"""
+Asignación de órdenes a shippers y orden de visita (heurística).
+
+1. Matriz shipper × orden de distancias haversine vectorizada con NumPy.
+2. Inserción greedy: las órdenes se procesan de la más lejana a la más
+   cercana a su shipper alcanzable más próximo. Para cada una se eligen
+   los `candidates` shippers con menor coste de añadirla al final de su
+   ruta (vectorizado sobre todos) y, entre ellos, la posición de inserción
+   más barata. Se respetan la capacidad restante y el alcance de cada
+   vehículo.
+3. 2-opt sobre cada ruta (camino abierto que sale de la posición del
+   shipper) con su matriz local de distancias.
+
+Sin acceso a base de datos: crud.dispatch carga los datos y escribe el
+resultado.
+"""
+import numpy as np
+from utils.geo import haversine_matrix, haversine_pairs
+from typing import Dict, List, Tuple
+
+# Órdenes simultáneas y distancia máxima desde la posición del shipper a una entrega
+VEHICLE_PROFILES: Dict[str, Dict[str, float]] = {
+    "bike": {"capacity": 3, "max_range_m": 5000.0},
+    "motorcycle": {"capacity": 6, "max_range_m": 20000.0},
+    "car": {"capacity": 12, "max_range_m": 60000.0},
+}
+
+class RoutePlan:
+    def __init__(self, routes: List[List[int]], unassigned: List[int], route_lengths_m: List[float]):
+        self.routes = routes
+        self.unassigned = unassigned
+        self.route_lengths_m = route_lengths_m
+
+    @property
+    def assigned_count(self) -> int:
+        return sum(len(route) for route in self.routes)
+
+def _path_length(stops: List[int], lat: np.ndarray, lng: np.ndarray) -> float:
+    if len(stops) < 2:
+        return 0.0
+    return float(haversine_pairs(lat[stops[:-1]], lng[stops[:-1]], lat[stops[1:]], lng[stops[1:]]).sum())
+
+def _cheapest_insertion(route: List[int], start: int, order: int, lat: np.ndarray, lng: np.ndarray) -> Tuple[int, float]:
+    """
+    Posición y coste de insertar `order` en `route`. Los índices son sobre
+    (lat, lng), que contiene los puntos de partida de los shippers y las órdenes.
+    """
+    stops = [start] + route
+    stop_lat, stop_lng = lat[stops], lng[stops]
+    to_order = haversine_pairs(stop_lat, stop_lng, lat[order], lng[order])
+    best_position, best_cost = len(route), float(to_order[-1])
+    if route:
+        # Insertar entre stops[i] y stops[i + 1]: d(prev, o) + d(o, next) - d(prev, next)
+        legs = haversine_pairs(stop_lat[:-1], stop_lng[:-1], stop_lat[1:], stop_lng[1:])
+        costs = to_order[:-1] + to_order[1:] - legs
+        position = int(np.argmin(costs))
+        if costs[position] < best_cost:
+            best_position, best_cost = position, float(costs[position])
+    return best_position, best_cost
+
+def _two_opt(route: List[int], start: int, lat: np.ndarray, lng: np.ndarray) -> Tuple[List[int], float]:
+    """Mejorar el orden de visita de una ruta abierta con inicio fijo"""
+    stops = [start] + route
+    # Listas de Python: el bucle hace muchos accesos escalares
+    distances = haversine_matrix(lat[stops], lng[stops], lat[stops], lng[stops]).tolist()
+    path = list(range(len(stops)))
+    improved = len(route) > 2
+    while improved:
+        improved = False
+        for i in range(1, len(path) - 1):
+            for j in range(i + 1, len(path)):
+                a, b, c = path[i - 1], path[i], path[j]
+                delta = distances[a][c] - distances[a][b]
+                if j + 1 < len(path):
+                    d = path[j + 1]
+                    delta += distances[b][d] - distances[c][d]
+                if delta < -1e-6:
+                    path[i:j + 1] = reversed(path[i:j + 1])
+                    improved = True
+    length = float(sum(distances[path[k]][path[k + 1]] for k in range(len(path) - 1)))
+    return [stops[k] for k in path[1:]], length
+
+def plan_routes(
+    shipper_lat: np.ndarray,
+    shipper_lng: np.ndarray,
+    shipper_capacity: np.ndarray,
+    shipper_max_range_m: np.ndarray,
+    order_lat: np.ndarray,
+    order_lng: np.ndarray,
+    candidates: int = 8,
+    two_opt: bool = True
+) -> RoutePlan:
+    """
+    Devuelve, por shipper, la lista ordenada de índices de orden que le
+    tocan, y los índices de las órdenes que no caben o no se alcanzan.
+    """
+    shipper_count, order_count = len(shipper_lat), len(order_lat)
+    routes: List[List[int]] = [[] for _ in range(shipper_count)]
+    if shipper_count == 0 or order_count == 0:
+        return RoutePlan(routes, list(range(order_count)), [0.0] * shipper_count)
+
+    # Índices 0..S-1 = posiciones de shippers, S..S+O-1 = órdenes
+    lat = np.concatenate([shipper_lat, order_lat]).astype(float)
+    lng = np.concatenate([shipper_lng, order_lng]).astype(float)
+
+    start_distance = haversine_matrix(shipper_lat, shipper_lng, order_lat, order_lng)
+    reachable = start_distance <= shipper_max_range_m[:, None]
+    nearest = np.where(reachable, start_distance, np.inf).min(axis=0)
+
+    unassigned = [int(order) for order in np.flatnonzero(~np.isfinite(nearest))]
+    sequence = [int(order) for order in np.argsort(-nearest) if np.isfinite(nearest[order])]
+
+    remaining = shipper_capacity.astype(int).copy()
+    route_end = np.arange(shipper_count)
+    candidates = max(1, min(candidates, shipper_count))
+
+    for order in sequence:
+        point = shipper_count + order
+        append_cost = haversine_pairs(lat[route_end], lng[route_end], lat[point], lng[point])
+        append_cost[(remaining <= 0) | ~reachable[:, order]] = np.inf
+        shortlist = np.argpartition(append_cost, candidates - 1)[:candidates]
+        best = None
+        for shipper in shortlist:
+            if not np.isfinite(append_cost[shipper]):
+                continue
+            position, cost = _cheapest_insertion(routes[shipper], shipper, point, lat, lng)
+            if best is None or cost < best[2]:
+                best = (int(shipper), position, cost)
+        if best is None:
+            unassigned.append(order)
+            continue
+        shipper, position, _ = best
+        routes[shipper].insert(position, point)
+        remaining[shipper] -= 1
+        route_end[shipper] = routes[shipper][-1]
+
+    route_lengths = []
+    for shipper, route in enumerate(routes):
+        if two_opt and route:
+            route, length = _two_opt(route, shipper, lat, lng)
+        else:
+            length = _path_length([shipper] + route, lat, lng)
+        routes[shipper] = [stop - shipper_count for stop in route]
+        route_lengths.append(length)
+    return RoutePlan(routes, unassigned, route_lengths)
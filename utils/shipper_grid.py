@@ -0,0 +1,351 @@
+import asyncio
+import heapq
+import math
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import UpdateOne
+from config import settings
+from database import db
+from utils.geo import haversine_m, METERS_PER_DEGREE
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+SHIPPER_POSITION_PROJECTION = {
+    "user_id": 1,
+    "latitude": 1,
+    "longitude": 1,
+    "current_location": 1,
+    "vehicle_type": 1,
+    "availability_status": 1,
+    "updated_at": 1
+}
+
+class ShipperPosition:
+    __slots__ = ("shipper_id", "user_id", "latitude", "longitude", "current_location",
+                 "vehicle_type", "availability_status", "updated_at", "cell",
+                 "persisted_latitude", "persisted_longitude", "persisted_status", "persisted_at")
+
+    def __init__(self, shipper_id: str):
+        self.shipper_id = shipper_id
+        self.user_id: Optional[str] = None
+        self.latitude = 0.0
+        self.longitude = 0.0
+        self.current_location: Optional[str] = None
+        self.vehicle_type: Optional[str] = None
+        self.availability_status: Optional[str] = None
+        self.updated_at = datetime.min
+        self.cell: Optional[Tuple[int, int]] = None
+        # Último estado escrito en `shippers`, para decidir si vale la pena otro snapshot
+        self.persisted_latitude: Optional[float] = None
+        self.persisted_longitude: Optional[float] = None
+        self.persisted_status: Optional[str] = None
+        self.persisted_at: Optional[datetime] = None
+
+class ShipperGrid:
+    """
+    Índice espacial en memoria (por worker) de la posición y disponibilidad
+    de los shippers, en celdas uniformes de `cell_degrees` grados.
+
+    Las posiciones se actualizan en memoria y se persisten en `shippers`
+    con un bulk_write por intervalo (snapshot), solo la última posición de
+    cada shipper y solo si se movió al menos `min_move_m` metros o su
+    última escritura tiene más de `max_age_seconds`. En cada intervalo se leen
+    también las posiciones escritas por otros workers, así que la vista de
+    cada worker tiene como mucho un par de intervalos de retraso. Al
+    arrancar se carga entera desde la colección (warm start).
+    """
+
+    def __init__(self, cell_degrees: float, snapshot_interval_seconds: float, min_move_m: float = 0.0, max_age_seconds: float = 0.0):
+        self.cell_degrees = cell_degrees
+        self.snapshot_interval_seconds = snapshot_interval_seconds
+        self.min_move_m = min_move_m
+        self.max_age_seconds = max_age_seconds
+        self.ready = False
+        self._positions: Dict[str, ShipperPosition] = {}
+        self._cells: Dict[Tuple[int, int], Set[str]] = {}
+        self._dirty: Set[str] = set()
+        self._last_sync: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return (math.floor(latitude / self.cell_degrees), math.floor(longitude / self.cell_degrees))
+
+    def _place(self, position: ShipperPosition):
+        cell = self._cell(position.latitude, position.longitude)
+        if cell == position.cell:
+            return
+        if position.cell is not None:
+            members = self._cells.get(position.cell)
+            if members is not None:
+                members.discard(position.shipper_id)
+                if not members:
+                    del self._cells[position.cell]
+        self._cells.setdefault(cell, set()).add(position.shipper_id)
+        position.cell = cell
+
+    def get(self, shipper_id: str) -> Optional[ShipperPosition]:
+        return self._positions.get(shipper_id)
+
+    def load(self, document: Dict[str, Any]) -> Optional[ShipperPosition]:
+        """Cargar un documento de `shippers` si es más reciente que lo que hay en memoria"""
+        if document.get("latitude") is None or document.get("longitude") is None:
+            return None
+        shipper_id = str(document["_id"])
+        updated_at = document.get("updated_at") or datetime.min
+        position = self._positions.get(shipper_id)
+        if position is not None and (position.updated_at >= updated_at or shipper_id in self._dirty):
+            return position
+        if position is None:
+            position = self._positions[shipper_id] = ShipperPosition(shipper_id)
+        position.user_id = document.get("user_id")
+        position.latitude = document["latitude"]
+        position.longitude = document["longitude"]
+        position.current_location = document.get("current_location")
+        position.vehicle_type = document.get("vehicle_type")
+        position.availability_status = document.get("availability_status")
+        position.updated_at = updated_at
+        position.persisted_latitude = position.latitude
+        position.persisted_longitude = position.longitude
+        position.persisted_status = position.availability_status
+        position.persisted_at = updated_at
+        self._place(position)
+        return position
+
+    def move(self, shipper_id: str, latitude: float, longitude: float, current_location: Optional[str] = None, updated_at: Optional[datetime] = None) -> Optional[ShipperPosition]:
+        position = self._positions.get(shipper_id)
+        if position is None:
+            return None
+        if updated_at is not None and updated_at < position.updated_at:
+            # Fix fuera de orden: ya tenemos uno más reciente
+            return position
+        position.latitude = latitude
+        position.longitude = longitude
+        if current_location is not None:
+            position.current_location = current_location
+        position.updated_at = updated_at or datetime.utcnow()
+        self._place(position)
+        self._dirty.add(shipper_id)
+        return position
+
+    def set_status(self, shipper_id: str, availability_status: str) -> bool:
+        position = self._positions.get(shipper_id)
+        if position is None:
+            return False
+        position.availability_status = availability_status
+        position.updated_at = datetime.utcnow()
+        self._dirty.add(shipper_id)
+        return True
+
+    def remove(self, shipper_id: str):
+        position = self._positions.pop(shipper_id, None)
+        self._dirty.discard(shipper_id)
+        if position is not None and position.cell is not None:
+            members = self._cells.get(position.cell)
+            if members is not None:
+                members.discard(shipper_id)
+                if not members:
+                    del self._cells[position.cell]
+
+    @staticmethod
+    def _matches(position: ShipperPosition, vehicle_type: Optional[str], availability_status: Optional[str]) -> bool:
+        if availability_status and position.availability_status != availability_status:
+            return False
+        return not vehicle_type or position.vehicle_type == vehicle_type
+
+    def _ring(self, center: Tuple[int, int], radius: int):
+        row, column = center
+        if radius == 0:
+            yield center
+            return
+        for offset in range(-radius, radius + 1):
+            yield (row - radius, column + offset)
+            yield (row + radius, column + offset)
+        for offset in range(-radius + 1, radius):
+            yield (row + offset, column - radius)
+            yield (row + offset, column + radius)
+
+    def _cell_width_m(self, latitude: float, rings: int) -> float:
+        # Ancho este-oeste (el lado más corto) de la celda más alejada del ecuador recorrida
+        worst_latitude = min(89.0, abs(latitude) + (rings + 1) * self.cell_degrees)
+        return self.cell_degrees * METERS_PER_DEGREE * math.cos(math.radians(worst_latitude))
+
+    def nearest(self, latitude: float, longitude: float, k: int = 10, vehicle_type: Optional[str] = None, availability_status: Optional[str] = "available", max_distance_m: Optional[float] = None) -> List[Tuple[str, float]]:
+        """
+        Los k shippers más cercanos como [(shipper_id, metros)], de menor a
+        mayor distancia. Recorre anillos de celdas alrededor del punto y se
+        detiene cuando ningún anillo pendiente puede mejorar el k-ésimo. Si
+        los anillos ya abarcarían más celdas que las ocupadas (pocos shippers
+        que cumplan el filtro, o alguno muy lejos), recorre directamente las
+        celdas ocupadas que faltan.
+        """
+        if k <= 0:
+            return []
+        center = self._cell(latitude, longitude)
+        best: List[Tuple[float, str]] = []
+
+        def consider(members: Set[str]):
+            for shipper_id in members:
+                position = self._positions[shipper_id]
+                if not self._matches(position, vehicle_type, availability_status):
+                    continue
+                distance = haversine_m(latitude, longitude, position.latitude, position.longitude)
+                if max_distance_m is not None and distance > max_distance_m:
+                    continue
+                if len(best) < k:
+                    heapq.heappush(best, (-distance, shipper_id))
+                elif distance < -best[0][0]:
+                    heapq.heapreplace(best, (-distance, shipper_id))
+
+        seen = 0
+        total = len(self._positions)
+        radius = 0
+        while seen < total:
+            if (2 * radius + 1) ** 2 > len(self._cells):
+                for cell, members in self._cells.items():
+                    if max(abs(cell[0] - center[0]), abs(cell[1] - center[1])) >= radius:
+                        consider(members)
+                break
+            for cell in self._ring(center, radius):
+                members = self._cells.get(cell)
+                if members:
+                    seen += len(members)
+                    consider(members)
+            # Todo lo que queda fuera de los anillos recorridos está al menos a esta distancia
+            reach = radius * self._cell_width_m(latitude, radius)
+            if len(best) == k and -best[0][0] <= reach:
+                break
+            if max_distance_m is not None and reach > max_distance_m:
+                break
+            radius += 1
+        return [(shipper_id, -negative) for negative, shipper_id in sorted(best, reverse=True)]
+
+    def within_radius(self, latitude: float, longitude: float, radius_m: float, vehicle_type: Optional[str] = None, availability_status: Optional[str] = "available") -> List[Tuple[str, float]]:
+        """Shippers a menos de `radius_m` metros como [(shipper_id, metros)], ordenados"""
+        delta_latitude = radius_m / METERS_PER_DEGREE
+        delta_longitude = radius_m / (METERS_PER_DEGREE * max(0.01, math.cos(math.radians(min(89.0, abs(latitude) + delta_latitude)))))
+        min_row, min_column = self._cell(latitude - delta_latitude, longitude - delta_longitude)
+        max_row, max_column = self._cell(latitude + delta_latitude, longitude + delta_longitude)
+        found = []
+        for row in range(min_row, max_row + 1):
+            for column in range(min_column, max_column + 1):
+                for shipper_id in self._cells.get((row, column), ()):
+                    position = self._positions[shipper_id]
+                    if not self._matches(position, vehicle_type, availability_status):
+                        continue
+                    distance = haversine_m(latitude, longitude, position.latitude, position.longitude)
+                    if distance <= radius_m:
+                        found.append((shipper_id, distance))
+        found.sort(key=lambda item: item[1])
+        return found
+
+    async def warm_start(self) -> int:
+        self._last_sync = datetime.utcnow()
+        shippers = await db.find("shippers", {"latitude": {"$ne": None}}, SHIPPER_POSITION_PROJECTION)
+        for shipper in shippers:
+            self.load(shipper)
+        self.ready = True
+        return len(self._positions)
+
+    async def refresh(self) -> int:
+        """Traer las posiciones que otros workers han persistido desde la última lectura"""
+        now = datetime.utcnow()
+        # Solape de un intervalo para no perder snapshots que terminaron durante la lectura anterior
+        since = (self._last_sync or now) - timedelta(seconds=self.snapshot_interval_seconds)
+        shippers = await db.find("shippers", {"position_written_at": {"$gt": since}}, SHIPPER_POSITION_PROJECTION)
+        self._last_sync = now
+        for shipper in shippers:
+            self.load(shipper)
+        return len(shippers)
+
+    def _needs_persist(self, position: ShipperPosition, now: datetime) -> bool:
+        if position.persisted_at is None or position.availability_status != position.persisted_status:
+            return True
+        if (now - position.persisted_at).total_seconds() >= self.max_age_seconds:
+            return True
+        return haversine_m(position.latitude, position.longitude, position.persisted_latitude, position.persisted_longitude) >= self.min_move_m
+
+    async def snapshot(self, force: bool = False) -> int:
+        """
+        Persistir las posiciones modificadas que superan el umbral de
+        distancia/tiempo (todas con `force`); devuelve shippers escritos
+        """
+        if not self._dirty:
+            return 0
+        now = datetime.utcnow()
+        dirty, deferred = [], set()
+        for shipper_id in self._dirty:
+            if force or self._needs_persist(self._positions[shipper_id], now):
+                dirty.append(shipper_id)
+            else:
+                deferred.add(shipper_id)
+        self._dirty = deferred
+        if not dirty:
+            return 0
+        operations = []
+        written = []
+        for shipper_id in dirty:
+            position = self._positions[shipper_id]
+            written.append((position.latitude, position.longitude, position.availability_status))
+            operations.append(UpdateOne(
+                {"_id": ObjectId(shipper_id) if ObjectId.is_valid(shipper_id) else shipper_id},
+                {"$set": {
+                    "latitude": position.latitude,
+                    "longitude": position.longitude,
+                    "location": {"type": "Point", "coordinates": [position.longitude, position.latitude]},
+                    "current_location": position.current_location,
+                    "availability_status": position.availability_status,
+                    "updated_at": position.updated_at,
+                    "position_written_at": now
+                }}
+            ))
+        result = await db.bulk_write("shippers", operations, ordered=False)
+        failed = set(range(len(dirty)) if result is None else [error["index"] for error in result["errors"]])
+        for index, shipper_id in enumerate(dirty):
+            position = self._positions.get(shipper_id)
+            if position is None:
+                continue
+            if index in failed:
+                self._dirty.add(shipper_id)
+                continue
+            position.persisted_latitude, position.persisted_longitude, position.persisted_status = written[index]
+            position.persisted_at = now
+        return len(operations) - len(failed)
+
+    async def _run(self):
+        # Se detiene con un Event y no con cancel(): cancelar a mitad de
+        # snapshot() perdería las posiciones ya sacadas de _dirty
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), self.snapshot_interval_seconds)
+                break
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.snapshot()
+                await self.refresh()
+            except Exception as e:
+                print(f"Shipper grid sync error: {e}")
+
+    async def start(self):
+        if self._task is None:
+            loaded = await self.warm_start()
+            print(f"🗺️  Shipper grid loaded with {loaded} position(s)")
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._stopping.set()
+            await self._task
+            self._task = None
+        await self.snapshot(force=True)
+
+shipper_grid = ShipperGrid(
+    settings.shipper_grid_cell_degrees,
+    settings.shipper_grid_snapshot_interval_seconds,
+    settings.shipper_location_min_move_m,
+    settings.shipper_location_max_age_seconds
+)
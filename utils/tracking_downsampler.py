@@ -0,0 +1,46 @@
+import asyncio
+from config import settings
+from crud.delivery_tracking import downsample_next_window
+from typing import Optional
+
+class TrackingDownsampler:
+    """
+    Job de fondo que resume los trayectos GPS viejos a un punto por minuto
+    (ver crud.delivery_tracking). Cada `interval_seconds` procesa todas las
+    ventanas pendientes; es seguro tenerlo activo en varios workers.
+    """
+
+    def __init__(self, interval_seconds: float):
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_pending(self) -> int:
+        total = 0
+        while True:
+            written = await downsample_next_window()
+            if written is None:
+                return total
+            total += written
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_pending()
+            except Exception as e:
+                print(f"Tracking downsample error: {e}")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+tracking_downsampler = TrackingDownsampler(settings.tracking_downsample_interval_seconds)
@@ -0,0 +1,65 @@
+import asyncio
+from config import settings
+from crud.payment import handle_culqi_webhook
+from crud.webhooks import claim_next_webhook, complete_webhook, fail_webhook
+from typing import List
+
+class WebhookWorkerPool:
+    """
+    Workers que drenan el inbox de webhooks. Sondean la colección cada
+    `poll_interval` segundos y se despiertan antes si este proceso acaba de
+    encolar un evento (`notify`).
+    """
+
+    def __init__(self, workers: int, poll_interval: float):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: asyncio.Event = None
+
+    def notify(self):
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def process_one(self) -> bool:
+        event = await claim_next_webhook()
+        if not event:
+            return False
+        try:
+            result = await handle_culqi_webhook(event["payload"])
+        except Exception as e:
+            result = {"status": "error", "message": str(e)}
+        if result.get("status") == "success":
+            closed = await complete_webhook(event, result)
+        else:
+            # El pago puede no existir aún (webhook antes que el insert): se reintenta
+            closed = await fail_webhook(event, result.get("message", "Webhook processing failed"))
+        if closed is None:
+            print(f"Webhook {event['_id']} lease lost before closing; result discarded")
+        return True
+
+    async def _run(self):
+        while True:
+            try:
+                if await self.process_one():
+                    continue
+            except Exception as e:
+                print(f"Webhook worker error: {e}")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if not self._tasks:
+            self._wakeup = asyncio.Event()
+            self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+webhook_workers = WebhookWorkerPool(settings.webhook_workers, settings.webhook_poll_interval_seconds)